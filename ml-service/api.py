@@ -0,0 +1,126 @@
+# ml-service/api.py
+"""
+Async (ASGI) version of app.py's /api/route and /api/health, same request
+and response format.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 2
+
+OSRM goes through a pooled httpx.AsyncClient, the station snapshot refresh
+(blocking SQLAlchemy) and response serialising run in the threadpool and
+corridor matching in a process pool (services/corridor_pool.py), so the
+event loop only ever waits, it never blocks: a slow OSRM call holds a
+coroutine, not a request thread.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# before the service imports: they read their settings at import time
+load_dotenv()
+
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+
+from services import alternatives
+from services.cache import AsyncRouteCache
+from services.charging_planner import plan_alternatives
+from services.config import pg_uri
+from services.corridor_pool import CorridorPool
+from services.responses import RESPONSE_COMPRESS_MIN_BYTES, compress, dumps, negotiate_encoding
+from services.route_payload import build_route_payload, parse_route_request
+from services.routing import ROUTE_MATCH_SIMPLIFY_M, AsyncOSRMClient, OSRMUnavailable, parse_routes, route_params
+from services.stations import StationSnapshot
+
+MAX_STATION_DISTANCE_KM = float(os.getenv("MAX_STATION_DISTANCE_KM", "5"))
+
+app = FastAPI()
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+engine = create_engine(pg_uri(), pool_pre_ping=True, pool_size=2, max_overflow=2)
+snapshot = StationSnapshot(engine.connect)
+route_cache = AsyncRouteCache()
+osrm = AsyncOSRMClient()
+corridor_pool = CorridorPool()
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    await osrm.aclose()
+    await run_in_threadpool(corridor_pool.close)
+    engine.dispose()
+
+
+def _json_body(payload, accept_encoding) -> Response:
+    body = dumps(payload)
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= RESPONSE_COMPRESS_MIN_BYTES else None
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(compress(body, encoding), media_type="application/json", headers=headers)
+
+
+async def _routes(req):
+    async def fetch():
+        data = await osrm.route([req.start, *req.waypoints, req.end], route_params(2))
+        # polyline decode + simplification: cheap, but keep it off the loop
+        return await run_in_threadpool(parse_routes, data)
+
+    return await route_cache.get_routes(req.start, req.end, req.waypoints, 2, fetch)
+
+
+async def _near_routes(routes, snap):
+    matches = await corridor_pool.match_routes_async(
+        snap, [r["path"] for r in routes], MAX_STATION_DISTANCE_KM, simplify_m=ROUTE_MATCH_SIMPLIFY_M,
+        cumulative=[r["cumulative_km"] for r in routes],
+    )
+    return alternatives.annotate(snap.records(), matches)
+
+
+def _render(routes, near, req, accept_encoding) -> Response:
+    plans = plan_alternatives(routes, near, req.vehicle) if req.vehicle else None
+    return _json_body(build_route_payload(routes, near, req.simplify_m, req.compact, plans), accept_encoding)
+
+
+@app.get("/api/health")
+async def health():
+    return {
+        "ok": True,
+        "time": datetime.utcnow().isoformat(),
+        "station_snapshot": snapshot.stats(),
+        "route_cache": route_cache.stats(),
+        "osrm": osrm.stats(),
+        "corridor_pool": corridor_pool.stats(),
+    }
+
+
+@app.post("/api/route")
+async def api_route(request: Request):
+    """Body and response: see app.py api_route."""
+    try:
+        req = parse_route_request(await request.json(), request.query_params.get("format"))
+    except ValueError as ex:
+        return JSONResponse({"success": False, "error": str(ex)}, status_code=400)
+
+    try:
+        # routes and the station snapshot are independent; fetch them together
+        routes, snap = await asyncio.gather(_routes(req), run_in_threadpool(snapshot.get))
+        if not routes:
+            return JSONResponse({"success": False, "error": "No routes returned"}, status_code=404)
+
+        near = await _near_routes(routes, snap)
+        return await run_in_threadpool(_render, routes, near, req, request.headers.get("accept-encoding"))
+    except OSRMUnavailable as ex:
+        return JSONResponse({"success": False, "error": str(ex)}, status_code=503)
+    except Exception as ex:
+        return JSONResponse({"success": False, "error": str(ex)}, status_code=500)
@@ -5,21 +5,19 @@ from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-from models import db, Station, Charger
-from enhanced_ev_planner import EnhancedEVPlanner
-
+# before the service imports: they read their settings at import time
 load_dotenv()
 
-def _pg_uri():
-    host = os.getenv("POSTGRES_HOST", "localhost")
-    port = os.getenv("POSTGRES_PORT", "5432")
-    dbn  = os.getenv("POSTGRES_DB", "ampora")
-    usr  = os.getenv("POSTGRES_USER", "ampora_user")
-    pwd  = os.getenv("POSTGRES_PASSWORD", "a")
-    return f"postgresql+psycopg2://{usr}:{pwd}@{host}:{port}/{dbn}"
+from models import db, Station, Charger
+from enhanced_ev_planner import EnhancedEVPlanner
+from services.charging_planner import plan_alternatives
+from services.config import pg_uri
+from services.responses import json_response
+from services.route_payload import build_route_payload, parse_route_request
+from services.routing import OSRMUnavailable
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = _pg_uri()
+app.config["SQLALCHEMY_DATABASE_URI"] = pg_uri()
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # CORS for local dev
@@ -36,7 +34,13 @@ planner = EnhancedEVPlanner(max_station_distance_km=5)  # 5km band from route po
 
 @app.get("/api/health")
 def health():
-    return {"ok": True, "time": datetime.utcnow().isoformat()}
+    return {
+        "ok": True,
+        "time": datetime.utcnow().isoformat(),
+        "station_snapshot": planner.snapshot.stats(),
+        "route_cache": planner.route_cache.stats(),
+        "osrm": planner.osrm.stats(),
+    }
 
 @app.post("/api/route")
 def api_route():
@@ -45,44 +49,44 @@ def api_route():
     {
       "start": {"lat": <float>, "lng": <float>},
       "end": {"lat": <float>, "lng": <float>},
-      "stops": [ {"lat":..., "lng":...}, ... ]  # optional
+      "stops": [ {"lat":..., "lng":...}, ... ],  # optional
+      "simplify_m": <float>,  # optional, Douglas-Peucker tolerance for the returned paths
+      "format": "compact",    # optional (or ?format=compact): encoded polylines
+                              # and column-oriented stations
+      "vehicle": {"soc": <%>, "full_range_km": <float>}  # optional: adds a
+                              # charging_plan to every route, see
+                              # services/charging_planner.py for more fields
     }
+    nearby_stations covers every alternative: each station has
+    distance_to_route_km (nearest route), route_distances_km (per route,
+    null outside its corridor) and serves_routes (indices into routes).
     """
     data = request.get_json(force=True)
-    start = data.get("start")
-    end   = data.get("end")
-    stops = data.get("stops", [])
-
-    if not start or not end:
-        return jsonify({"success": False, "error": "start {lat,lng} and end {lat,lng} required"}), 400
-
-    s = (float(start["lat"]), float(start["lng"]))
-    e = (float(end["lat"]), float(end["lng"]))
-    waypoints = [(float(p["lat"]), float(p["lng"])) for p in stops if p and "lat" in p and "lng" in p]
+    try:
+        req = parse_route_request(data, request.args.get("format"))
+    except ValueError as ex:
+        return jsonify({"success": False, "error": str(ex)}), 400
 
     try:
         # 1) Routes via OSRM (with waypoints)
-        routes = planner.get_routes_from_osrm(s, e, waypoints=waypoints, alternatives=2)
+        routes = planner.get_routes_from_osrm(req.start, req.end, waypoints=req.waypoints, alternatives=2)
         if not routes:
             return jsonify({"success": False, "error": "No routes returned"}), 404
 
-        # 2) Load stations once (from DB) and compute proximity to the first (shortest) route
+        # 2) Load stations once (from DB) and match them against every alternative;
+        #    each station lists the routes it serves and its distance to each
         stations = planner.load_stations()
-        near = planner.stations_near_route(routes[0]["path"], stations)
+        near = planner.stations_near_routes(routes, stations)
 
         # 3) Optional: build a folium map file (commented by default)
-        # map_name = planner.build_map(s, e, routes, near)
+        # map_name = planner.build_map(req.start, req.end, routes, near)
+
+        # 4) Charging stops for the given vehicle, per alternative
+        plans = plan_alternatives(routes, near, req.vehicle) if req.vehicle else None
 
-        return jsonify({
-            "success": True,
-            "routes": [{
-                "distance_km": round(r["distance_km"], 1),
-                "duration_min": round(r["duration_min"], 0),
-                "path": r["path"],  # [ [lat,lon], ... ]
-            } for r in routes],
-            "nearby_stations": near[:60],
-            # "map_file": map_name
-        })
+        return json_response(build_route_payload(routes, near, req.simplify_m, req.compact, plans))
+    except OSRMUnavailable as ex:
+        return jsonify({"success": False, "error": str(ex)}), 503
     except Exception as ex:
         return jsonify({"success": False, "error": str(ex)}), 500
 
@@ -91,4 +95,5 @@ if __name__ == "__main__":
     with app.app_context():
         # Verify DB connectivity (no create_all; matches your existing schema)
         db.session.execute(db.text("SELECT 1"))
-    app.run(host="127.0.0.1", port=8000, debug=True)
+    # production: the async app (uvicorn api:app), see api.py
+    app.run(host="127.0.0.1", port=8000, debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,89 @@
+"""
+Station-to-route distance: the old geopy loop vs services.corridor.
+
+    python bench_corridor.py [route_points] [stations] [legacy_stations]
+
+Builds a synthetic route (random walk, ~50 m steps) and stations scattered
+around it. The legacy loop (geodesic to each segment's endpoints and
+midpoint, per station, per segment) only runs on the first legacy_stations
+stations and is extrapolated. Both are compared with a reference: the
+refined distance to every segment, no pruning.
+"""
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from services import corridor
+from services.simplify import simplify_indices
+from services.spatial_index import GridIndex
+
+BUFFER_KM = 5.0
+
+
+def _legacy_distance_km(p, path) -> float:
+    # the loop the OSRM planner used to run per station
+    best = float("inf")
+    for a, b in zip(path[:-1], path[1:]):
+        mid = ((a[0] + b[0]) / 2.0, (a[1] + b[1]) / 2.0)
+        best = min(best, geodesic(p, a).km, geodesic(p, b).km, geodesic(p, mid).km)
+    return best
+
+
+def _reference_km(path: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    v = np.radians(path)
+    out = np.empty(len(lats))
+    for lo in range(0, len(lats), 200):
+        la = np.radians(lats[lo:lo + 200])[:, None]
+        lo_ = np.radians(lons[lo:lo + 200])[:, None]
+        out[lo:lo + 200] = corridor._refined(la, lo_, v[:-1, 0], v[:-1, 1], v[1:, 0], v[1:, 1])[0].min(axis=1)
+    return out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    m = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    rng = np.random.default_rng(0)
+    path = np.array([6.9, 79.9]) + np.cumsum(rng.normal(0, 3e-4, (n, 2)) + [3e-4, 2e-4], axis=0)
+    centre = path.mean(axis=0)
+    lats = centre[0] + rng.uniform(-0.5, 0.5, m)
+    lons = centre[1] + rng.uniform(-0.5, 0.5, m)
+    print(f"{n} route points, {m} stations, buffer {BUFFER_KM} km")
+
+    ref = _reference_km(path, lats, lons)
+    inside = set(np.flatnonzero(ref <= BUFFER_KM).tolist())
+
+    t0 = time.perf_counter()
+    legacy = np.array([_legacy_distance_km((la, lo), path.tolist()) for la, lo in zip(lats[:k], lons[:k])])
+    per_station = (time.perf_counter() - t0) / k
+    err = np.abs(legacy - ref[:k])
+    print(f"{'legacy geopy loop':<28} {per_station * m * 1000:10.1f} ms (extrapolated from {k})"
+          f"  max err {err.max() * 1000:8.1f} m")
+    # endpoints + midpoint only: the error grows with segment length
+    sparse = path[::50]
+    sparse_ref = _reference_km(sparse, lats[:k], lons[:k])
+    sparse_err = max(abs(_legacy_distance_km((la, lo), sparse.tolist()) - r) for la, lo, r in zip(lats[:k], lons[:k], sparse_ref))
+    print(f"{'legacy, 50x sparser route':<28} {'':>13}  max err {sparse_err * 1000:8.1f} m")
+
+    index = GridIndex(lats, lons)
+    coarse = simplify_indices(path, 25.0)
+    cases = [
+        ("kernel, all stations", lambda: corridor.match_corridor(path, lats, lons, BUFFER_KM)),
+        ("kernel + grid", lambda: corridor.match_corridor(path, lats, lons, BUFFER_KM, index=index)),
+        ("kernel + grid + coarse 25 m", lambda: corridor.match_corridor(
+            path, lats, lons, BUFFER_KM, index=index, coarse_indices=coarse, coarse_tolerance_km=0.025)),
+    ]
+    for name, fn in cases:
+        t0 = time.perf_counter()
+        idx, dist = fn()
+        seconds = time.perf_counter() - t0
+        assert set(idx.tolist()) == inside, name
+        err = np.abs(dist - ref[idx]).max() if len(idx) else 0.0
+        print(f"{name:<28} {seconds * 1000:10.1f} ms  x{per_station * m / seconds:8.0f}  max err {err * 1000:8.4f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Polyline decode throughput: the old per-character decoder vs services.polyline.
+
+    python bench_polyline.py [points] [repeats]
+
+Encodes a synthetic overview=full style geometry (a random walk with ~10 m
+steps) and decodes it with each implementation; outputs are checked equal.
+"""
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from services import polyline
+
+
+def _legacy_decode5(polyline_str: str) -> List[Tuple[float, float]]:
+    # the decoder previously copy-pasted into each planner
+    index, lat, lng, coordinates = 0, 0, 0, []
+    while index < len(polyline_str):
+        result, shift = 0, 0
+        while True:
+            b = ord(polyline_str[index]) - 63
+            index += 1
+            result |= (b & 0x1f) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        dlat = ~(result >> 1) if result & 1 else (result >> 1)
+        lat += dlat
+
+        result, shift = 0, 0
+        while True:
+            b = ord(polyline_str[index]) - 63
+            index += 1
+            result |= (b & 0x1f) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        dlng = ~(result >> 1) if result & 1 else (result >> 1)
+        lng += dlng
+
+        coordinates.append((lat / 1e5, lng / 1e5))
+    return coordinates
+
+
+def _time(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    rng = np.random.default_rng(0)
+    path = np.array([7.0, 80.0]) + np.cumsum(rng.normal(0, 1e-4, (n, 2)), axis=0)
+    encoded = polyline.encode(path)
+    print(f"{n} points, {len(encoded)} chars, best of {repeats}")
+
+    cases = [
+        ("legacy per-char (list)", lambda: _legacy_decode5(encoded)),
+        ("iter_decode (generator)", lambda: list(polyline.iter_decode(encoded))),
+        ("decode (numpy)", lambda: polyline.decode(encoded)),
+        ("decode + tolist", lambda: polyline.decode(encoded).tolist()),
+    ]
+    base = None
+    reference = np.asarray(_legacy_decode5(encoded))
+    for name, fn in cases:
+        seconds, out = _time(fn, repeats)
+        assert np.array_equal(np.asarray(out), reference), name
+        base = base or seconds
+        print(f"{name:<26} {seconds * 1000:8.2f} ms  x{base / seconds:6.1f}")
+
+    seconds, _ = _time(lambda: polyline.encode(path), repeats)
+    print(f"{'encode':<26} {seconds * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
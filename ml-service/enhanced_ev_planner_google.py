@@ -1,14 +1,17 @@
 # enhanced_ev_planner_google.py
+import asyncio
 import os
-import math
 from typing import Any, Dict, List, Tuple
 
-import async_lru
 import httpx
-from geopy.distance import geodesic
 from pydantic import BaseModel
-from sqlalchemy import Column, Float, Integer, String, create_engine, func
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import create_engine
+
+from services import corridor, polyline
+from services.cache import AsyncRouteCache
+from services.corridor_pool import CorridorPool
+from services.spatial_index import GridIndex
+from services.stations import StationSnapshot
 
 # ---------------- Pydantic DTOs ----------------
 class RouteDTO(BaseModel):
@@ -25,65 +28,11 @@ class StationDTO(BaseModel):
     max_power_kw: float = 0.0
     charger_count: int = 0
     distance_to_route_km: float | None = None
+    along_route_km: float | None = None
+    detour_km: float | None = None
 
-# ---------------- SQLAlchemy Models ----------------
-Base = declarative_base()
-
-class Station(Base):
-    __tablename__ = "station"
-    station_id = Column(Integer, primary_key=True)
-    name = Column(String)
-    address = Column(String)
-    latitude = Column(Float)
-    longitude = Column(Float)
-
-class Charger(Base):
-    __tablename__ = "charger"
-    charger_id = Column(Integer, primary_key=True)
-    station_id = Column(Integer)
-    power_kw = Column(Float)
-
-# ---------------- Helpers ----------------
-def _decode_polyline5(polyline_str: str) -> List[Tuple[float, float]]:
-    index = lat = lng = 0
-    coordinates = []
-
-    while index < len(polyline_str):
-        result = shift = 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        dlat = ~(result >> 1) if result & 1 else (result >> 1)
-        lat += dlat
-
-        result = shift = 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        dlng = ~(result >> 1) if result & 1 else (result >> 1)
-        lng += dlng
-
-        coordinates.append((lat / 1e5, lng / 1e5))
-    return coordinates
-
-def _haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
-    return geodesic(a, b).km
-
-def _point_segment_distance_km(p: Tuple[float, float], a: Tuple[float, float], b: Tuple[float, float]) -> float:
-    # sample endpoints + midpoint (fast & accurate enough for overview polylines)
-    d_pa = _haversine_km(p, a)
-    d_pb = _haversine_km(p, b)
-    mid = ((a[0] + b[0]) / 2.0, (a[1] + b[1]) / 2.0)
-    d_pm = _haversine_km(p, mid)
-    return min(d_pa, d_pb, d_pm)
+class DirectionsUnavailable(RuntimeError):
+    """Directions answered with an error status (OVER_QUERY_LIMIT, REQUEST_DENIED...)."""
 
 # ---------------- Planner ----------------
 class GoogleEVPlanner:
@@ -106,6 +55,15 @@ class GoogleEVPlanner:
             pool_size=10,
             max_overflow=20,
         )
+        self.snapshot = StationSnapshot(self.engine.connect)
+        self._dtos: List[StationDTO] = []
+        self._dto_version = 0
+        # (station list, GridIndex over it): the snapshot's index for its DTOs
+        self._index: Tuple[List[StationDTO], GridIndex] | None = None
+        # decoded routes, TTL + LRU, concurrent identical requests share one call
+        self.route_cache = AsyncRouteCache()
+        # corridor matching off the event loop, one task per route
+        self.corridor_pool = CorridorPool()
 
         # single async client with connection pool
         self._client = httpx.AsyncClient(
@@ -115,8 +73,7 @@ class GoogleEVPlanner:
         )
 
     # --------------- Google Directions ---------------
-    @async_lru.alru_cache(maxsize=256)
-    async def _google_directions_cached(
+    async def _google_directions(
         self,
         origin: Tuple[float, float],
         destination: Tuple[float, float],
@@ -151,20 +108,30 @@ class GoogleEVPlanner:
         waypoints: List[Tuple[float, float]] | None = None,
         alternatives: bool = True,
     ) -> List[RouteDTO]:
-
-        data = await self._google_directions_cached(
-            start, end, tuple(waypoints or []), alternatives
-        )
-
-        if data.get("status") != "OK":
+        async def fetch():
+            data = await self._google_directions(start, end, tuple(waypoints or []), alternatives)
+            status = data.get("status")
+            if status == "ZERO_RESULTS":
+                return []
+            if status != "OK":
+                # not cached: the next request asks again
+                raise DirectionsUnavailable(status)
+            return self._parse_routes(data)
+
+        try:
+            # a copy: callers may reorder the list, the cached one stays as fetched
+            return list(await self.route_cache.get_routes(start, end, waypoints or [], alternatives, fetch))
+        except DirectionsUnavailable:
             return []
 
+    @staticmethod
+    def _parse_routes(data: Dict[str, Any]) -> List[RouteDTO]:
         routes: List[RouteDTO] = []
         for rt in data.get("routes", []):
             overview = rt.get("overview_polyline", {}).get("points")
             if not overview:
                 continue
-            path = _decode_polyline5(overview)
+            path = polyline.decode(overview).tolist()
 
             # Sum over legs
             dist_m = 0
@@ -186,77 +153,73 @@ class GoogleEVPlanner:
         return routes
 
     # --------------- Stations ---------------
-    @async_lru.alru_cache(maxsize=1)
     async def load_stations(self) -> List[StationDTO]:
-        """Load stations and aggregate charger power/count."""
-        with Session(self.engine) as s:
-            stations = s.query(Station).all()
-
-            agg = (
-                s.query(
-                    Charger.station_id,
-                    func.max(Charger.power_kw).label("max_power_kw"),
-                    func.count(Charger.charger_id).label("charger_count"),
-                )
-                .group_by(Charger.station_id)
-                .all()
-            )
-            agg_map = {
-                row.station_id: {
-                    "max_power_kw": float(row.max_power_kw or 0.0),
-                    "charger_count": int(row.charger_count or 0),
-                }
-                for row in agg
-            }
+        """Stations + charger power/count from the shared snapshot (DB work off the event loop)."""
+        snap = await asyncio.to_thread(self.snapshot.get)
+        return self._station_dtos(snap)
 
-        out: List[StationDTO] = []
-        for st in stations:
-            meta = agg_map.get(st.station_id, {"max_power_kw": 0.0, "charger_count": 0})
-            out.append(
+    def _station_dtos(self, snap) -> List[StationDTO]:
+        if self._dto_version != snap.version:
+            self._dtos = [
                 StationDTO(
-                    station_id=st.station_id,
-                    name=st.name,
-                    address=st.address,
-                    lat=float(st.latitude),
-                    lon=float(st.longitude),
-                    max_power_kw=meta["max_power_kw"],
-                    charger_count=meta["charger_count"],
+                    station_id=r["station_id"],
+                    name=r["name"],
+                    address=r["address"],
+                    lat=r["lat"],
+                    lon=r["lon"],
+                    max_power_kw=r["max_power_kw"],
+                    charger_count=r["charger_count"],
                 )
-            )
-        return out
+                for r in snap.records()
+            ]
+            self._dto_version = snap.version
+            self._index = (self._dtos, snap.index)
+        return self._dtos
 
     # --------------- Station proximity ---------------
+    def _station_index(self, stations: List[StationDTO]) -> GridIndex:
+        """GridIndex over stations, built once per list (the snapshot's own for its DTOs)."""
+        if self._index is None or self._index[0] is not stations:
+            self._index = (stations, GridIndex([st.lat for st in stations], [st.lon for st in stations]))
+        return self._index[1]
+
     def stations_near_route(
         self,
         route_polyline: List[Tuple[float, float]],
         stations: List[StationDTO],
     ) -> List[StationDTO]:
-        """Return stations within threshold from the route polyline."""
-        near: List[StationDTO] = []
-        n = len(route_polyline)
-
-        for st in stations:
-            p = (st.lat, st.lon)
-            best = float("inf")
-
-            # scan in coarse steps to reduce checks on long polylines
-            # but sample neighbors to maintain accuracy
-            step = 3 if n > 300 else 1
-            i = 0
-            while i < n - 1:
-                a = route_polyline[i]
-                b = route_polyline[i + 1]
-                d = _point_segment_distance_km(p, a, b)
-                if d < best:
-                    best = d
-                    if best < 0.15:  # ~150m early stop
-                        break
-                i += step
-
-            if best <= self.max_station_distance_km:
-                st_copy = st.copy()
-                st_copy.distance_to_route_km = round(best, 2)
-                near.append(st_copy)
+        """Return stations within threshold from the route polyline, in along-route order."""
+        if not stations:
+            return []
+        index = self._station_index(stations)
+        match = corridor.match_corridor_along(
+            route_polyline, index.lats, index.lons, self.max_station_distance_km, index=index
+        )
+        return self._near_dtos(stations, *match)
+
+    async def stations_near_routes(self, routes: List[RouteDTO]) -> List[List[StationDTO]]:
+        """
+        stations_near_route for every route, matched in the corridor process
+        pool against the current station snapshot; stretches the routes share
+        are matched once (services/alternatives.py).
+        """
+        if not routes:
+            return []
+        snap = await asyncio.to_thread(self.snapshot.get)
+        stations = self._station_dtos(snap)
+        matches = await self.corridor_pool.match_routes_async(
+            snap, [r.path for r in routes], self.max_station_distance_km
+        )
+        return [self._near_dtos(stations, *matches.for_route(r)) for r in range(len(routes))]
 
-        near.sort(key=lambda s: (s.distance_to_route_km or 0.0, -s.max_power_kw))
+    @staticmethod
+    def _near_dtos(stations: List[StationDTO], idx, dist, along) -> List[StationDTO]:
+        """Copies in the given (along-route) order."""
+        near: List[StationDTO] = []
+        for i, d, a in zip(idx.tolist(), dist.tolist(), along.tolist()):
+            st_copy = stations[i].copy()
+            st_copy.distance_to_route_km = round(d, 2)
+            st_copy.along_route_km = round(a, 2)
+            st_copy.detour_km = round(2.0 * d, 2)
+            near.append(st_copy)
         return near
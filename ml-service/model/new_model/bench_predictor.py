@@ -0,0 +1,124 @@
+"""
+Per-row vs batched throughput of predict_activities.
+
+    python bench_predictor.py [rows]
+
+Uses MODEL_PATH when it loads; otherwise fits a stand-in pipeline with the
+same shape (transform_features -> MultiOutput RandomForest) on random rows,
+which is enough to compare per-call overhead. If a compiled activity table
+exists it is benchmarked too.
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import ml_predictor
+from ml_predictor import (
+    DAYS, MONTHS, LK_TZ, activity_batcher, app_user_to_model_user,
+    predict_activities, predict_activities_batch,
+)
+
+APP_USERS = ["Delivery_Driver", "Business_Man", "Casual_Driver", "Tourist"]
+MINUTES = [30, 60, 90, 120, 150, 180, 210]
+
+
+def _fit_stand_in():
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.multioutput import MultiOutputClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer, MultiLabelBinarizer
+
+    rng = random.Random(0)
+    labels = ["breakfast", "lunch", "dinner", "shopping", "tea/coffee shop", "none"]
+    rows, y = [], []
+    for _ in range(5000):
+        rows.append({
+            "user_type": rng.choice(list(ml_predictor.USER_CODES)),
+            "charging_time": rng.choice(MINUTES),
+            "time": f"{rng.randint(0, 23):02d}:{rng.choice([0, 15, 30, 45]):02d}",
+            "day": rng.choice(DAYS),
+            "month": rng.choice(MONTHS),
+            "is_festival": rng.randint(0, 1),
+            "is_weekend": rng.randint(0, 1),
+        })
+        y.append(rng.sample(labels, rng.randint(1, 2)))
+    mlb = MultiLabelBinarizer()
+    pipe = Pipeline([
+        ("transformer", FunctionTransformer(ml_predictor.transform_features)),
+        ("classifier", MultiOutputClassifier(RandomForestClassifier(n_estimators=100, max_depth=12, random_state=0))),
+    ])
+    pipe.fit(pd.DataFrame(rows), mlb.fit_transform(y))
+    ml_predictor.model_pipeline, ml_predictor.mlb = pipe, mlb
+
+
+def _legacy_predict(app_user_type, minutes, now_lk):
+    # the original per-turn path: one-row frame through the full pipeline
+    df = pd.DataFrame([{
+        "user_type": app_user_to_model_user(app_user_type),
+        "charging_time": int(minutes),
+        "time": now_lk.strftime("%H:%M"),
+        "day": now_lk.strftime("%A"),
+        "month": now_lk.strftime("%B"),
+        "is_festival": 0,
+        "is_weekend": 1 if now_lk.weekday() >= 5 else 0,
+    }])
+    return ml_predictor.mlb.inverse_transform(ml_predictor.model_pipeline.predict(df))
+
+
+def _report(name, n, seconds):
+    print(f"{name:<28} {n:>6} rows  {seconds * 1000:9.1f} ms  {n / seconds:10.0f} rows/s")
+
+
+async def _concurrent(rows):
+    return await asyncio.gather(*(activity_batcher.predict(u, m, w) for u, m, w in rows))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ml_predictor._load_pipeline()
+    table = ml_predictor.ActivityTable.load(ml_predictor.ACTIVITY_TABLE_PATH, ml_predictor.MODEL_PATH)
+    ml_predictor.activity_table = None
+    if ml_predictor.model_pipeline is None:
+        print("(model not found, using a stand-in pipeline)")
+        _fit_stand_in()
+
+    rng = random.Random(1)
+    base = datetime.now(LK_TZ)
+    rows = [(rng.choice(APP_USERS), rng.choice(MINUTES), base + timedelta(minutes=15 * i)) for i in range(n)]
+
+    t0 = time.perf_counter()
+    for u, m, w in rows:
+        _legacy_predict(u, m, w)
+    _report("legacy per-row", n, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for u, m, _ in rows:
+        predict_activities(u, m)
+    _report("predict_activities per-row", n, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    predict_activities_batch(rows)
+    _report("predict_activities_batch", n, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    asyncio.run(_concurrent(rows))
+    _report("micro-batched (concurrent)", n, time.perf_counter() - t0)
+    print("batcher:", activity_batcher.stats())
+
+    if table is not None:
+        ml_predictor.activity_table = table
+        t0 = time.perf_counter()
+        predict_activities_batch(rows)
+        _report("lookup table (batch)", n, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for u, m, _ in rows:
+            predict_activities(u, m)
+        _report("lookup table per-row", n, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
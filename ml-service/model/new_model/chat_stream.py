@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHAT_STREAM_LATENCY_WINDOW = int(os.getenv("CHAT_STREAM_LATENCY_WINDOW", "512"))
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """One Server-Sent Events frame; data is a single JSON line."""
+    if orjson is not None:
+        body = orjson.dumps(data, default=str)
+    else:
+        body = json.dumps(data, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return b"event: " + event.encode("ascii") + b"\ndata: " + body + b"\n\n"
+
+
+class StreamTimer:
+    """Milestones of one streamed /chat turn, in ms since the request arrived."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> float:
+        ms = (time.perf_counter() - self.started) * 1000.0
+        self.marks.setdefault(name, ms)
+        return round(ms, 1)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: round(v, 1) for k, v in self.marks.items()}
+
+
+class StreamStats:
+    """
+    Rolling windows of streamed-turn milestones: stations (time to first
+    byte: the ranking event), first_token, done.
+    """
+
+    def __init__(self, window: int = CHAT_STREAM_LATENCY_WINDOW):
+        self.window = window
+        self.streams = 0
+        self.disconnects = 0
+        self._ms: Dict[str, deque] = {}
+
+    def record(self, timer: StreamTimer, completed: bool = True):
+        self.streams += 1
+        if not completed:
+            self.disconnects += 1
+        for name, ms in timer.marks.items():
+            self._ms.setdefault(name, deque(maxlen=self.window)).append(ms)
+
+    @staticmethod
+    def _pct(values, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ms = sorted(values)
+        return round(ms[min(len(ms) - 1, int(len(ms) * q))], 1)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"streams": self.streams, "disconnects": self.disconnects}
+        for name, values in self._ms.items():
+            out[f"{name}_ms_p50"] = self._pct(values, 0.5)
+            out[f"{name}_ms_p95"] = self._pct(values, 0.95)
+        return out
+
+
+stream_stats = StreamStats()
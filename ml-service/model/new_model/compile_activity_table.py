@@ -0,0 +1,90 @@
+"""
+Offline compile step for the activity lookup table.
+
+    python compile_activity_table.py [--minutes 15,30,...] [--out path]
+
+Enumerates every (user type, charging time, 15-minute slot, weekday, month,
+festival) combination, scores it with the joblib pipeline in large batches
+and writes the results next to the model (ACTIVITY_TABLE_PATH) so the
+service can answer from the table without loading the pickle.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+import ml_predictor
+from ml_predictor import (
+    ACTIVITY_TABLE_PATH, DAYS, MODEL_PATH, MONTHS, TABLE_SLOT_MINUTES, USER_CODES,
+    model_predict_columns,
+)
+
+# training durations plus the ones /chat currently draws from
+DEFAULT_MINUTES = [15, 30, 45, 60, 75, 90, 120, 150, 180, 210]
+CHUNK_ROWS = 100_000
+
+
+def compile_table(minutes, out_path: str, model_path: str = MODEL_PATH) -> dict:
+    slots = 24 * 60 // TABLE_SLOT_MINUTES
+    shape = (len(USER_CODES), len(minutes), slots, len(DAYS), len(MONTHS), 2)
+    grid = np.indices(shape).reshape(len(shape), -1)
+    user, mi, slot, day, month, festival = grid
+    minutes_arr = np.asarray(minutes, dtype=np.int64)
+
+    labels: list = []
+    label_ids: dict = {}
+    codes = np.empty(grid.shape[1], dtype=np.uint16)
+
+    t0 = time.perf_counter()
+    for lo in range(0, grid.shape[1], CHUNK_ROWS):
+        sl = slice(lo, lo + CHUNK_ROWS)
+        cols = {
+            "charging_time": minutes_arr[mi[sl]],
+            "is_festival": festival[sl].astype(np.int64),
+            "is_weekend": (day[sl] >= 5).astype(np.int64),
+            "total_minutes": slot[sl].astype(np.int64) * TABLE_SLOT_MINUTES,
+            "user_type_code": user[sl].astype(np.int64),
+            "day_code": day[sl].astype(np.int64),
+            "month_code": month[sl].astype(np.int64),
+        }
+        for j, text in enumerate(model_predict_columns(cols)):
+            code = label_ids.get(text)
+            if code is None:
+                code = label_ids[text] = len(labels)
+                labels.append(text)
+            codes[lo + j] = code
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    np.savez_compressed(
+        out_path,
+        codes=codes.reshape(shape),
+        labels=np.array(labels),
+        minutes=minutes_arr,
+        slot_minutes=np.int64(TABLE_SLOT_MINUTES),
+        model_mtime=np.float64(os.path.getmtime(model_path) if os.path.exists(model_path) else 0.0),
+    )
+    return {
+        "entries": int(codes.size),
+        "distinct_outputs": len(labels),
+        "seconds": round(time.perf_counter() - t0, 1),
+        "bytes": os.path.getsize(out_path),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--minutes", default=",".join(str(m) for m in DEFAULT_MINUTES))
+    ap.add_argument("--out", default=ACTIVITY_TABLE_PATH)
+    args = ap.parse_args()
+
+    ml_predictor._load_pipeline()
+    if ml_predictor.model_pipeline is None:
+        raise SystemExit(f"model not found at {MODEL_PATH}")
+    minutes = sorted({int(m) for m in args.minutes.split(",") if m.strip()})
+    info = compile_table(minutes, args.out)
+    print(" Activity table written:", args.out, info)
+
+
+if __name__ == "__main__":
+    main()
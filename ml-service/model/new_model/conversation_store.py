@@ -0,0 +1,281 @@
+import abc
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+CHAT_STORE_BACKEND = os.getenv("CHAT_STORE_BACKEND", "memory")  # memory | sqlite
+CHAT_STORE_PATH = os.getenv("CHAT_STORE_PATH", "chat_store.sqlite3")
+CHAT_MAX_MESSAGES = int(os.getenv("CHAT_MAX_MESSAGES", "40"))
+CHAT_IDLE_TTL_S = float(os.getenv("CHAT_IDLE_TTL_S", str(6 * 3600)))
+CHAT_MAX_CONVERSATIONS = int(os.getenv("CHAT_MAX_CONVERSATIONS", "10000"))
+CHAT_MEMORY_BUDGET_BYTES = int(os.getenv("CHAT_MEMORY_BUDGET_BYTES", str(64 * 1024 * 1024)))
+
+# rough per-message bookkeeping cost on top of the text itself
+_MESSAGE_OVERHEAD_BYTES = 64
+
+
+def _message_size(role: str, text: str) -> int:
+    return len(role) + len(text.encode("utf-8")) + _MESSAGE_OVERHEAD_BYTES
+
+
+class ConversationStore(abc.ABC):
+    """
+    Conversation history for /chat:
+      { "messages": [{"role": "user"|"ai", "text": "..."}], "user_type": str | None }
+
+    Bounded on every axis: messages per conversation (oldest dropped), idle
+    TTL, number of conversations and total bytes (least recently used
+    conversations evicted first).
+    """
+
+    def __init__(self, max_messages: int = CHAT_MAX_MESSAGES, idle_ttl_s: float = CHAT_IDLE_TTL_S,
+                 max_conversations: int = CHAT_MAX_CONVERSATIONS, budget_bytes: int = CHAT_MEMORY_BUDGET_BYTES):
+        self.max_messages = max_messages
+        self.idle_ttl_s = idle_ttl_s
+        self.max_conversations = max_conversations
+        self.budget_bytes = budget_bytes
+
+        self.expired = 0
+        self.evicted = 0
+        self.trimmed_messages = 0
+
+    @abc.abstractmethod
+    def load(self, conversation_id: str) -> Dict[str, Any]:
+        """Snapshot of the conversation (an empty one if unknown or evicted)."""
+        ...
+
+    @abc.abstractmethod
+    def append_message(self, conversation_id: str, role: str, text: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def set_user_type(self, conversation_id: str, user_type: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def live_conversations(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def bytes_held(self) -> int:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "live_conversations": self.live_conversations(),
+            "bytes_held": self.bytes_held(),
+            "budget_bytes": self.budget_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "trimmed_messages": self.trimmed_messages,
+        }
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Per-process store; conversations are not shared between uvicorn workers."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        # conversation_id -> {"messages", "user_type", "bytes", "touched"}, LRU order
+        self._convs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+
+    def _sweep(self, now: float):
+        while self._convs:
+            cid, conv = next(iter(self._convs.items()))
+            if now - conv["touched"] <= self.idle_ttl_s:
+                break
+            self._drop(cid)
+            self.expired += 1
+        while self._convs and (len(self._convs) > self.max_conversations or self._bytes > self.budget_bytes):
+            self._drop(next(iter(self._convs)))
+            self.evicted += 1
+
+    def _drop(self, cid: str):
+        conv = self._convs.pop(cid)
+        self._bytes -= conv["bytes"]
+
+    def _touch(self, cid: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._sweep(now)
+        conv = self._convs.get(cid)
+        if conv is None:
+            conv = {"messages": [], "user_type": None, "bytes": 0, "touched": now}
+            self._convs[cid] = conv
+        conv["touched"] = now
+        self._convs.move_to_end(cid)
+        return conv
+
+    def load(self, conversation_id: str) -> Dict[str, Any]:
+        with self._lock:
+            conv = self._convs.get(conversation_id)
+            if conv is None or time.monotonic() - conv["touched"] > self.idle_ttl_s:
+                return {"messages": [], "user_type": None}
+            msgs = [{"role": m["role"], "text": m["text"]} for m in conv["messages"]]
+            return {"messages": msgs, "user_type": conv["user_type"]}
+
+    def append_message(self, conversation_id: str, role: str, text: str) -> None:
+        with self._lock:
+            conv = self._touch(conversation_id)
+            size = _message_size(role, text)
+            conv["messages"].append({"role": role, "text": text, "_size": size})
+            conv["bytes"] += size
+            self._bytes += size
+
+            overflow = len(conv["messages"]) - self.max_messages
+            if overflow > 0:
+                freed = sum(m["_size"] for m in conv["messages"][:overflow])
+                del conv["messages"][:overflow]
+                conv["bytes"] -= freed
+                self._bytes -= freed
+                self.trimmed_messages += overflow
+            self._sweep(time.monotonic())
+
+    def set_user_type(self, conversation_id: str, user_type: str) -> None:
+        with self._lock:
+            self._touch(conversation_id)["user_type"] = user_type
+
+    def live_conversations(self) -> int:
+        return len(self._convs)
+
+    def bytes_held(self) -> int:
+        return self._bytes
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Local-file store shared by every worker on the host (WAL mode). Expiry
+    and budget eviction run on writes, so idle workers do not need a sweeper.
+    """
+
+    def __init__(self, path: str = CHAT_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                cid TEXT PRIMARY KEY,
+                user_type TEXT,
+                touched REAL NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS conversations_touched ON conversations (touched);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cid TEXT NOT NULL,
+                role TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_cid ON messages (cid, id);
+            """
+        )
+
+    # wall clock: shared between processes
+    def _now(self) -> float:
+        return time.time()
+
+    def _delete(self, cids: List[str]):
+        for cid in cids:
+            self._db.execute("DELETE FROM messages WHERE cid = ?", (cid,))
+            self._db.execute("DELETE FROM conversations WHERE cid = ?", (cid,))
+
+    def _sweep(self, now: float):
+        stale = [r[0] for r in self._db.execute(
+            "SELECT cid FROM conversations WHERE touched < ?", (now - self.idle_ttl_s,)
+        )]
+        self._delete(stale)
+        self.expired += len(stale)
+
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM conversations").fetchone()
+        if count <= self.max_conversations and total <= self.budget_bytes:
+            return
+        victims = []
+        for cid, size in self._db.execute("SELECT cid, bytes FROM conversations ORDER BY touched"):
+            if count <= self.max_conversations and total <= self.budget_bytes:
+                break
+            victims.append(cid)
+            count -= 1
+            total -= size
+        self._delete(victims)
+        self.evicted += len(victims)
+
+    def _touch(self, cid: str, now: float):
+        self._db.execute(
+            "INSERT INTO conversations (cid, touched) VALUES (?, ?) "
+            "ON CONFLICT(cid) DO UPDATE SET touched = excluded.touched",
+            (cid, now),
+        )
+
+    def load(self, conversation_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT user_type, touched FROM conversations WHERE cid = ?", (conversation_id,)
+            ).fetchone()
+            if row is None or self._now() - row[1] > self.idle_ttl_s:
+                return {"messages": [], "user_type": None}
+            msgs = [
+                {"role": role, "text": text}
+                for role, text in self._db.execute(
+                    "SELECT role, text FROM messages WHERE cid = ? ORDER BY id", (conversation_id,)
+                )
+            ]
+            return {"messages": msgs, "user_type": row[0]}
+
+    def append_message(self, conversation_id: str, role: str, text: str) -> None:
+        with self._lock:
+            now = self._now()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._touch(conversation_id, now)
+                self._db.execute(
+                    "INSERT INTO messages (cid, role, text, size) VALUES (?, ?, ?, ?)",
+                    (conversation_id, role, text, _message_size(role, text)),
+                )
+                trimmed = self._db.execute(
+                    "DELETE FROM messages WHERE cid = ? AND id NOT IN "
+                    "(SELECT id FROM messages WHERE cid = ? ORDER BY id DESC LIMIT ?)",
+                    (conversation_id, conversation_id, self.max_messages),
+                ).rowcount
+                self.trimmed_messages += max(trimmed, 0)
+                self._db.execute(
+                    "UPDATE conversations SET bytes = "
+                    "(SELECT COALESCE(SUM(size), 0) FROM messages WHERE cid = ?) WHERE cid = ?",
+                    (conversation_id, conversation_id),
+                )
+                self._sweep(now)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def set_user_type(self, conversation_id: str, user_type: str) -> None:
+        with self._lock:
+            self._touch(conversation_id, self._now())
+            self._db.execute("UPDATE conversations SET user_type = ? WHERE cid = ?", (user_type, conversation_id))
+
+    def live_conversations(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def bytes_held(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM conversations").fetchone()[0]
+
+
+def create_conversation_store(backend: Optional[str] = None) -> ConversationStore:
+    backend = (backend or CHAT_STORE_BACKEND).lower()
+    if backend == "sqlite":
+        return SQLiteConversationStore()
+    if backend == "memory":
+        return InMemoryConversationStore()
+    raise ValueError(f"unknown CHAT_STORE_BACKEND: {backend}")
@@ -1,11 +1,24 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_db_connection():
-    return psycopg2.connect(
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# how long a handler waits for a free connection before giving up
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "5"))
+# connections idle longer than this are pinged before being handed out
+DB_POOL_PING_AFTER_S = float(os.getenv("DB_POOL_PING_AFTER_S", "30"))
+
+
+def _connect_kwargs():
+    return dict(
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT"),
         database=os.getenv("DB_NAME"),
@@ -13,3 +26,125 @@ def get_db_connection():
         password=os.getenv("DB_PASS"),
         connect_timeout=5,
     )
+
+
+def get_db_connection():
+    """Standalone (unpooled) connection, for scripts and one-off checks."""
+    return psycopg2.connect(**_connect_kwargs())
+
+
+class DatabasePool:
+    """
+    ThreadedConnectionPool with bounded waiting, pre-ping health checks and
+    saturation counters. All calls are blocking; async handlers should run
+    them through run_in_threadpool.
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout_s: float = DB_POOL_TIMEOUT_S, ping_after_s: float = DB_POOL_PING_AFTER_S):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout_s = timeout_s
+        self.ping_after_s = ping_after_s
+
+        self._pool: pool.ThreadedConnectionPool | None = None
+        self._open_lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of waiting when exhausted
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self._last_used = {}
+
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._max_wait_ms = 0.0
+
+    def open(self):
+        with self._open_lock:
+            if self._pool is None:
+                self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **_connect_kwargs())
+
+    def close(self):
+        with self._open_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if conn.closed or idle > self.ping_after_s:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._pool.putconn(conn, close=True)
+                with self._stats_lock:
+                    self._reconnects += 1
+                conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if self._pool is None:
+            self.open()
+
+        t0 = time.perf_counter()
+        with self._stats_lock:
+            self._waiting += 1
+        got = self._slots.acquire(timeout=self.timeout_s)
+        wait_ms = (time.perf_counter() - t0) * 1000.0
+        with self._stats_lock:
+            self._waiting -= 1
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+            if not got:
+                self._timeouts += 1
+        if not got:
+            raise pool.PoolError(f"no database connection free after {self.timeout_s}s")
+
+        conn = None
+        try:
+            conn = self._checkout()
+            with self._stats_lock:
+                self._in_use += 1
+                self._acquired += 1
+            yield conn
+            conn.rollback()  # read-only callers; never leave a transaction open
+        finally:
+            if conn is not None:
+                with self._stats_lock:
+                    self._in_use -= 1
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    def ping(self) -> bool:
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            print(" DB ping failed:", e)
+            return False
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "open": self._pool is not None,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.maxconn, 2),
+                "acquired_total": self._acquired,
+                "wait_timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "max_wait_ms": round(self._max_wait_ms, 1),
+            }
+
+
+db_pool = DatabasePool()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# point at a local stub server for tests / offline runs
+GMAPS_DISTANCE_MATRIX_URL = os.getenv(
+    "GMAPS_DISTANCE_MATRIX_URL", "https://maps.googleapis.com/maps/api/distancematrix/json"
+)
+GMAPS_TIMEOUT_S = float(os.getenv("GMAPS_TIMEOUT_S", "4"))
+GMAPS_MAX_CONNECTIONS = int(os.getenv("GMAPS_MAX_CONNECTIONS", "20"))
+
+# Distance Matrix per-request limits (single origin, so destinations bound us)
+MAX_DESTINATIONS_PER_REQUEST = 25
+MAX_ELEMENTS_PER_REQUEST = 100
+
+Location = Union[str, Tuple[float, float]]
+
+
+def _fmt(loc: Location) -> str:
+    if isinstance(loc, str):
+        return loc
+    return f"{float(loc[0])},{float(loc[1])}"
+
+
+class DistanceMatrixError(RuntimeError):
+    pass
+
+
+class DistanceMatrixClient:
+    """
+    Async Google Distance Matrix client.
+
+    One pooled keep-alive httpx client per process; large destination lists
+    are split into request-sized chunks that are fetched concurrently, each
+    with its own deadline. Returns one element dict per destination in input
+    order (same shape as rows[0].elements from the API); chunks that fail or
+    time out come back as {"status": "<reason>"} so callers just skip them.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = GMAPS_DISTANCE_MATRIX_URL,
+        timeout_s: float = GMAPS_TIMEOUT_S,
+        max_connections: int = GMAPS_MAX_CONNECTIONS,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout_s = timeout_s
+        self._client = httpx.AsyncClient(
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(timeout_s, connect=min(2.0, timeout_s)),
+            limits=httpx.Limits(max_keepalive_connections=max_connections, max_connections=max_connections),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _fetch_chunk(self, origin: str, destinations: Sequence[str], mode: str) -> List[Dict[str, Any]]:
+        params = {
+            "origins": origin,
+            "destinations": "|".join(destinations),
+            "mode": mode,
+            "key": self.api_key,
+        }
+        r = await asyncio.wait_for(self._client.get(self.base_url, params=params), self.timeout_s)
+        r.raise_for_status()
+        data = r.json()
+        if data.get("status") != "OK":
+            raise DistanceMatrixError(f"{data.get('status')}: {data.get('error_message', '')}".strip())
+        rows = data.get("rows") or []
+        elements = rows[0].get("elements") if rows else []
+        if len(elements) != len(destinations):
+            raise DistanceMatrixError("element count does not match destinations")
+        return elements
+
+    async def distance_matrix(
+        self,
+        origin: Location,
+        destinations: Sequence[Location],
+        mode: str = "driving",
+    ) -> List[Dict[str, Any]]:
+        if not destinations:
+            return []
+        origin_s = _fmt(origin)
+        dest_s = [_fmt(d) for d in destinations]
+        size = min(MAX_DESTINATIONS_PER_REQUEST, MAX_ELEMENTS_PER_REQUEST)
+        chunks = [dest_s[i:i + size] for i in range(0, len(dest_s), size)]
+
+        results = await asyncio.gather(
+            *(self._fetch_chunk(origin_s, c, mode) for c in chunks), return_exceptions=True
+        )
+
+        elements: List[Dict[str, Any]] = []
+        for chunk, res in zip(chunks, results):
+            if isinstance(res, BaseException):
+                reason = "DEADLINE_EXCEEDED" if isinstance(res, (asyncio.TimeoutError, httpx.TimeoutException)) else "ERROR"
+                # exception text carries the request URL (and key), so log the type only
+                print(f" Distance Matrix chunk failed ({reason}): {type(res).__name__}")
+                elements.extend({"status": reason} for _ in chunk)
+            else:
+                elements.extend(res)
+        return elements
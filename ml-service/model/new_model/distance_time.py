@@ -1,103 +1,111 @@
+import asyncio
 import os
-import random
-import googlemaps
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
 from dotenv import load_dotenv
 
+from distance_matrix import DistanceMatrixClient
+from travel_time_cache import travel_time_cache
+from wait_time import wait_model
+
 load_dotenv()
 
 GMAPS_API_KEY = os.getenv("GMAPS_API_KEY")
 if not GMAPS_API_KEY:
     raise RuntimeError("GMAPS_API_KEY missing in .env")
 
-gmaps_client = googlemaps.Client(key=GMAPS_API_KEY)
+gmaps_client = DistanceMatrixClient(GMAPS_API_KEY)
 
 
-def analyze_stations_logic(origin, stations_list, min_wait_hours: float = 0.01):
+async def analyze_stations_logic(origin, stations_list, min_wait_hours: float = 0.0):
     """
     Returns:
       best_station: dict | None
-      sorted_list: list[dict] sorted by smallest wait (but ONLY stations with wait > 0)
+      sorted_list: list[dict] sorted by smallest wait at arrival
 
-    Uses Google Distance Matrix for real driving time/distance.
+    Uses Google Distance Matrix (async, chunked; see distance_matrix.py)
+    for real driving time/distance, through the per-origin-cell travel time
+    cache so only unseen origin-station pairs are fetched.
 
-    Wait is demo (queue_initial random) but stable per station name.
+    Wait is the M/M/c estimate of wait_time.py (charger status and power,
+    prior arrival rates or a configured booking history) at the time the
+    driver arrives.
+    The charger refresh, when due, runs alongside the Distance Matrix call.
 
     min_wait_hours:
-      - stations with wait_at_arrival < min_wait_hours are ignored
-      - use 0.01 to avoid float rounding issues showing "0.0"
+      - stations with wait_at_arrival < min_wait_hours are ignored (0: keep all)
     """
     if not stations_list:
         return None, []
 
-    dest_coords = [(float(s["lat"]), float(s["lng"])) for s in stations_list]
-
     try:
-        matrix = gmaps_client.distance_matrix(
-            origins=[origin],
-            destinations=dest_coords,
-            mode="driving",
+        elements, _ = await asyncio.gather(
+            travel_time_cache.elements(gmaps_client, origin, stations_list, mode="driving"),
+            wait_model.refresh_async(),
         )
-
-        rows = matrix.get("rows") or []
-        if not rows:
-            return None, []
-
-        elements = rows[0].get("elements") or []
-
-        processed = []
-        for i, s in enumerate(stations_list):
-            if i >= len(elements):
-                continue
-
-            el = elements[i]
-            if el.get("status") != "OK":
-                continue
-
-            duration_sec = el["duration"]["value"]
-            distance_m = el["distance"]["value"]
-            trip_time_hrs = duration_sec / 3600.0
-
-            # Stable pseudo queue per station (demo until you have real queues)
-            random.seed(hash(s.get("name", "")) % 10_000)
-            queue_hrs = random.uniform(1, 10)
-
-            wait_at_arrival = max(0.0, queue_hrs - trip_time_hrs)
-
-            
-            if wait_at_arrival < min_wait_hours:
-                continue
-
-            processed.append({
-                "name": s["name"],
-                "address": s.get("address", "N/A"),
-                "status": s.get("status", None),
-
-                "wait": round(wait_at_arrival, 2),          # hours (display)
-                "travel_time": el["duration"]["text"],
-                "distance": el["distance"]["text"],
-
-                "queue_initial": round(queue_hrs, 2),       # demo
-                "lat": float(s["lat"]),
-                "lng": float(s["lng"]),
-
-                # sorting helpers
-                "_wait_raw": wait_at_arrival,
-                "_duration_sec": duration_sec,
-                "_distance_m": distance_m,
-            })
-
-        #  Sort: smallest wait first, then shortest drive time, then shortest distance
-        processed.sort(key=lambda x: (x["_wait_raw"], x["_duration_sec"], x["_distance_m"]))
-
-        # Remove helper fields
-        for p in processed:
-            p.pop("_wait_raw", None)
-            p.pop("_duration_sec", None)
-            p.pop("_distance_m", None)
-
+        processed = rank_stations(stations_list, elements, min_wait_hours)
         best = processed[0] if processed else None
         return best, processed
 
     except Exception as e:
         print(f"Logic Error: {e}")
         return None, []
+
+
+def rank_stations(
+    stations_list: List[Dict[str, Any]],
+    elements: List[Dict[str, Any]],
+    min_wait_hours: float = 0.0,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Turn Distance Matrix elements (one per station, same order) into the
+    display records, sorted by wait, then drive time, then distance. Waits
+    for all reachable stations come from one wait_model.estimate call.
+    """
+    ok = [i for i in range(min(len(stations_list), len(elements))) if elements[i].get("status") == "OK"]
+    if not ok:
+        return []
+    trip_hours = [elements[i]["duration"]["value"] / 3600.0 for i in ok]
+    waits = wait_model.estimate([stations_list[i] for i in ok], trip_hours, now)
+
+    processed = []
+    for j, i in enumerate(ok):
+        s, el = stations_list[i], elements[i]
+        wait_at_arrival = float(waits["wait_at_arrival_h"][j])
+
+        if wait_at_arrival < min_wait_hours:
+            continue
+
+        processed.append({
+            "name": s["name"],
+            "address": s.get("address", "N/A"),
+            "status": s.get("status", None),
+
+            "wait": round(wait_at_arrival, 2),          # hours (display)
+            "travel_time": el["duration"]["text"],
+            "distance": el["distance"]["text"],
+
+            "queue_initial": round(float(waits["queue_now_h"][j]), 2),  # expected wait if there now
+            "chargers_total": int(waits["chargers_total"][j]),
+            "chargers_available": int(waits["chargers_available"][j]),
+            "lat": float(s["lat"]),
+            "lng": float(s["lng"]),
+
+            # sorting helpers
+            "_wait_raw": wait_at_arrival,
+            "_duration_sec": el["duration"]["value"],
+            "_distance_m": el["distance"]["value"],
+        })
+
+    #  Sort: smallest wait first, then shortest drive time, then shortest distance
+    processed.sort(key=lambda x: (x["_wait_raw"], x["_duration_sec"], x["_distance_m"]))
+
+    # Remove helper fields
+    for p in processed:
+        p.pop("_wait_raw", None)
+        p.pop("_duration_sec", None)
+        p.pop("_distance_m", None)
+
+    return processed
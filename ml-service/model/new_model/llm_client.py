@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from groq import AsyncGroq
+
+load_dotenv()
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+# per-call deadlines, retries included; a late answer is dropped, not awaited
+LLM_CLASSIFY_TIMEOUT_S = float(os.getenv("LLM_CLASSIFY_TIMEOUT_S", "3"))
+LLM_REPLY_TIMEOUT_S = float(os.getenv("LLM_REPLY_TIMEOUT_S", "12"))
+# /chat reply budget: past it the local template reply is served instead
+# (first token for /chat/stream); 0 gives the LLM its full timeout
+LLM_REPLY_BUDGET_S = float(os.getenv("LLM_REPLY_BUDGET_S", "6"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "512"))
+
+USER_TYPE_CACHE_TTL_S = float(os.getenv("USER_TYPE_CACHE_TTL_S", str(6 * 3600)))
+USER_TYPE_CACHE_MAX_ENTRIES = int(os.getenv("USER_TYPE_CACHE_MAX_ENTRIES", "20000"))
+
+
+def prompt_fingerprint(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class LLMClient:
+    """
+    Async Groq client shared by the /chat calls. Every call runs under its
+    own deadline; failures and timeouts come back as None (or end the
+    stream early) so the caller picks its fallback instead of holding the
+    request.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model: str = GROQ_MODEL, max_retries: int = LLM_MAX_RETRIES):
+        self.model = model
+        self._client = AsyncGroq(api_key=api_key or os.getenv("GROQ_API_KEY"), max_retries=max_retries)
+
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._latency_ms: Dict[str, deque] = {}
+        # kind -> {"calls", "prompt", "completion", "cached"} totals and a window of prompt sizes
+        self._tokens: Dict[str, Dict[str, int]] = {}
+        self._prompt_tokens: Dict[str, deque] = {}
+
+    async def aclose(self):
+        await self._client.close()
+
+    def _record(self, kind: str, started: float):
+        window = self._latency_ms.setdefault(kind, deque(maxlen=LLM_LATENCY_WINDOW))
+        window.append((time.perf_counter() - started) * 1000.0)
+
+    def _record_usage(self, kind: str, usage):
+        """Token counts the API reports for one call (usage may be missing)."""
+        if usage is None:
+            return
+        totals = self._tokens.setdefault(kind, {"calls": 0, "prompt": 0, "completion": 0, "cached": 0})
+        details = getattr(usage, "prompt_tokens_details", None)
+        totals["calls"] += 1
+        totals["prompt"] += usage.prompt_tokens or 0
+        totals["completion"] += usage.completion_tokens or 0
+        totals["cached"] += (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        self._prompt_tokens.setdefault(kind, deque(maxlen=LLM_LATENCY_WINDOW)).append(usage.prompt_tokens or 0)
+
+    async def complete_json(self, kind: str, messages: List[Dict[str, str]], timeout_s: float) -> Optional[Dict[str, Any]]:
+        """JSON-mode completion parsed into a dict, or None on error / deadline."""
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            res = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    messages=messages,
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    timeout=timeout_s,
+                ),
+                timeout_s,
+            )
+            data = json.loads(res.choices[0].message.content)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f" LLM {kind} call exceeded {timeout_s:g}s")
+            return None
+        except Exception as e:
+            self.errors += 1
+            print(f" LLM {kind} call failed: {type(e).__name__}")
+            return None
+        self._record(kind, started)
+        self._record_usage(kind, getattr(res, "usage", None))
+        return data if isinstance(data, dict) else None
+
+    async def stream_text(self, kind: str, messages: List[Dict[str, str]], timeout_s: float) -> AsyncIterator[str]:
+        """
+        Plain-text completion yielded chunk by chunk. timeout_s bounds the
+        whole stream: past it, or on an error, the stream just ends (the
+        caller keeps what it got).
+        """
+        self.calls += 1
+        started = time.perf_counter()
+        deadline = started + timeout_s
+        stream = None
+        first = True
+        try:
+            stream = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    messages=messages, model=self.model, stream=True, timeout=timeout_s,
+                ),
+                timeout_s,
+            )
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - time.perf_counter()))
+                except StopAsyncIteration:
+                    break
+                # usage arrives on the last chunk (x_groq.usage, or usage with include_usage)
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                if usage is not None:
+                    self._record_usage(kind, usage)
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    if first:
+                        first = False
+                        self._record(f"{kind}_first_token", started)
+                    yield text
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f" LLM {kind} stream exceeded {timeout_s:g}s")
+            return
+        except Exception as e:
+            self.errors += 1
+            print(f" LLM {kind} stream failed: {type(e).__name__}")
+            return
+        finally:
+            if stream is not None:
+                await stream.close()
+        self._record(kind, started)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "model": self.model,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+        for kind, window in self._latency_ms.items():
+            ms = sorted(window)
+            out[f"{kind}_ms_p50"] = round(ms[len(ms) // 2], 1)
+            out[f"{kind}_ms_p95"] = round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 1)
+        for kind, totals in self._tokens.items():
+            n = totals["calls"]
+            sizes = sorted(self._prompt_tokens[kind])
+            out[f"{kind}_tokens"] = {
+                "calls": n,
+                "prompt_total": totals["prompt"],
+                "completion_total": totals["completion"],
+                "cached_total": totals["cached"],
+                "prompt_avg": round(totals["prompt"] / n, 1),
+                "completion_avg": round(totals["completion"] / n, 1),
+                "prompt_p95": sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))],
+            }
+        return out
+
+
+class UserTypeCache:
+    """
+    LRU + TTL cache of classified user types keyed by (conversation_id,
+    prompt fingerprint). Concurrent lookups of the same key share one
+    in-flight classification; a None result (LLM down) is not cached.
+    """
+
+    def __init__(self, ttl_s: float = USER_TYPE_CACHE_TTL_S, max_entries: int = USER_TYPE_CACHE_MAX_ENTRIES):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._store: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _get(self, key) -> Optional[str]:
+        item = self._store.get(key)
+        if item is None:
+            return None
+        ts, value = item
+        if time.monotonic() - ts > self.ttl_s:
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return value
+
+    def _put(self, key, value: str):
+        self._store[key] = (time.monotonic(), value)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+    async def get(
+        self,
+        conversation_id: str,
+        fingerprint: str,
+        classify: Callable[[], Awaitable[Optional[str]]],
+    ) -> Optional[str]:
+        key = (conversation_id, fingerprint)
+        value = self._get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await classify()
+        except BaseException:
+            # owner cancelled or failed: waiters fall back like on an LLM error
+            fut.set_result(None)
+            raise
+        else:
+            if value is not None:
+                self._put(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._store),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "ttl_s": self.ttl_s,
+        }
+
+
+llm_client = LLMClient()
+user_type_cache = UserTypeCache()
@@ -0,0 +1,80 @@
+import time
+from typing import Any, Dict, List, Optional
+
+# lead-in per user type; unknown types get the Casual_Driver one
+_LEAD_INS = {
+    "Delivery_Driver": "Quickest turnaround on your route",
+    "Business_Man": "Best place to plug in between meetings",
+    "Casual_Driver": "Best place to charge",
+    "Tourist": "Best place to charge on your trip",
+}
+
+
+def _hours_text(hours: Optional[float]) -> str:
+    if hours is None:
+        return "unknown"
+    minutes = int(round(float(hours) * 60))
+    if minutes < 60:
+        return f"{minutes} min"
+    h, m = divmod(minutes, 60)
+    return f"{h} h {m} min" if m else f"{h} h"
+
+
+def _station_line(s: Dict[str, Any]) -> str:
+    return f"{s['name']} (wait ~{_hours_text(s.get('wait'))}, {s.get('travel_time', '?')} drive, {s.get('distance', '?')})"
+
+
+class LocalResponder:
+    """
+    Deterministic template reply from the computed station decision and the
+    predicted activities; no network, well under a millisecond. Used when
+    the LLM fails, returns nothing, or misses the reply budget.
+    """
+
+    def __init__(self):
+        # reason -> replies served locally ("error", "budget")
+        self.fallbacks: Dict[str, int] = {}
+        self.last_ms = 0.0
+
+    def reply(
+        self,
+        reason: str,
+        best: dict,
+        sorted_list: List[dict],
+        activities: str,
+        charging_minutes: int,
+        user_type: str = "Casual_Driver",
+        start_city: str = "",
+        end_city: str = "",
+        **_prompt_args,
+    ) -> str:
+        """Takes the PromptBuilder.reply_messages arguments; ignores the conversation ones."""
+        t0 = time.perf_counter()
+        lead = _LEAD_INS.get(user_type, _LEAD_INS["Casual_Driver"])
+        trip = f" from {start_city} to {end_city}" if start_city and end_city else ""
+
+        lines = [f"⚡ {lead}{trip}: {_station_line(best)}."]
+        address = best.get("address")
+        if address and address != "N/A":
+            lines.append(f"Address: {address}.")
+
+        alternatives = [s for s in sorted_list if s["name"] != best["name"]][:2]
+        if alternatives:
+            lines.append("Alternatives: " + "; ".join(_station_line(a) for a in alternatives) + ".")
+
+        lines.append(f"🔋 Charging should take about {_hours_text(charging_minutes / 60.0)}.")
+        if activities:
+            lines.append(f"While you wait: {activities}.")
+
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+        self.last_ms = (time.perf_counter() - t0) * 1000.0
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fallbacks": dict(self.fallbacks),
+            "last_ms": round(self.last_ms, 3),
+        }
+
+
+local_responder = LocalResponder()
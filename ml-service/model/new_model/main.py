@@ -1,64 +1,38 @@
+import asyncio
 import os
 import json
 import random
 import traceback
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Union
 
-import pandas as pd
 from dotenv import load_dotenv
 
 
-def transform_features(X_df: pd.DataFrame) -> pd.DataFrame:
-    X_copy = X_df.copy()
-
-    time_split = X_copy["time"].str.split(":", expand=True).astype(int)
-    X_copy["total_minutes"] = (time_split[0] * 60) + time_split[1]
-
-    user_mapping = {
-        "Office_Worker": 0,
-        "Tourist": 1,
-        "Delivery_Driver": 2,
-        "Casual_User": 3,
-    }
-    day_mapping = {
-        "Monday": 0,
-        "Tuesday": 1,
-        "Wednesday": 2,
-        "Thursday": 3,
-        "Friday": 4,
-        "Saturday": 5,
-        "Sunday": 6,
-    }
-    month_mapping = {
-        "January": 0, "February": 1, "March": 2, "April": 3,
-        "May": 4, "June": 5, "July": 6, "August": 7,
-        "September": 8, "October": 9, "November": 10, "December": 11,
-    }
-
-    X_copy["user_type_code"] = X_copy["user_type"].map(user_mapping)
-    X_copy["day_code"] = X_copy["day"].map(day_mapping)
-    X_copy["month_code"] = X_copy["month"].map(month_mapping)
-
-    return X_copy.drop(["time", "day", "month", "user_type"], axis=1)
-
-
-
-import __main__  
-__main__.transform_features = transform_features
-
-
 load_dotenv()
 
-from fastapi import FastAPI  
+from fastapi import FastAPI, Response  
+from fastapi.concurrency import run_in_threadpool  
 from fastapi.middleware.cors import CORSMiddleware  
+from fastapi.middleware.gzip import GZipMiddleware  
+from fastapi.responses import StreamingResponse  
 from pydantic import BaseModel, Field 
 
-from groq import Groq  
-from psycopg2.extras import RealDictCursor  
+from chat_stream import StreamTimer, sse_event, stream_stats  
+from conversation_store import create_conversation_store  
+from database import db_pool  
+from distance_time import analyze_stations_logic, gmaps_client  
+from llm_client import LLM_CLASSIFY_TIMEOUT_S, LLM_REPLY_BUDGET_S, LLM_REPLY_TIMEOUT_S, llm_client, prompt_fingerprint, user_type_cache  
+from local_responder import local_responder  
+from ml_predictor import activity_batcher, load_model  
+from prompt_builder import APP_USER_TYPES, prompt_builder  
+from station_index import station_index  
+from travel_time_cache import travel_time_cache  
+from wait_time import wait_model  
 
-from database import get_db_connection  
-from distance_time import analyze_stations_logic  
-from ml_predictor import load_model, predict_activities  
+try:
+    import orjson
+except ImportError:  # optional speed-up for large station payloads
+    orjson = None
 
 
 
@@ -67,8 +41,6 @@ try:
 except Exception as e:
     print(f" ML model load failed: {e}")
 
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
 
 app = FastAPI()
 app.add_middleware(
@@ -78,15 +50,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# compresses any response over ~1 KB for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024")))
+
+
+@app.on_event("startup")
+def open_db_pool():
+    try:
+        db_pool.open()
+    except Exception as e:
+        # keep serving /chat; DB handlers retry opening on first use
+        print(f" DB pool open failed: {e}")
 
 
-CHAT_STORE: Dict[str, Dict[str, Any]] = {}
-# { conversation_id: { "messages": [{"role":"user/ai","text":"..."}], "user_type": "Tourist" } }
+@app.on_event("shutdown")
+async def close_clients():
+    db_pool.close()
+    await gmaps_client.aclose()
+    await llm_client.aclose()
 
-APP_USER_TYPES = ["Delivery_Driver", "Business_Man", "Casual_Driver", "Tourist"]
+
+CHAT_STORE = create_conversation_store()
+# bounded; see conversation_store.py (CHAT_STORE_BACKEND=memory|sqlite)
 
 
 class Station(BaseModel):
+    station_id: Optional[Union[str, int]] = None
     name: str
     lat: float
     lng: float
@@ -97,6 +86,24 @@ class Station(BaseModel):
 class NearbyStationsRequest(BaseModel):
     path_points: List[dict]
     buffer_km: float = 5.0
+    # "compact" returns {"stations": {field: [value, ...]}} instead of a list of rows
+    format: str = "rows"
+
+
+def json_bytes_response(payload: Any) -> Response:
+    """Serialise once (orjson when installed) instead of jsonable_encoder + json.dumps."""
+    if orjson is not None:
+        body = orjson.dumps(payload, default=str)
+    else:
+        body = json.dumps(payload, default=str, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type="application/json")
+
+
+def station_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    keys: Dict[str, None] = {}
+    for r in rows:
+        keys.update(dict.fromkeys(r))
+    return {k: [r.get(k) for r in rows] for k in keys}
 
 
 class ChatRequest(BaseModel):
@@ -116,6 +123,8 @@ class ChatResponse(BaseModel):
     user_type: str
     best_station: Optional[dict] = None
     sorted_stations: List[dict] = []
+    # "llm", or "local" for the template reply (LLM down or over budget)
+    reply_source: Optional[str] = None
 
 
 
@@ -125,125 +134,93 @@ def get_origin(req: ChatRequest):
     return req.start_city
 
 
-def infer_user_type_llm(user_text: str, recent_messages: List[dict], start_city: str, end_city: str) -> str:
-    history_text = "\n".join([f"{m['role']}: {m['text']}" for m in recent_messages[-8:]])
-
-    prompt = f"""
-Classify the user into exactly ONE type:
-- Delivery_Driver
-- Business_Man
-- Casual_Driver
-- Tourist
-
-Trip: {start_city} -> {end_city}
-
-Conversation:
-{history_text}
-
-User message:
-{user_text}
+async def infer_user_type_llm(
+    conversation_id: str, user_text: str, history: List[dict], start_city: str, end_city: str
+) -> Optional[str]:
+    """
+    User type for the conversation, or None when the LLM is unavailable (not
+    cached, retried next turn). history: earlier messages, oldest first.
+    """
+    messages = prompt_builder.classify_messages(conversation_id, history, user_text, start_city, end_city)
 
-Return ONLY JSON:
-{{"user_type":"Casual_Driver"}}
-"""
-    try:
-        res = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.1-8b-instant",
-            response_format={"type": "json_object"},
+    async def classify() -> Optional[str]:
+        data = await llm_client.complete_json(
+            "classify", messages, LLM_CLASSIFY_TIMEOUT_S
         )
-        data = json.loads(res.choices[0].message.content)
+        if data is None:
+            return None
         ut = data.get("user_type", "Casual_Driver")
         return ut if ut in APP_USER_TYPES else "Casual_Driver"
-    except Exception:
-        return "Casual_Driver"
 
+    return await user_type_cache.get(conversation_id, prompt_fingerprint(messages[-1]["content"]), classify)
 
-def generate_chatbot_reply_llm(
-    user_text: str,
-    user_type: str,
-    best: dict,
-    sorted_list: list,
-    activities: str,
-    charging_minutes: int,
-    start_city: str,
-    end_city: str
-) -> str:
-    alternatives = [s for s in sorted_list if s["name"] != best["name"]][:2]
-    alt_text = "\n".join(
-        [f"- {a['name']}: wait {a['wait']}h, drive {a['travel_time']}, distance {a['distance']}"
-         for a in alternatives]
-    ) or "No strong alternatives found."
-
-    prompt = f"""
-You are AMPORA ⚡, a friendly and reliable EV travel assistant. Be clear, natural, and practical.
-
-User type: {user_type}
-Trip: {start_city} -> {end_city}
-User message: "{user_text}"
-
-IMPORTANT CONSTRAINT:
-- The station decision is already computed. Do NOT change the best station.
-
-BEST STATION:
-- Name: {best['name']}
-- Wait hours: {best['wait']}
-- Drive time: {best['travel_time']}
-- Distance: {best['distance']}
-- Address: {best.get('address','N/A')}
-
-Alternatives:
-{alt_text}
-
-Charging time estimate (temporary): {charging_minutes} minutes
-Activities predicted by ML: {activities}
-
-Knowledge & search rules:
-1) If you know the answer with high confidence, answer directly.
-2) If the user’s question involves real-world, location-based, time-sensitive, or uncertain information
-   (e.g. station ratings, nearby cafés/restrooms/shops, opening hours, pricing, traffic, availability),
-   automatically search the internet to verify.
-   The user does NOT need to ask you to search.
-3) When you use online information, clearly mention the source(s) briefly
-   (example: “Source: Google Maps reviews”, “Source: operator website”).
-4) Never invent ratings, reviews, prices, or availability. If data is unavailable, say so briefly.
-
-Conversation behavior:
-- Do NOT repeat the same long explanation if the user asks again or says “no”.
-  Adapt the response and move forward.
-- If the user already indicated work or holiday, do NOT ask again.
-- Ask at most ONE short follow-up question only if it genuinely helps refine the answer.
-- If battery level (SOC) is missing and required, ask once:
-  “What’s your battery level right now? (0–100%)”
-  If still missing, continue with reasonable assumptions.
-
-Response goals:
-1) Explain why this station is the best choice and briefly mention 1–2 alternatives.
-2) Suggest how to spend the charging wait using ML-predicted activities.
-3) If helpful, include nearby highly rated places (cafés/food/shops) with ratings and source.
-4) Friendly tone. Short paragraphs. Light emojis only if helpful (⚡🔋⭐).
-
-Output rules:
-- Be concise and user-friendly.
-- Do NOT change the computed station decision.
-- Return ONLY valid JSON in this exact format:
-
-{{"assistant_text":"..."}}
-
-"""
+
+async def generate_chatbot_reply_llm(**reply_args) -> Tuple[str, str]:
+    """
+    Whole reply in one JSON-mode call; reply_args as for
+    PromptBuilder.reply_messages. Returns (text, source): source "llm", or
+    "local" when the LLM failed or missed LLM_REPLY_BUDGET_S and the
+    template reply was served instead.
+    """
+    call = llm_client.complete_json(
+        "reply", prompt_builder.reply_messages("json", **reply_args), LLM_REPLY_TIMEOUT_S
+    )
     try:
-        res = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "Return ONLY valid JSON."},
-                {"role": "user", "content": prompt},
-            ],
-            model="llama-3.1-8b-instant",
-            response_format={"type": "json_object"},
-        )
-        data = json.loads(res.choices[0].message.content)
-        return (data.get("assistant_text") or "").strip() or "Done."
-    except Exception:
-        return "Done."
+        # wait_for cancels the LLM call when the budget runs out
+        data = await (asyncio.wait_for(call, LLM_REPLY_BUDGET_S) if LLM_REPLY_BUDGET_S > 0 else call)
+    except asyncio.TimeoutError:
+        return local_responder.reply("budget", **reply_args), "local"
+    text = (str(data.get("assistant_text") or "")).strip() if data is not None else ""
+    if not text:
+        return local_responder.reply("error", **reply_args), "local"
+    return text, "llm"
+
+
+async def stream_chatbot_reply_llm(**reply_args) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Same reply as plain text, yielded as (source, text) chunks while the
+    tokens arrive. LLM_REPLY_BUDGET_S bounds the wait for the first token;
+    past it, or when the stream fails before any text, the local template
+    reply is yielded instead. A stream cut off later keeps what it sent.
+    """
+    messages = prompt_builder.reply_messages("text", **reply_args)
+    stream = llm_client.stream_text("reply_stream", messages, LLM_REPLY_TIMEOUT_S)
+    try:
+        first = stream.__anext__()
+        text = await (asyncio.wait_for(first, LLM_REPLY_BUDGET_S) if LLM_REPLY_BUDGET_S > 0 else first)
+    except asyncio.TimeoutError:
+        yield "local", local_responder.reply("budget", **reply_args)
+        return
+    except StopAsyncIteration:
+        yield "local", local_responder.reply("error", **reply_args)
+        return
+    try:
+        yield "llm", text
+        async for text in stream:
+            yield "llm", text
+    finally:
+        await stream.aclose()
+
+
+# -----------------------
+# Endpoint: health
+# -----------------------
+@app.get("/health")
+async def health():
+    db_ok = await run_in_threadpool(db_pool.ping)
+    return {
+        "ok": db_ok,
+        "db_pool": db_pool.stats(),
+        "travel_time_cache": travel_time_cache.stats(),
+        "chat_store": await run_in_threadpool(CHAT_STORE.stats),
+        "activity_batcher": activity_batcher.stats(),
+        "llm": llm_client.stats(),
+        "user_type_cache": user_type_cache.stats(),
+        "chat_stream": stream_stats.stats(),
+        "prompt_builder": prompt_builder.stats(),
+        "local_responder": local_responder.stats(),
+        "wait_model": wait_model.stats(),
+    }
 
 
 # -----------------------
@@ -255,104 +232,188 @@ async def get_nearby_stations(req: NearbyStationsRequest):
     if not path_points:
         return {"stations": []}
 
-    lats = [p["lat"] for p in path_points]
-    lngs = [p["lng"] for p in path_points]
-
-    conn = get_db_connection()
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT name, latitude as lat, longitude as lng, address, status
-                FROM station
-                WHERE latitude BETWEEN %s AND %s
-                  AND longitude BETWEEN %s AND %s
-                """,
-                (min(lats) - 0.1, max(lats) + 0.1, min(lngs) - 0.1, max(lngs) + 0.1),
-            )
-            rows = cur.fetchall()
-
-        for r in rows:
-            r["lat"] = float(r["lat"])
-            r["lng"] = float(r["lng"])
-
-        return {"stations": rows}
+        rows = await run_in_threadpool(station_index.near_path, path_points, req.buffer_km)
+        if req.format == "compact":
+            return json_bytes_response({"stations": station_columns(rows), "format": "compact"})
+        return json_bytes_response({"stations": rows})
     except Exception as e:
         print(" DB error:", e)
         return {"stations": [], "error": str(e)}
-    finally:
-        conn.close()
 
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    try:
-       
-        if req.conversation_id not in CHAT_STORE:
-            CHAT_STORE[req.conversation_id] = {"messages": [], "user_type": None}
+async def resolve_user_type(req: ChatRequest, store: Dict[str, Any]) -> str:
+    if store["user_type"]:
+        return store["user_type"]
+    user_type = await infer_user_type_llm(
+        req.conversation_id, req.user_text, store["messages"][:-1], req.start_city, req.end_city
+    )
+    if user_type is None:
+        # LLM down or late: answer with the default, classify again next turn
+        return "Casual_Driver"
+    await run_in_threadpool(CHAT_STORE.set_user_type, req.conversation_id, user_type)
+    return user_type
 
-        store = CHAT_STORE[req.conversation_id]
-        store["messages"].append({"role": "user", "text": req.user_text})
 
-       
-        if not store["user_type"]:
-            store["user_type"] = infer_user_type_llm(
-                req.user_text, store["messages"], req.start_city, req.end_city
-            )
+NO_STATION_TEXT = " I couldn't find a suitable station. Try another route or increase station coverage."
+CHAT_ERROR_TEXT = " Error processing chat. Please try again."
+
+
+async def rank_turn(req: ChatRequest):
+    """
+    First stage of a turn: records the user message, then classifies the
+    user and ranks the stations together (they share no inputs).
+    Returns (user_type, best, sorted_list).
+    """
+    await run_in_threadpool(CHAT_STORE.append_message, req.conversation_id, "user", req.user_text)
+    store = await run_in_threadpool(CHAT_STORE.load, req.conversation_id)
+
+    stations_list = [s.model_dump() for s in req.stations] if req.stations else []
+
+    user_type, (best, sorted_list) = await asyncio.gather(
+        resolve_user_type(req, store),
+        analyze_stations_logic(get_origin(req), stations_list),
+    )
+    return user_type, best, sorted_list, store["messages"][:-1]
 
-        stations_list = [s.model_dump() for s in req.stations] if req.stations else []
 
-        origin = get_origin(req)
-        best, sorted_list = analyze_stations_logic(origin, stations_list)
+async def reply_inputs(
+    req: ChatRequest, user_type: str, best: dict, sorted_list: list, history: List[dict]
+) -> Dict[str, Any]:
+    """Second stage: activities for the user type; PromptBuilder.reply_messages arguments."""
+    charging_minutes = random.choice([30, 60, 90, 120, 150, 180, 210])
+
+    activities = await activity_batcher.predict(user_type, charging_minutes)
+
+    return dict(
+        conversation_id=req.conversation_id,
+        messages=history,
+        user_text=req.user_text,
+        user_type=user_type,
+        best=best,
+        sorted_list=sorted_list,
+        activities=activities,
+        charging_minutes=charging_minutes,
+        start_city=req.start_city,
+        end_city=req.end_city,
+    )
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    """
+    DAG per turn: user type and station ranking share no inputs and run
+    together; activities wait for the user type, the reply for everything.
+    A turn costs the slower of the first two plus the reply, not the sum.
+    """
+    try:
+       
+        cid = req.conversation_id
+        user_type, best, sorted_list, history = await rank_turn(req)
 
         if not best:
-            assistant_text = " I couldn't find a suitable station. Try another route or increase station coverage."
-            store["messages"].append({"role": "ai", "text": assistant_text})
+            await run_in_threadpool(CHAT_STORE.append_message, cid, "ai", NO_STATION_TEXT)
             return ChatResponse(
                 conversation_id=req.conversation_id,
-                assistant_text=assistant_text,
-                user_type=store["user_type"] or "Casual_Driver",
+                assistant_text=NO_STATION_TEXT,
+                user_type=user_type,
                 best_station=None,
                 sorted_stations=[],
             )
 
-        charging_minutes = random.choice([30, 60, 90, 120, 150, 180, 210])
-
-        activities = predict_activities(store["user_type"], charging_minutes)
-
-        assistant_text = generate_chatbot_reply_llm(
-            user_text=req.user_text,
-            user_type=store["user_type"],
-            best=best,
-            sorted_list=sorted_list,
-            activities=activities,
-            charging_minutes=charging_minutes,
-            start_city=req.start_city,
-            end_city=req.end_city,
+        assistant_text, reply_source = await generate_chatbot_reply_llm(
+            **await reply_inputs(req, user_type, best, sorted_list, history)
         )
 
-        store["messages"].append({"role": "ai", "text": assistant_text})
+        await run_in_threadpool(CHAT_STORE.append_message, cid, "ai", assistant_text)
 
         return ChatResponse(
             conversation_id=req.conversation_id,
             assistant_text=assistant_text,
-            user_type=store["user_type"],
+            user_type=user_type,
             best_station=best,
             sorted_stations=sorted_list,
+            reply_source=reply_source,
         )
 
     except Exception:
         traceback.print_exc()
         return ChatResponse(
             conversation_id=req.conversation_id,
-            assistant_text=" Error processing chat. Please try again.",
+            assistant_text=CHAT_ERROR_TEXT,
             user_type="Casual_Driver",
             best_station=None,
             sorted_stations=[],
         )
 
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    /chat as Server-Sent Events, same request body. Frames, in order:
+      event: stations  {conversation_id, user_type, best_station, sorted_stations, elapsed_ms}
+      event: token     {"text": "..."}                 (repeated)
+      event: done      {"assistant_text": "...", "reply_source": "llm"|"local", "timing_ms": {...}}
+    or a single "error" frame {"assistant_text": "..."}.
+
+    The stations frame is sent as soon as the ranking is done, so the
+    first byte waits for the ranking only; the reply then streams token by
+    token. Milestones are in timing_ms and on /health (chat_stream).
+    """
+    timer = StreamTimer()
+    cid = req.conversation_id
+
+    async def events():
+        completed = False
+        try:
+            user_type, best, sorted_list, history = await rank_turn(req)
+            yield sse_event("stations", {
+                "conversation_id": cid,
+                "user_type": user_type,
+                "best_station": best,
+                "sorted_stations": sorted_list if best else [],
+                "elapsed_ms": timer.mark("stations"),
+            })
+
+            reply_source = None
+            if not best:
+                parts = [NO_STATION_TEXT]
+                yield sse_event("token", {"text": NO_STATION_TEXT})
+            else:
+                parts = []
+                args = await reply_inputs(req, user_type, best, sorted_list, history)
+                async for reply_source, text in stream_chatbot_reply_llm(**args):
+                    if not parts:
+                        timer.mark("first_token")
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+
+            assistant_text = "".join(parts).strip()
+            await run_in_threadpool(CHAT_STORE.append_message, cid, "ai", assistant_text)
+            timer.mark("done")
+            completed = True
+            yield sse_event("done", {
+                "assistant_text": assistant_text,
+                "reply_source": reply_source,
+                "timing_ms": timer.as_dict(),
+            })
+        except Exception:
+            traceback.print_exc()
+            completed = True
+            yield sse_event("error", {"assistant_text": CHAT_ERROR_TEXT})
+        finally:
+            # completed stays False when the client went away mid-stream
+            stream_stats.record(timer, completed)
+
+    # text/event-stream is excluded from GZipMiddleware, frames go out unbuffered
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -1,27 +1,101 @@
+import asyncio
 import os
+import threading
+import time
+import warnings
+from datetime import datetime
+from typing import List, Optional, Sequence, Set, Tuple
+
 import joblib
+import numpy as np
 import pandas as pd
 import pytz
-from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MODEL_PATH = os.getenv("MODEL_PATH", "models/ev_recommendation_model_v4.pkl")
+ACTIVITY_TABLE_PATH = os.getenv("ACTIVITY_TABLE_PATH", os.path.splitext(MODEL_PATH)[0] + ".activities.npz")
+ACTIVITY_MODEL_LOAD = os.getenv("ACTIVITY_MODEL_LOAD", "lazy").lower()  # eager | lazy | never
+TABLE_SLOT_MINUTES = 15
+PREDICT_BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "5"))
+PREDICT_BATCH_MAX = int(os.getenv("PREDICT_BATCH_MAX", "64"))
+
+DEFAULT_ACTIVITIES = "Coffee, snack, short walk"
+LK_TZ = pytz.timezone("Asia/Colombo")
+
+USER_CODES = {
+    "Office_Worker": 0,
+    "Tourist": 1,
+    "Delivery_Driver": 2,
+    "Casual_User": 3,
+}
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTHS = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+DAY_CODES = {d: i for i, d in enumerate(DAYS)}
+MONTH_CODES = {m: i for i, m in enumerate(MONTHS)}
+
+
+def transform_features(X_df: pd.DataFrame) -> pd.DataFrame:
+    X_copy = X_df.copy()
+
+    time_split = X_copy["time"].str.split(":", expand=True).astype(int)
+    X_copy["total_minutes"] = (time_split[0] * 60) + time_split[1]
+
+    X_copy["user_type_code"] = X_copy["user_type"].map(USER_CODES)
+    X_copy["day_code"] = X_copy["day"].map(DAY_CODES)
+    X_copy["month_code"] = X_copy["month"].map(MONTH_CODES)
+
+    return X_copy.drop(["time", "day", "month", "user_type"], axis=1)
+
+
+# the pickled pipeline references __main__.transform_features
+import __main__
+__main__.transform_features = transform_features
+
 
 model_pipeline = None
 mlb = None
+activity_table = None
+_model_lock = threading.Lock()
+_model_load_failed = False
 
 def load_model():
-    global model_pipeline, mlb
+    """
+    Load the lookup table and/or the joblib pipeline per ACTIVITY_MODEL_LOAD:
+      eager - always load the pickle at startup
+      lazy  - with a table present, load the pickle on the first table miss
+      never - answer misses with the default text
+    """
+    global activity_table
+    activity_table = ActivityTable.load(ACTIVITY_TABLE_PATH, MODEL_PATH)
+    if ACTIVITY_MODEL_LOAD == "eager" or (ACTIVITY_MODEL_LOAD == "lazy" and activity_table is None):
+        _load_pipeline()
+
+def _load_pipeline():
+    global model_pipeline, mlb, _model_load_failed
     try:
         model_data = joblib.load(MODEL_PATH)
         model_pipeline = model_data["pipeline"]
         mlb = model_data["mlb"]
         print(" ML model loaded:", MODEL_PATH)
     except Exception as e:
+        _model_load_failed = True
         print(" ML model not loaded:", e)
 
+def _ensure_model() -> bool:
+    if model_pipeline is not None and mlb is not None:
+        return True
+    if ACTIVITY_MODEL_LOAD == "never" or _model_load_failed:
+        return False
+    with _model_lock:
+        if model_pipeline is None and not _model_load_failed:
+            _load_pipeline()
+    return model_pipeline is not None and mlb is not None
+
 def app_user_to_model_user(app_user_type: str) -> str:
     """
     Your UI types -> training types
@@ -36,35 +110,242 @@ def app_user_to_model_user(app_user_type: str) -> str:
     }
     return mapping.get(app_user_type, "Casual_User")
 
-def predict_activities(app_user_type: str, charging_time_minutes: int) -> str:
-    if model_pipeline is None or mlb is None:
-        return "Coffee, snack, short walk"
 
-    lk_tz = pytz.timezone("Asia/Colombo")
-    now_lk = datetime.now(lk_tz)
+# ---------- batch inference ----------
+# (app_user_type, charging_time_minutes, when) - when=None means "now" in Asia/Colombo
+PredictRow = Tuple[str, int, Optional[datetime]]
 
-    model_user_type = app_user_to_model_user(app_user_type)
 
-    input_df = pd.DataFrame([{
-        "user_type": model_user_type,
-        "charging_time": int(charging_time_minutes),
-        "time": now_lk.strftime("%H:%M"),
-        "day": now_lk.strftime("%A"),
-        "month": now_lk.strftime("%B"),
-        "is_festival": 0,
-        "is_weekend": 1 if now_lk.weekday() >= 5 else 0,
-    }])
+def _feature_matrix(rows: Sequence[PredictRow]) -> dict:
+    """Model features computed straight from the inputs, no string frame round trip."""
+    now_lk = datetime.now(LK_TZ)
+    n = len(rows)
+    cols = {
+        "charging_time": np.empty(n, dtype=np.int64),
+        "is_festival": np.zeros(n, dtype=np.int64),
+        "is_weekend": np.empty(n, dtype=np.int64),
+        "total_minutes": np.empty(n, dtype=np.int64),
+        "user_type_code": np.empty(n, dtype=np.int64),
+        "day_code": np.empty(n, dtype=np.int64),
+        "month_code": np.empty(n, dtype=np.int64),
+    }
+    for i, (user_type, minutes, when) in enumerate(rows):
+        t = when.astimezone(LK_TZ) if when is not None else now_lk
+        weekday = t.weekday()
+        cols["charging_time"][i] = int(minutes)
+        cols["is_weekend"][i] = 1 if weekday >= 5 else 0
+        cols["total_minutes"][i] = t.hour * 60 + t.minute
+        cols["user_type_code"][i] = USER_CODES[app_user_to_model_user(user_type)]
+        cols["day_code"][i] = weekday
+        cols["month_code"][i] = t.month - 1
+    return cols
 
-    try:
-        pred = model_pipeline.predict(input_df)
-        labels = mlb.inverse_transform(pred)
 
-        if labels and labels[0]:
-            cleaned = [x for x in labels[0] if x != "none"]
-            if cleaned:
-                return ", ".join(cleaned)
+def _labels_to_text(labels) -> str:
+    cleaned = [x for x in labels if x != "none"]
+    return ", ".join(cleaned) if cleaned else DEFAULT_ACTIVITIES
 
-        return "Coffee, snack, short walk"
+
+def _frame_from_columns(cols: dict) -> pd.DataFrame:
+    """The pipeline's original string input, for models without feature names."""
+    inv_users = {v: k for k, v in USER_CODES.items()}
+    return pd.DataFrame({
+        "user_type": [inv_users[int(c)] for c in cols["user_type_code"]],
+        "charging_time": cols["charging_time"],
+        "time": [f"{int(m) // 60:02d}:{int(m) % 60:02d}" for m in cols["total_minutes"]],
+        "day": [DAYS[int(c)] for c in cols["day_code"]],
+        "month": [MONTHS[int(c)] for c in cols["month_code"]],
+        "is_festival": cols["is_festival"],
+        "is_weekend": cols["is_weekend"],
+    })
+
+
+def model_predict_columns(cols: dict) -> List[str]:
+    """Run the loaded model on feature columns (as built by _feature_matrix)."""
+    clf = model_pipeline.steps[-1][1]
+    names = getattr(clf, "feature_names_in_", None)
+    if names is not None and set(names) == set(cols):
+        # skip transform_features: feed the classifier its columns directly
+        pred = clf.predict(pd.DataFrame({name: cols[name] for name in names}))
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pred = model_pipeline.predict(_frame_from_columns(cols))
+    return [_labels_to_text(labels) for labels in mlb.inverse_transform(pred)]
+
+
+def predict_activities_batch(rows: Sequence[PredictRow]) -> List[str]:
+    """
+    Score many (user_type, charging_time, timestamp) rows at once: lookup
+    table first, one model call for whatever the table does not cover.
+    """
+    if not rows:
+        return []
+    try:
+        cols = _feature_matrix(rows)
+        out = activity_table.lookup_many(cols) if activity_table is not None else [None] * len(rows)
+        miss = [i for i, v in enumerate(out) if v is None]
+        if miss:
+            if not _ensure_model():
+                return [v if v is not None else DEFAULT_ACTIVITIES for v in out]
+            sub = {k: v[miss] for k, v in cols.items()}
+            for i, text in zip(miss, model_predict_columns(sub)):
+                out[i] = text
+        return out
     except Exception as e:
         print(" ML predict error:", e)
-        return "Coffee, snack, short walk"
+        return [DEFAULT_ACTIVITIES] * len(rows)
+
+
+def predict_activities(app_user_type: str, charging_time_minutes: int) -> str:
+    return predict_activities_batch([(app_user_type, charging_time_minutes, None)])[0]
+
+
+# ---------- precomputed lookup table ----------
+class ActivityTable:
+    """
+    predict_activities outputs for the whole discrete input space, built
+    offline by compile_activity_table.py:
+      codes[user, minutes, slot, day, month, festival] -> index into labels
+    with slot = time of day in TABLE_SLOT_MINUTES steps (the model's
+    training resolution). is_weekend is implied by day.
+    """
+
+    def __init__(self, codes: np.ndarray, labels: List[str], minutes: Sequence[int], slot_minutes: int):
+        self.codes = codes
+        self.labels = labels
+        self.slot_minutes = slot_minutes
+        self.minute_index = {int(m): i for i, m in enumerate(minutes)}
+        # -1 marks charging times that were not compiled
+        self._minute_lut = np.full(max(self.minute_index) + 1, -1, dtype=np.int64)
+        for m, i in self.minute_index.items():
+            self._minute_lut[m] = i
+
+    @classmethod
+    def load(cls, path: str, model_path: str) -> "ActivityTable | None":
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                model_mtime = float(z["model_mtime"])
+                if os.path.exists(model_path) and abs(os.path.getmtime(model_path) - model_mtime) > 1.0:
+                    print(" Activity table is older than the model; ignoring:", path)
+                    return None
+                table = cls(z["codes"], [str(x) for x in z["labels"]], z["minutes"].tolist(), int(z["slot_minutes"]))
+            print(" Activity table loaded:", path, table.codes.shape)
+            return table
+        except Exception as e:
+            print(" Activity table not loaded:", e)
+            return None
+
+    def lookup_many(self, cols: dict) -> List[Optional[str]]:
+        minutes = cols["charging_time"]
+        known = minutes < len(self._minute_lut)
+        mi = np.where(known, self._minute_lut[np.where(known, minutes, 0)], -1)
+        hit = mi >= 0
+        out: List[Optional[str]] = [None] * len(minutes)
+        if not hit.any():
+            return out
+        idx = (
+            cols["user_type_code"][hit],
+            mi[hit],
+            cols["total_minutes"][hit] // self.slot_minutes,
+            cols["day_code"][hit],
+            cols["month_code"][hit],
+            cols["is_festival"][hit],
+        )
+        for i, code in zip(np.flatnonzero(hit).tolist(), self.codes[idx].tolist()):
+            out[i] = self.labels[code]
+        return out
+
+
+# ---------- micro-batching ----------
+class ActivityBatcher:
+    """
+    Coalesces concurrent /chat predictions: requests arriving within
+    window_ms of the first one are scored together in one model call, run
+    in a worker thread so the event loop keeps serving.
+    """
+
+    def __init__(self, window_ms: float = PREDICT_BATCH_WINDOW_MS, max_batch: int = PREDICT_BATCH_MAX):
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[Tuple[PredictRow, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # running _run tasks: the loop only holds weak references to them
+        self._running: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.failed_batches = 0
+        self.rows = 0
+        self.max_batch_seen = 0
+        self.last_batch_ms = 0.0
+
+    async def predict(self, app_user_type: str, charging_time_minutes: int, when: Optional[datetime] = None) -> str:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append(((app_user_type, charging_time_minutes, when), fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+        return await fut
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window_s)
+        self._flush_task = None
+        self._flush_now()
+
+    def _flush_now(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(lambda t: self._run_done(t, batch))
+
+    def _run_done(self, task: asyncio.Task, batch):
+        self._running.discard(task)
+        if task.cancelled():
+            error = "cancelled"
+        elif task.exception() is not None:
+            error = repr(task.exception())
+        else:
+            return
+        self.failed_batches += 1
+        print(f" ML batch task failed: {error}")
+        # never leave a /chat request waiting on a batch that died
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(DEFAULT_ACTIVITIES)
+
+    async def _run(self, batch):
+        t0 = time.perf_counter()
+        try:
+            out = await asyncio.to_thread(predict_activities_batch, [row for row, _ in batch])
+        except Exception as e:
+            print(" ML batch error:", e)
+            out = [DEFAULT_ACTIVITIES] * len(batch)
+        self.last_batch_ms = (time.perf_counter() - t0) * 1000.0
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        for (_, fut), text in zip(batch, out):
+            if not fut.done():
+                fut.set_result(text)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else None,
+            "max_batch": self.max_batch_seen,
+            "running": len(self._running),
+            "failed_batches": self.failed_batches,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+            "window_ms": self.window_s * 1000.0,
+        }
+
+
+activity_batcher = ActivityBatcher()
@@ -0,0 +1,264 @@
+import hashlib
+import os
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# token budget for the conversation part of a prompt: a running summary of
+# older turns plus as many recent turns as fit verbatim
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "600"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "200"))
+# one recent turn is clipped to this (assistant replies run long)
+PROMPT_TURN_MAX_TOKENS = int(os.getenv("PROMPT_TURN_MAX_TOKENS", "120"))
+# one older turn, as it goes into the summary
+PROMPT_SUMMARY_LINE_TOKENS = int(os.getenv("PROMPT_SUMMARY_LINE_TOKENS", "30"))
+PROMPT_SUMMARY_MAX_CONVERSATIONS = int(os.getenv("PROMPT_SUMMARY_MAX_CONVERSATIONS", "10000"))
+PROMPT_STATS_WINDOW = int(os.getenv("PROMPT_STATS_WINDOW", "512"))
+
+APP_USER_TYPES = ["Delivery_Driver", "Business_Man", "Casual_Driver", "Tourist"]
+
+# Static system sections: built once, byte-identical on every call, so the
+# provider can reuse them as a cached prefix. Everything that changes per
+# turn goes into the user message after them.
+CLASSIFY_SYSTEM_PROMPT = """Classify the user into exactly ONE type:
+""" + "\n".join(f"- {t}" for t in APP_USER_TYPES) + """
+
+Return ONLY JSON:
+{"user_type":"Casual_Driver"}"""
+
+_REPLY_SYSTEM_BASE = """You are AMPORA ⚡, a friendly and reliable EV travel assistant. Be clear, natural, and practical.
+
+IMPORTANT CONSTRAINT:
+- The station decision is already computed. Do NOT change the best station.
+
+Knowledge & search rules:
+1) If you know the answer with high confidence, answer directly.
+2) If the user’s question involves real-world, location-based, time-sensitive, or uncertain information
+   (e.g. station ratings, nearby cafés/restrooms/shops, opening hours, pricing, traffic, availability),
+   automatically search the internet to verify.
+   The user does NOT need to ask you to search.
+3) When you use online information, clearly mention the source(s) briefly
+   (example: “Source: Google Maps reviews”, “Source: operator website”).
+4) Never invent ratings, reviews, prices, or availability. If data is unavailable, say so briefly.
+
+Conversation behavior:
+- Do NOT repeat the same long explanation if the user asks again or says “no”.
+  Adapt the response and move forward.
+- If the user already indicated work or holiday, do NOT ask again.
+- Ask at most ONE short follow-up question only if it genuinely helps refine the answer.
+- If battery level (SOC) is missing and required, ask once:
+  “What’s your battery level right now? (0–100%)”
+  If still missing, continue with reasonable assumptions.
+
+Response goals:
+1) Explain why this station is the best choice and briefly mention 1–2 alternatives.
+2) Suggest how to spend the charging wait using ML-predicted activities.
+3) If helpful, include nearby highly rated places (cafés/food/shops) with ratings and source.
+4) Friendly tone. Short paragraphs. Light emojis only if helpful (⚡🔋⭐).
+
+Output rules:
+- Be concise and user-friendly.
+- Do NOT change the computed station decision.
+"""
+
+REPLY_SYSTEM_PROMPTS = {
+    "json": _REPLY_SYSTEM_BASE + """- Return ONLY valid JSON in this exact format:
+
+{"assistant_text":"..."}""",
+    "text": _REPLY_SYSTEM_BASE
+    + "- Reply in plain text only (no JSON, no code fences): it is shown to the user as it is generated.",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English under Llama-3's tokenizer; only
+    # used for budgeting, real counts come back in each response's usage
+    return (len(text) + 3) // 4
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    text = " ".join(text.split())
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rsplit(" ", 1)[0] + "…"
+
+
+def _fingerprint(messages: List[Dict[str, str]]) -> str:
+    h = hashlib.sha1()
+    for m in messages:
+        h.update(m["role"].encode("utf-8") + b"\0" + m["text"].encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+class History(NamedTuple):
+    summary: str                 # older turns, one line each, oldest first
+    recent: List[Dict[str, str]]  # verbatim (clipped) newest turns, oldest first
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append("Earlier in this conversation:\n" + self.summary)
+        if self.recent:
+            parts.append("\n".join(f"{m['role']}: {m['text']}" for m in self.recent))
+        return "\n\n".join(parts) or "(new conversation)"
+
+
+class PromptBuilder:
+    """
+    Prompts for the /chat LLM calls at a fixed size, however long the trip
+    conversation gets: static instructions in a constant system message,
+    then the newest turns that fit the history budget, with the turns that
+    no longer fit folded into a bounded running summary.
+
+    The summary is extractive (the first words of each turn, oldest lines
+    dropped past the summary budget) and kept per conversation, so a turn
+    only folds the messages that left the window since the previous one.
+    Losing it (eviction, another worker) rebuilds it from the stored
+    messages.
+    """
+
+    def __init__(
+        self,
+        history_tokens: int = PROMPT_HISTORY_TOKENS,
+        summary_tokens: int = PROMPT_SUMMARY_TOKENS,
+        max_conversations: int = PROMPT_SUMMARY_MAX_CONVERSATIONS,
+    ):
+        self.history_tokens = history_tokens
+        self.summary_tokens = min(summary_tokens, history_tokens)
+        self.max_conversations = max_conversations
+        # conversation_id -> (fingerprint of the last two folded messages, summary lines)
+        self._summaries: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+
+        self.folded_messages = 0
+        self._tokens: Dict[str, deque] = {}
+
+    def _fold(self, conversation_id: str, older: List[Dict[str, str]]) -> str:
+        lines: List[str] = []
+        start = 0
+        state = self._summaries.get(conversation_id)
+        if state is not None:
+            # resume after the last folded message, searched newest first;
+            # not found (trimmed away, store reset): rebuild from scratch
+            last_fp, folded = state
+            for i in range(len(older), 0, -1):
+                if _fingerprint(older[max(0, i - 2):i]) == last_fp:
+                    lines, start = folded, i
+                    break
+
+        new = older[start:]
+        if new:
+            lines = lines + [f"- {m['role']}: {clip_tokens(m['text'], PROMPT_SUMMARY_LINE_TOKENS)}" for m in new]
+            self.folded_messages += len(new)
+            while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+                lines.pop(0)
+        self._summaries[conversation_id] = (_fingerprint(older[-2:]), lines)
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.max_conversations:
+            self._summaries.popitem(last=False)
+        return "\n".join(lines)
+
+    def history(self, conversation_id: str, messages: List[Dict[str, str]]) -> History:
+        """
+        messages: the stored conversation, oldest first, without the current
+        user message (that one goes into the prompt on its own).
+        """
+        budget = self.history_tokens - self.summary_tokens
+        recent: List[Dict[str, str]] = []
+        used = 0
+        split = len(messages)
+        while split > 0:
+            m = messages[split - 1]
+            text = clip_tokens(m["text"], PROMPT_TURN_MAX_TOKENS)
+            cost = estimate_tokens(m["role"]) + estimate_tokens(text) + 1
+            if used + cost > budget:
+                break
+            recent.append({"role": m["role"], "text": text})
+            used += cost
+            split -= 1
+        recent.reverse()
+        summary = self._fold(conversation_id, messages[:split]) if split else ""
+        return History(summary, recent)
+
+    def _count(self, kind: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        self._tokens.setdefault(kind, deque(maxlen=PROMPT_STATS_WINDOW)).append(tokens)
+        return messages
+
+    def classify_messages(
+        self, conversation_id: str, messages: List[Dict[str, str]], user_text: str, start_city: str, end_city: str
+    ) -> List[Dict[str, str]]:
+        history = self.history(conversation_id, messages)
+        user = f"""Trip: {start_city} -> {end_city}
+
+Conversation:
+{history.render()}
+
+User message:
+{clip_tokens(user_text, PROMPT_TURN_MAX_TOKENS * 2)}"""
+        return self._count("classify", [
+            {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
+            {"role": "user", "content": user},
+        ])
+
+    def reply_messages(
+        self,
+        output: str,
+        conversation_id: str,
+        messages: List[Dict[str, str]],
+        user_text: str,
+        user_type: str,
+        best: dict,
+        sorted_list: list,
+        activities: str,
+        charging_minutes: int,
+        start_city: str,
+        end_city: str,
+    ) -> List[Dict[str, str]]:
+        """output: "json" ({"assistant_text": ...}) or "text" (streamed)."""
+        alternatives = [s for s in sorted_list if s["name"] != best["name"]][:2]
+        alt_text = "\n".join(
+            [f"- {a['name']}: wait {a['wait']}h, drive {a['travel_time']}, distance {a['distance']}"
+             for a in alternatives]
+        ) or "No strong alternatives found."
+        history = self.history(conversation_id, messages)
+
+        user = f"""User type: {user_type}
+Trip: {start_city} -> {end_city}
+
+Conversation so far:
+{history.render()}
+
+User message: "{clip_tokens(user_text, PROMPT_TURN_MAX_TOKENS * 2)}"
+
+BEST STATION:
+- Name: {best['name']}
+- Wait hours: {best['wait']}
+- Drive time: {best['travel_time']}
+- Distance: {best['distance']}
+- Address: {best.get('address','N/A')}
+
+Alternatives:
+{alt_text}
+
+Charging time estimate (temporary): {charging_minutes} minutes
+Activities predicted by ML: {activities}"""
+        return self._count(f"reply_{output}", [
+            {"role": "system", "content": REPLY_SYSTEM_PROMPTS[output]},
+            {"role": "user", "content": user},
+        ])
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "history_tokens": self.history_tokens,
+            "summary_tokens": self.summary_tokens,
+            "summaries": len(self._summaries),
+            "folded_messages": self.folded_messages,
+        }
+        for kind, window in self._tokens.items():
+            ms = sorted(window)
+            out[f"{kind}_est_tokens_p50"] = ms[len(ms) // 2]
+            out[f"{kind}_est_tokens_max"] = ms[-1]
+        return out
+
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from database import db_pool
+
+# the corridor engine is shared with the planners in ml-service/services;
+# run from this directory, the service root is not on the path yet
+_SERVICE_ROOT = str(Path(__file__).resolve().parents[2])
+if _SERVICE_ROOT not in sys.path:
+    sys.path.append(_SERVICE_ROOT)
+
+from services.corridor import distance_to_path_km  # noqa: E402
+from services.spatial_index import GridIndex  # noqa: E402
+
+STATION_INDEX_TTL_S = float(os.getenv("STATION_INDEX_TTL_S", "300"))
+
+
+class StationIndex:
+    """
+    Station table loaded once into a GridIndex and reloaded after ttl_s.
+    Replaces the per-request bounding-box query of /get-nearby-stations.
+    """
+
+    def __init__(self, ttl_s: float = STATION_INDEX_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._grid: GridIndex | None = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        with db_pool.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT station_id::text AS station_id, name, latitude as lat, longitude as lng, address, status
+                    FROM station
+                    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                    """
+                )
+                rows = cur.fetchall()
+
+        for r in rows:
+            r["lat"] = float(r["lat"])
+            r["lng"] = float(r["lng"])
+        grid = GridIndex([r["lat"] for r in rows], [r["lng"] for r in rows])
+        return rows, grid
+
+    def _current(self):
+        with self._lock:
+            if self._grid is None or time.monotonic() - self._loaded_at > self.ttl_s:
+                self._rows, self._grid = self._load()
+                self._loaded_at = time.monotonic()
+            return self._rows, self._grid
+
+    def near_path(self, path_points: List[dict], buffer_km: float) -> List[Dict[str, Any]]:
+        """Stations within buffer_km of the path (as [{"lat","lng"}, ...])."""
+        rows, grid = self._current()
+        path = [(float(p["lat"]), float(p["lng"])) for p in path_points]
+        cand = grid.query_corridor(path, buffer_km)
+        if len(cand) == 0:
+            return []
+
+        if len(path) == 1:
+            # a single point is a zero-length segment
+            path = path * 2
+        # exact point-to-segment distance for every candidate in one call
+        dist = distance_to_path_km(path, grid.lats[cand], grid.lons[cand], buffer_km)
+        return [dict(rows[i]) for i in cand[dist <= buffer_km].tolist()]
+
+
+station_index = StationIndex()
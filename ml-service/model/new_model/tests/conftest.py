@@ -0,0 +1,11 @@
+import os
+import sys
+
+# the chat service imports its modules flat, from its own directory, and
+# the shared engine from ml-service/services (see station_index.py)
+_HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(_HERE, "..")))
+sys.path.append(os.path.abspath(os.path.join(_HERE, "..", "..", "..")))
+
+# llm_client builds its Groq client at import; the tests never reach the API
+os.environ.setdefault("GROQ_API_KEY", "test-key")
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import ml_predictor
+from ml_predictor import DEFAULT_ACTIVITIES, LK_TZ, USER_CODES, ActivityBatcher, _feature_matrix
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    seen = []
+
+    def fake_batch(rows):
+        seen.append(len(rows))
+        return [f"{user}:{minutes}" for user, minutes, _ in rows]
+
+    monkeypatch.setattr(ml_predictor, "predict_activities_batch", fake_batch)
+    return seen
+
+
+def test_feature_matrix_from_inputs():
+    when = LK_TZ.localize(datetime(2026, 3, 7, 14, 45))   # a Saturday
+    cols = _feature_matrix([("Business_Man", 60, when)])
+    assert cols["charging_time"].tolist() == [60]
+    assert cols["total_minutes"].tolist() == [14 * 60 + 45]
+    assert cols["day_code"].tolist() == [5] and cols["is_weekend"].tolist() == [1]
+    assert cols["month_code"].tolist() == [2]
+    assert cols["user_type_code"].tolist() == [USER_CODES["Office_Worker"]]
+
+
+def test_concurrent_predictions_share_one_batch(batches):
+    async def run():
+        batcher = ActivityBatcher(window_ms=20)
+        out = await asyncio.gather(*(batcher.predict("Tourist", m) for m in (30, 60, 90)))
+        return out, batcher.stats()
+
+    out, stats = asyncio.run(run())
+    assert out == ["Tourist:30", "Tourist:60", "Tourist:90"]
+    assert batches == [3]
+    assert stats["batches"] == 1 and stats["running"] == 0
+
+
+def test_full_batch_flushes_without_waiting(batches):
+    async def run():
+        batcher = ActivityBatcher(window_ms=10_000, max_batch=2)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.predict("Tourist", 30), batcher.predict("Tourist", 60)), 1.0
+        )
+
+    assert asyncio.run(run()) == ["Tourist:30", "Tourist:60"]
+    assert batches == [2]
+
+
+def test_failed_batch_answers_with_the_default(monkeypatch):
+    def broken(rows):
+        raise RuntimeError("model exploded")
+
+    monkeypatch.setattr(ml_predictor, "predict_activities_batch", broken)
+
+    async def run():
+        return await ActivityBatcher(window_ms=1).predict("Tourist", 30)
+
+    assert asyncio.run(run()) == DEFAULT_ACTIVITIES
@@ -0,0 +1,59 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+import compile_activity_table
+import ml_predictor
+from ml_predictor import LK_TZ, USER_CODES, ActivityTable, _feature_matrix
+
+
+def _fake_model(cols):
+    # varies along every dimension the table is keyed by, with few distinct outputs (codes are uint16)
+    key = (cols["user_type_code"] + 7 * cols["charging_time"] + 13 * (cols["total_minutes"] // 15)
+           + 101 * cols["day_code"] + 211 * cols["month_code"] + 307 * cols["is_festival"]) % 997
+    return [f"activity {k}" for k in key.tolist()]
+
+
+def _compile(tmp_path, monkeypatch, minutes=(30, 60)):
+    monkeypatch.setattr(compile_activity_table, "model_predict_columns", _fake_model)
+    model = tmp_path / "model.pkl"
+    model.write_bytes(b"")
+    out = tmp_path / "model.activities.npz"
+    compile_activity_table.compile_table(list(minutes), str(out), str(model))
+    return out, model
+
+
+def test_compiled_table_answers_like_the_model(tmp_path, monkeypatch):
+    out, model = _compile(tmp_path, monkeypatch)
+    table = ActivityTable.load(str(out), str(model))
+
+    when = LK_TZ.localize(datetime(2026, 4, 14, 9, 40))
+    cols = _feature_matrix([("Tourist", 60, when), ("Business_Man", 30, when)])
+    cols["total_minutes"] = cols["total_minutes"] // 15 * 15   # the model's training resolution
+    assert table.lookup_many(cols) == _fake_model(cols)
+
+
+def test_uncompiled_charging_times_miss():
+    codes = np.zeros((len(USER_CODES), 1, 96, 7, 12, 2), dtype=np.uint16)
+    table = ActivityTable(codes, ["Coffee"], [30], 15)
+    cols = _feature_matrix([("Tourist", 30, None), ("Tourist", 45, None), ("Tourist", 500, None)])
+    assert table.lookup_many(cols) == ["Coffee", None, None]
+
+
+def test_table_older_than_the_model_is_ignored(tmp_path, monkeypatch):
+    out, model = _compile(tmp_path, monkeypatch, minutes=(30,))
+    later = os.path.getmtime(model) + 60
+    os.utime(model, (later, later))
+    assert ActivityTable.load(str(out), str(model)) is None
+
+
+def test_table_hits_skip_the_model(tmp_path, monkeypatch):
+    out, model = _compile(tmp_path, monkeypatch, minutes=(30,))
+    monkeypatch.setattr(ml_predictor, "activity_table", ActivityTable.load(str(out), str(model)))
+
+    def no_model(cols):
+        raise AssertionError("model should not be called on a table hit")
+
+    monkeypatch.setattr(ml_predictor, "model_predict_columns", no_model)
+    assert ml_predictor.predict_activities_batch([("Tourist", 30, None)])[0].startswith("activity ")
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from chat_stream import StreamStats, StreamTimer, sse_event
+from llm_client import LLMClient
+
+
+def test_sse_event_is_one_frame_with_a_single_json_line():
+    frame = sse_event("token", {"text": "line one\nline two", "n": 1})
+    assert frame.endswith(b"\n\n")
+    event, data = frame[:-2].split(b"\n")
+    assert event == b"event: token" and data.startswith(b"data: ")
+    assert json.loads(data[len(b"data: "):]) == {"text": "line one\nline two", "n": 1}
+
+
+def test_timer_keeps_the_first_mark_of_each_milestone():
+    timer = StreamTimer()
+    first = timer.mark("stations")
+    timer.mark("stations")
+    assert timer.as_dict()["stations"] == first
+
+    stats = StreamStats()
+    stats.record(timer)
+    stats.record(StreamTimer(), completed=False)
+    out = stats.stats()
+    assert (out["streams"], out["disconnects"]) == (2, 1)
+    assert out["stations_ms_p50"] == first
+
+
+class FakeStream:
+    def __init__(self, chunks, delay):
+        self.chunks, self.delay, self.closed = chunks, delay, False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for text in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+    async def close(self):
+        self.closed = True
+
+
+def _client(stream):
+    async def create(**kwargs):
+        return stream
+
+    client = LLMClient(api_key="test-key")
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client
+
+
+async def _collect(client, timeout_s):
+    return [t async for t in client.stream_text("reply", [], timeout_s)]
+
+
+def test_stream_text_yields_chunks_and_records_first_token():
+    stream = FakeStream(["Charge ", "at ", "Kandy."], 0.0)
+    client = _client(stream)
+    assert asyncio.run(_collect(client, 1.0)) == ["Charge ", "at ", "Kandy."]
+    assert stream.closed
+    assert "reply_first_token_ms_p50" in client.stats()
+
+
+def test_stream_text_stops_at_the_deadline_keeping_what_it_got():
+    stream = FakeStream(["a", "b", "c", "d"], 0.03)
+    client = _client(stream)
+    got = asyncio.run(_collect(client, 0.08))
+    assert 0 < len(got) < 4
+    assert client.stats()["timeouts"] == 1 and stream.closed
@@ -0,0 +1,69 @@
+import pytest
+
+from conversation_store import (
+    ConversationStore,
+    InMemoryConversationStore,
+    SQLiteConversationStore,
+    create_conversation_store,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteConversationStore(path=str(tmp_path / "chat.sqlite3"), **kwargs)
+        return InMemoryConversationStore(**kwargs)
+    return make
+
+
+def test_messages_and_user_type_round_trip(make_store):
+    store = make_store()
+    store.append_message("c1", "user", "hi")
+    store.append_message("c1", "ai", "hello")
+    store.set_user_type("c1", "Tourist")
+    assert store.load("c1") == {
+        "messages": [{"role": "user", "text": "hi"}, {"role": "ai", "text": "hello"}],
+        "user_type": "Tourist",
+    }
+    assert store.load("unknown") == {"messages": [], "user_type": None}
+
+
+def test_oldest_messages_are_trimmed(make_store):
+    store = make_store(max_messages=3)
+    for i in range(5):
+        store.append_message("c1", "user", f"m{i}")
+    assert [m["text"] for m in store.load("c1")["messages"]] == ["m2", "m3", "m4"]
+    assert store.stats()["trimmed_messages"] == 2
+
+
+def test_least_recently_used_conversation_is_evicted(make_store):
+    store = make_store(max_conversations=2)
+    store.append_message("c1", "user", "a")
+    store.append_message("c2", "user", "b")
+    store.append_message("c1", "user", "c")
+    store.append_message("c3", "user", "d")
+    assert store.load("c2")["messages"] == []
+    assert len(store.load("c1")["messages"]) == 2
+    assert store.live_conversations() == 2
+
+
+def test_byte_budget_is_enforced(make_store):
+    store = make_store(budget_bytes=1000)
+    for i in range(20):
+        store.append_message(f"c{i}", "user", "x" * 200)
+    assert store.bytes_held() <= 1000
+    assert store.stats()["evicted"] > 0
+
+
+def test_idle_conversations_expire(make_store):
+    store = make_store(idle_ttl_s=-1.0)
+    store.append_message("c1", "user", "hi")
+    assert store.load("c1")["messages"] == []
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        ConversationStore()
+    with pytest.raises(ValueError):
+        create_conversation_store("redis")
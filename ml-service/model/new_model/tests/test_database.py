@@ -0,0 +1,98 @@
+import threading
+
+import psycopg2
+import pytest
+from psycopg2 import pool
+
+from database import DatabasePool
+
+
+class FakeConn:
+    def __init__(self, broken=False):
+        self.closed = 0
+        self.broken = broken
+        self.rollbacks = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query):
+                if conn.broken:
+                    raise psycopg2.OperationalError("server closed the connection")
+
+        return Cur()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self, conns):
+        self.free = list(conns)
+        self.put = []
+
+    def getconn(self):
+        return self.free.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.put.append((conn, close))
+        if not close:
+            self.free.append(conn)
+
+
+def _pool(conns, **kwargs):
+    db = DatabasePool(**kwargs)
+    db._pool = FakePool(conns)
+    return db
+
+
+def test_connection_is_rolled_back_and_returned():
+    conn = FakeConn()
+    db = _pool([conn], maxconn=1)
+    with db.connection() as c:
+        assert c is conn
+    assert conn.rollbacks >= 1
+    assert db._pool.put[-1] == (conn, False)
+    assert db.stats()["in_use"] == 0
+
+
+def test_exhausted_pool_times_out_instead_of_raising_at_once():
+    db = _pool([FakeConn()], maxconn=1, timeout_s=0.05)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with db.connection():
+            held.set()
+            release.wait(2)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    held.wait(2)
+    with pytest.raises(pool.PoolError):
+        with db.connection():
+            pass
+    release.set()
+    t.join()
+    assert db.stats()["wait_timeouts"] == 1
+
+
+def test_stale_connection_is_replaced():
+    stale, fresh = FakeConn(broken=True), FakeConn()
+    db = _pool([stale, fresh], maxconn=2, ping_after_s=0)
+    with db.connection() as c:
+        assert c is fresh
+    assert (stale, True) in db._pool.put
+    assert db.stats()["reconnects"] == 1
+
+
+def test_ping_reports_failure_instead_of_raising():
+    db = _pool([FakeConn(broken=True), FakeConn(broken=True)], maxconn=1, ping_after_s=3600)
+    assert db.ping() is False
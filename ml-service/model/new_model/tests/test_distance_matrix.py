@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+
+from distance_matrix import DistanceMatrixClient
+
+
+def _client(handler):
+    client = DistanceMatrixClient("key", base_url="https://maps.example/distancematrix")
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def _element(dest: str):
+    # distance in metres = the destination's latitude, so order is checkable
+    return {"status": "OK", "distance": {"value": float(dest.split(",")[0])}, "duration": {"value": 60}}
+
+
+def test_destinations_are_chunked_and_returned_in_input_order():
+    requests = []
+
+    def handler(request):
+        dests = request.url.params["destinations"].split("|")
+        requests.append(len(dests))
+        return httpx.Response(200, json={"status": "OK", "rows": [{"elements": [_element(d) for d in dests]}]})
+
+    client = _client(handler)
+    dests = [(float(i), 80.0) for i in range(60)]
+    elements = asyncio.run(client.distance_matrix((7.0, 80.0), dests))
+
+    assert sorted(requests) == [10, 25, 25]
+    assert [e["distance"]["value"] for e in elements] == [float(i) for i in range(60)]
+
+
+def test_failed_chunk_marks_only_its_own_destinations():
+    def handler(request):
+        dests = request.url.params["destinations"].split("|")
+        if dests[0].startswith("0."):
+            return httpx.Response(500)
+        return httpx.Response(200, json={"status": "OK", "rows": [{"elements": [_element(d) for d in dests]}]})
+
+    client = _client(handler)
+    elements = asyncio.run(client.distance_matrix((7.0, 80.0), [(float(i), 80.0) for i in range(30)]))
+
+    assert [e["status"] for e in elements] == ["ERROR"] * 25 + ["OK"] * 5
+
+
+def test_api_error_status_is_an_error_element():
+    client = _client(lambda request: httpx.Response(200, json={"status": "REQUEST_DENIED"}))
+    elements = asyncio.run(client.distance_matrix("Colombo", [(7.0, 80.0)]))
+    assert elements == [{"status": "ERROR"}]
+
+
+def test_no_destinations_makes_no_request():
+    def handler(request):
+        raise AssertionError("no request expected")
+
+    assert asyncio.run(_client(handler).distance_matrix((7.0, 80.0), [])) == []
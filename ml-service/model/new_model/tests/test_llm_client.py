@@ -0,0 +1,111 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from llm_client import LLMClient, UserTypeCache, prompt_fingerprint
+
+
+def test_concurrent_lookups_share_one_classification():
+    cache = UserTypeCache()
+    calls = []
+
+    async def classify():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "tourist"
+
+    async def run():
+        return await asyncio.gather(*(cache.get("c1", "fp", classify) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["tourist"] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+
+    assert asyncio.run(cache.get("c1", "fp", classify)) == "tourist"
+    assert cache.hits == 1 and len(calls) == 1
+
+
+def test_none_is_not_cached():
+    cache = UserTypeCache()
+    answers = [None, "daily_commuter"]
+
+    async def classify():
+        return answers.pop(0)
+
+    assert asyncio.run(cache.get("c1", "fp", classify)) is None
+    assert asyncio.run(cache.get("c1", "fp", classify)) == "daily_commuter"
+    assert cache.stats()["entries"] == 1
+
+
+def test_failed_owner_releases_waiters_with_none():
+    cache = UserTypeCache()
+
+    async def classify():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        return await asyncio.gather(cache.get("c1", "fp", classify), cache.get("c1", "fp", classify),
+                                    return_exceptions=True)
+
+    owner, waiter = asyncio.run(run())
+    assert isinstance(owner, RuntimeError) and waiter is None
+    assert cache.stats()["inflight"] == 0
+
+
+def test_ttl_and_lru_eviction():
+    async def classify():
+        return "tourist"
+
+    expired = UserTypeCache(ttl_s=0)
+    asyncio.run(expired.get("c1", "fp", classify))
+    asyncio.run(expired.get("c1", "fp", classify))
+    assert expired.misses == 2
+
+    small = UserTypeCache(max_entries=2)
+    for conv in ("a", "b", "c"):
+        asyncio.run(small.get(conv, prompt_fingerprint(conv), classify))
+    assert small.stats()["entries"] == 2 and small.evictions == 1
+
+
+class FakeCompletions:
+    def __init__(self, content='{"user_type": "tourist"}', delay=0.0, error=None):
+        self.content, self.delay, self.error = content, delay, error
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=8, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))], usage=usage)
+
+
+def _client(**kwargs):
+    client = LLMClient(api_key="test-key")
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(**kwargs)))
+    return client
+
+
+def test_complete_json_parses_and_records_usage():
+    client = _client()
+    assert asyncio.run(client.complete_json("classify", [], 1.0)) == {"user_type": "tourist"}
+    stats = client.stats()
+    assert stats["classify_tokens"]["prompt_total"] == 120
+    assert "classify_ms_p50" in stats
+
+
+@pytest.mark.parametrize("kwargs, counter", [
+    ({"delay": 0.2}, "timeouts"),
+    ({"error": ConnectionError("down")}, "errors"),
+    ({"content": "not json"}, "errors"),
+])
+def test_complete_json_failures_come_back_as_none(kwargs, counter):
+    client = _client(**kwargs)
+    assert asyncio.run(client.complete_json("classify", [], 0.05)) is None
+    assert client.stats()[counter] == 1
+
+
+def test_complete_json_drops_non_object_replies():
+    assert asyncio.run(_client(content=json.dumps(["tourist"])).complete_json("classify", [], 1.0)) is None
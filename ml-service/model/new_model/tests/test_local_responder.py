@@ -0,0 +1,45 @@
+import pytest
+
+from local_responder import LocalResponder, _hours_text
+
+BEST = {"name": "Kandy City", "wait": 0.25, "travel_time": "12 min", "distance": "4 km", "address": "1 Main St"}
+SORTED = [
+    BEST,
+    {"name": "Peradeniya", "wait": 1.5, "travel_time": "20 min", "distance": "8 km"},
+    {"name": "Katugastota", "wait": 2.0, "travel_time": "18 min", "distance": "7 km"},
+    {"name": "Matale", "wait": 0.1, "travel_time": "50 min", "distance": "25 km"},
+]
+
+
+@pytest.mark.parametrize("hours, text", [(None, "unknown"), (0.25, "15 min"), (1.0, "1 h"), (2.5, "2 h 30 min")])
+def test_hours_text(hours, text):
+    assert _hours_text(hours) == text
+
+
+def test_reply_covers_the_station_decision():
+    responder = LocalResponder()
+    text = responder.reply(
+        "budget", best=BEST, sorted_list=SORTED, activities="cafe, short walk", charging_minutes=45,
+        user_type="Tourist", start_city="Colombo", end_city="Kandy",
+        conversation_id="c1", messages=[], user_text="where should I charge?",
+    )
+    lines = text.split("\n")
+    assert lines[0] == "⚡ Best place to charge on your trip from Colombo to Kandy: Kandy City (wait ~15 min, 12 min drive, 4 km)."
+    assert "Address: 1 Main St." in lines
+    assert "Peradeniya" in text and "Katugastota" in text and "Matale" not in text
+    assert "about 45 min" in text
+    assert lines[-1] == "While you wait: cafe, short walk."
+
+
+def test_minimal_inputs_and_fallback_counts():
+    responder = LocalResponder()
+    best = {"name": "Only One", "address": "N/A"}
+    text = responder.reply("error", best=best, sorted_list=[best], activities="", charging_minutes=90,
+                           user_type="Astronaut")
+    assert text.split("\n") == [
+        "⚡ Best place to charge: Only One (wait ~unknown, ? drive, ?).",
+        "🔋 Charging should take about 1 h 30 min.",
+    ]
+    responder.reply("error", best=best, sorted_list=[], activities="", charging_minutes=30)
+    responder.reply("budget", best=best, sorted_list=[], activities="", charging_minutes=30)
+    assert responder.stats()["fallbacks"] == {"error": 2, "budget": 1}
@@ -0,0 +1,80 @@
+from prompt_builder import (
+    CLASSIFY_SYSTEM_PROMPT,
+    PROMPT_TURN_MAX_TOKENS,
+    PromptBuilder,
+    clip_tokens,
+    estimate_tokens,
+)
+
+
+def _conversation(turns):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "text": f"message {i} " + "about chargers near Kandy and the waiting time there " * (1 + i % 7)}
+        for i in range(turns)
+    ]
+
+
+def _history_tokens(history):
+    recent = sum(estimate_tokens(m["role"]) + estimate_tokens(m["text"]) + 1 for m in history.recent)
+    return recent, estimate_tokens(history.summary)
+
+
+def test_clip_tokens():
+    assert clip_tokens("  short   text ", 10) == "short text"
+    clipped = clip_tokens("word " * 100, 10)
+    assert len(clipped) <= 40 and clipped.endswith("…")
+
+
+def test_history_stays_within_budget_however_long_the_conversation():
+    builder = PromptBuilder(history_tokens=300, summary_tokens=100)
+    for turns in (0, 3, 40, 400):
+        history = builder.history(f"c{turns}", _conversation(turns))
+        recent, summary = _history_tokens(history)
+        assert recent <= 200 and summary <= 100
+        assert all(estimate_tokens(m["text"]) <= PROMPT_TURN_MAX_TOKENS for m in history.recent)
+    assert builder.history("c0", []).render() == "(new conversation)"
+
+
+def test_newest_turns_are_verbatim_and_older_ones_summarised():
+    builder = PromptBuilder(history_tokens=300, summary_tokens=100)
+    messages = _conversation(40)
+    history = builder.history("c1", messages)
+    assert history.recent[-1]["text"] == clip_tokens(messages[-1]["text"], PROMPT_TURN_MAX_TOKENS)
+    # the summary keeps the newest of the folded turns
+    first_recent = len(messages) - len(history.recent)
+    assert f"message {first_recent - 1} " in history.summary
+    assert "message 0 " not in history.summary
+
+
+def test_summary_folds_only_new_messages_and_rebuilds_the_same():
+    builder = PromptBuilder(history_tokens=300, summary_tokens=100)
+    messages = _conversation(40)
+    first = builder.history("c1", messages)
+    folded = builder.folded_messages
+
+    messages = _conversation(42)
+    incremental = builder.history("c1", messages)
+    # only the turns that left the window since the first call were folded
+    left_window = (len(messages) - len(incremental.recent)) - (40 - len(first.recent))
+    assert builder.folded_messages - folded == left_window
+
+    rebuilt = PromptBuilder(history_tokens=300, summary_tokens=100).history("c1", messages)
+    assert rebuilt == incremental
+
+
+def test_prompts_keep_a_constant_system_message():
+    builder = PromptBuilder(history_tokens=300, summary_tokens=100)
+    best = {"name": "Kandy City", "wait": 0.2, "travel_time": "12 min", "distance": "4 km"}
+    sorted_list = [best, {"name": "Peradeniya", "wait": 0.5, "travel_time": "20 min", "distance": "8 km"}]
+
+    sizes = []
+    for turns in (2, 200):
+        classify = builder.classify_messages("c", _conversation(turns), "where next?", "Colombo", "Kandy")
+        reply = builder.reply_messages("text", "c", _conversation(turns), "where next?", "Tourist", best,
+                                       sorted_list, "cafe", 30, "Colombo", "Kandy")
+        assert classify[0]["content"] == CLASSIFY_SYSTEM_PROMPT
+        assert "Peradeniya" in reply[1]["content"]
+        sizes.append(estimate_tokens(reply[1]["content"]))
+    assert sizes[1] - sizes[0] <= 300
+    assert builder.stats()["reply_text_est_tokens_max"] >= sum(estimate_tokens(m["content"]) for m in reply)
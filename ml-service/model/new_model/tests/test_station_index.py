@@ -0,0 +1,32 @@
+import time
+
+import numpy as np
+
+from services.corridor import distance_to_path_km
+from services.spatial_index import GridIndex
+from station_index import StationIndex
+
+
+def _index(lats, lons):
+    index = StationIndex()
+    index._rows = [{"station_id": str(i), "lat": a, "lng": b} for i, (a, b) in enumerate(zip(lats, lons))]
+    index._grid = GridIndex(lats, lons)
+    index._loaded_at = time.monotonic()
+    return index
+
+
+def test_near_path_keeps_exactly_the_stations_within_the_buffer():
+    rng = np.random.default_rng(2)
+    lats, lons = rng.uniform(6.8, 7.4, 3000), rng.uniform(79.8, 80.7, 3000)
+    path = [{"lat": 6.93 + 0.01 * k, "lng": 79.85 + 0.012 * k} for k in range(40)]
+
+    got = {int(r["station_id"]) for r in _index(lats, lons).near_path(path, 5.0)}
+
+    exact = distance_to_path_km([(p["lat"], p["lng"]) for p in path], lats, lons)
+    assert got == set(np.flatnonzero(exact <= 5.0).tolist())
+
+
+def test_near_path_single_point():
+    index = _index(np.array([7.0, 7.2]), np.array([80.0, 80.0]))
+    near = index.near_path([{"lat": 7.01, "lng": 80.0}], 2.0)
+    assert [r["station_id"] for r in near] == ["0"]
@@ -0,0 +1,56 @@
+import asyncio
+
+from travel_time_cache import TravelTimeCache, geohash, origin_key
+
+
+class FakeClient:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    async def distance_matrix(self, origin, destinations, mode="driving"):
+        self.calls.append(list(destinations))
+        return [{"status": "ERROR"} if d in self.failing else {"status": "OK", "distance": {"value": d[0]}}
+                for d in destinations]
+
+
+STATIONS = [{"station_id": i, "name": f"s{i}", "lat": 7.0 + i / 100, "lng": 80.0} for i in range(1, 4)]
+
+
+def test_geohash_known_value():
+    # the reference example from the geohash spec
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_nearby_origins_share_a_cell():
+    assert origin_key((6.9271, 79.8612)) == origin_key((6.9274, 79.8615))
+    assert origin_key(" Colombo  Fort") == origin_key("colombo fort")
+
+
+def test_only_missing_pairs_go_upstream():
+    cache, client = TravelTimeCache(), FakeClient()
+    first = asyncio.run(cache.elements(client, (6.9271, 79.8612), STATIONS[:2]))
+    second = asyncio.run(cache.elements(client, (6.9272, 79.8613), STATIONS))
+
+    assert client.calls == [[(7.01, 80.0), (7.02, 80.0)], [(7.03, 80.0)]]
+    assert second[:2] == first
+    assert [e["distance"]["value"] for e in second] == [7.01, 7.02, 7.03]
+    assert cache.stats()["hits"] == 2
+
+
+def test_failed_elements_are_not_cached():
+    cache, client = TravelTimeCache(), FakeClient(failing=[(7.02, 80.0)])
+    asyncio.run(cache.elements(client, (6.9, 79.9), STATIONS[:2]))
+    asyncio.run(cache.elements(client, (6.9, 79.9), STATIONS[:2]))
+    assert client.calls[1] == [(7.02, 80.0)]
+
+
+def test_expired_and_evicted_entries_are_refetched():
+    cache, client = TravelTimeCache(ttl_s=-1.0), FakeClient()
+    asyncio.run(cache.elements(client, (6.9, 79.9), STATIONS[:1]))
+    asyncio.run(cache.elements(client, (6.9, 79.9), STATIONS[:1]))
+    assert len(client.calls) == 2 and cache.stats()["expired"] == 1
+
+    cache, client = TravelTimeCache(max_entries=2), FakeClient()
+    asyncio.run(cache.elements(client, (6.9, 79.9), STATIONS))
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import wait_time
+from wait_time import WaitTimeModel, erlang_c_wait_hours
+
+
+def test_erlang_c_single_server_matches_mm1():
+    # M/M/1: Wq = rho / (mu - lambda) = 0.5 / (1 - 0.5)
+    w = erlang_c_wait_hours(np.array([0.5]), np.array([1.0]), np.array([1]))
+    assert w[0] == pytest.approx(1.0)
+
+
+def test_erlang_c_two_servers():
+    # a = 1 Erlang on 2 servers: P(wait) = 1/3, Wq = P(wait) / (c mu - lambda) = 1/3 h
+    w = erlang_c_wait_hours(np.array([1.0]), np.array([1.0]), np.array([2]))
+    assert w[0] == pytest.approx(1.0 / 3.0)
+
+
+def test_erlang_c_mixed_server_counts_in_one_call():
+    lam = np.array([0.5, 1.0, 0.2])
+    service = np.array([1.0, 1.0, 0.5])
+    servers = np.array([1, 2, 4])
+    together = erlang_c_wait_hours(lam, service, servers)
+    one_by_one = [erlang_c_wait_hours(lam[i:i + 1], service[i:i + 1], servers[i:i + 1])[0] for i in range(3)]
+    assert together == pytest.approx(one_by_one)
+
+
+def test_erlang_c_unstable_or_serverless_is_capped():
+    w = erlang_c_wait_hours(np.array([2.0, 1.0]), np.array([1.0, 1.0]), np.array([1, 0]))
+    assert list(w) == [wait_time.WAIT_MAX_HOURS, wait_time.WAIT_MAX_HOURS]
+
+
+def test_arrival_rate_without_history_is_the_prior():
+    model = WaitTimeModel(history_table="")
+    assert model._arrival_rate("s1", 10, 3) == pytest.approx(wait_time.WAIT_PRIOR_ARRIVALS_PER_CHARGER_H * 3)
+
+
+def test_arrival_rate_with_history_shrinks_toward_the_prior():
+    model = WaitTimeModel(history_table="")
+    counts = np.zeros(7 * 24)
+    counts[10] = 40.0
+    model._arrivals = {"s1": counts}
+    model._history_loaded = True
+
+    prior = wait_time.WAIT_PRIOR_ARRIVALS_PER_CHARGER_H * 2
+    weeks = wait_time.WAIT_HISTORY_DAYS / 7.0
+    expected = (40.0 + wait_time.WAIT_PRIOR_WEEKS * prior) / (weeks + wait_time.WAIT_PRIOR_WEEKS)
+    assert model._arrival_rate("s1", 10, 2) == pytest.approx(expected)
+    # a station with no bookings in the window: the prior, diluted by the weeks without arrivals
+    assert model._arrival_rate("s2", 10, 2) < prior
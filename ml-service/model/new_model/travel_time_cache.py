@@ -0,0 +1,143 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from distance_matrix import DistanceMatrixClient, Location
+
+# precision 6 ~ 1.2 x 0.6 km cells, 7 ~ 150 x 150 m
+TRAVEL_CACHE_GEOHASH_PRECISION = int(os.getenv("TRAVEL_CACHE_GEOHASH_PRECISION", "6"))
+TRAVEL_CACHE_TTL_S = float(os.getenv("TRAVEL_CACHE_TTL_S", "600"))
+TRAVEL_CACHE_MAX_ENTRIES = int(os.getenv("TRAVEL_CACHE_MAX_ENTRIES", "50000"))
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lng: float, precision: int = TRAVEL_CACHE_GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    out = []
+    bits = nbits = 0
+    even = True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2.0
+            if lng >= mid:
+                bits, lng_lo = (bits << 1) | 1, mid
+            else:
+                bits, lng_hi = bits << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2.0
+            if lat >= mid:
+                bits, lat_lo = (bits << 1) | 1, mid
+            else:
+                bits, lat_hi = bits << 1, mid
+        even = not even
+        nbits += 1
+        if nbits == 5:
+            out.append(_BASE32[bits])
+            bits = nbits = 0
+    return "".join(out)
+
+
+def origin_key(origin: Location, precision: int = TRAVEL_CACHE_GEOHASH_PRECISION) -> str:
+    if isinstance(origin, str):
+        return "q:" + " ".join(origin.lower().split())
+    return "g:" + geohash(float(origin[0]), float(origin[1]), precision)
+
+
+def station_key(station: Dict[str, Any]) -> str:
+    if station.get("station_id"):
+        return f"id:{station['station_id']}"
+    return f"{station.get('name', '')}|{float(station['lat']):.5f}|{float(station['lng']):.5f}"
+
+
+class TravelTimeCache:
+    """
+    LRU + TTL cache of Distance Matrix elements keyed by (quantized origin,
+    station). Only origin-station pairs that are missing or expired are sent
+    upstream; the rest are merged from cache in the caller's order.
+    """
+
+    def __init__(self, ttl_s: float = TRAVEL_CACHE_TTL_S, max_entries: int = TRAVEL_CACHE_MAX_ENTRIES,
+                 precision: int = TRAVEL_CACHE_GEOHASH_PRECISION):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.precision = precision
+        self._store: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.upstream_calls = 0
+        self.upstream_elements = 0
+
+    def _get(self, key):
+        item = self._store.get(key)
+        if item is None:
+            return None
+        ts, el = item
+        if time.monotonic() - ts > self.ttl_s:
+            del self._store[key]
+            self.expired += 1
+            return None
+        self._store.move_to_end(key)
+        return el
+
+    def _put(self, key, el):
+        self._store[key] = (time.monotonic(), el)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+    async def elements(
+        self,
+        client: DistanceMatrixClient,
+        origin: Location,
+        stations: List[Dict[str, Any]],
+        mode: str = "driving",
+    ) -> List[Dict[str, Any]]:
+        okey = origin_key(origin, self.precision)
+        keys = [(okey, station_key(s)) for s in stations]
+
+        out: List[Dict[str, Any] | None] = []
+        missing: List[int] = []
+        for i, k in enumerate(keys):
+            el = self._get(k)
+            if el is None:
+                missing.append(i)
+            out.append(el)
+        self.hits += len(stations) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            dests = [(float(stations[i]["lat"]), float(stations[i]["lng"])) for i in missing]
+            fetched = await client.distance_matrix(origin, dests, mode=mode)
+            self.upstream_calls += 1
+            self.upstream_elements += len(missing)
+            for i, el in zip(missing, fetched):
+                out[i] = el
+                # failures (timeouts, ZERO_RESULTS on a bad coordinate...) are retried next turn
+                if el.get("status") == "OK":
+                    self._put(keys[i], el)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._store),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "upstream_calls": self.upstream_calls,
+            "upstream_elements": self.upstream_elements,
+            "geohash_precision": self.precision,
+            "ttl_s": self.ttl_s,
+        }
+
+
+travel_time_cache = TravelTimeCache()
@@ -0,0 +1,348 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pytz
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+
+from database import db_pool
+
+# charger status refresh; history (arrival rates, session lengths) changes slowly
+WAIT_CHARGER_TTL_S = float(os.getenv("WAIT_CHARGER_TTL_S", "60"))
+WAIT_HISTORY_TTL_S = float(os.getenv("WAIT_HISTORY_TTL_S", "3600"))
+# bookings table (charger_id, date, start_time, end_time, status) to learn
+# arrival rates and session lengths from; the AMPORA schema has none, so
+# empty (the default) runs on the priors below
+WAIT_HISTORY_TABLE = os.getenv("WAIT_HISTORY_TABLE", "")
+WAIT_HISTORY_DAYS = int(os.getenv("WAIT_HISTORY_DAYS", "56"))
+# prior arrivals per charger per hour, worth WAIT_PRIOR_WEEKS weeks of history
+WAIT_PRIOR_ARRIVALS_PER_CHARGER_H = float(os.getenv("WAIT_PRIOR_ARRIVALS_PER_CHARGER_H", "0.25"))
+WAIT_PRIOR_WEEKS = float(os.getenv("WAIT_PRIOR_WEEKS", "2"))
+# session length from power when a station has fewer recorded sessions than this
+WAIT_MIN_SESSIONS = int(os.getenv("WAIT_MIN_SESSIONS", "20"))
+WAIT_SESSION_KWH = float(os.getenv("WAIT_SESSION_KWH", "30"))
+WAIT_MIN_SESSION_H = float(os.getenv("WAIT_MIN_SESSION_H", "0.25"))
+# stations the database does not know
+WAIT_DEFAULT_CHARGERS = int(os.getenv("WAIT_DEFAULT_CHARGERS", "2"))
+WAIT_DEFAULT_POWER_KW = float(os.getenv("WAIT_DEFAULT_POWER_KW", "22"))
+# overloaded (rho >= 1) or fully offline stations
+WAIT_MAX_HOURS = float(os.getenv("WAIT_MAX_HOURS", "10"))
+WAIT_CACHE_MAX_ENTRIES = int(os.getenv("WAIT_CACHE_MAX_ENTRIES", "50000"))
+WAIT_TZ = pytz.timezone(os.getenv("WAIT_TZ", "Asia/Colombo"))
+
+BUSY_STATUSES = ["busy", "charging", "occupied", "in_use", "in use"]
+OFFLINE_STATUSES = ["offline", "faulted", "out_of_order", "out of order", "unavailable", "maintenance"]
+
+_HOURS_PER_WEEK = 7 * 24
+
+_CHARGERS_SQL = """
+SELECT s.station_id::text AS station_id, s.name,
+       COUNT(c.charger_id) AS total,
+       COUNT(c.charger_id) FILTER (WHERE lower(c.status) = ANY(%s)) AS offline,
+       COUNT(c.charger_id) FILTER (WHERE lower(c.status) = ANY(%s)) AS busy,
+       AVG(c.power_kw) AS power_kw
+FROM station s
+LEFT JOIN charger c ON c.station_id = s.station_id
+GROUP BY s.station_id, s.name
+"""
+
+# bookings made through the app; cancelled ones never arrived
+_HISTORY_SQL = sql.SQL("""
+SELECT c.station_id::text AS station_id,
+       EXTRACT(ISODOW FROM b.date)::int - 1 AS dow,
+       EXTRACT(HOUR FROM b.start_time)::int AS hour,
+       COUNT(*) AS arrivals,
+       SUM(EXTRACT(EPOCH FROM (b.end_time - b.start_time))) / 3600.0 AS service_h
+FROM {table} b
+JOIN charger c ON c.charger_id = b.charger_id
+WHERE b.date >= CURRENT_DATE - %s AND upper(coalesce(b.status, '')) <> 'CANCELLED'
+GROUP BY 1, 2, 3
+""")
+
+
+def erlang_c_wait_hours(arrivals_h: np.ndarray, service_h: np.ndarray, servers: np.ndarray) -> np.ndarray:
+    """
+    Mean time in queue (hours) of an M/M/c station, for many stations at
+    once. Erlang B by its recursion over c (vectorised across stations,
+    stations with fewer servers stop early), then Erlang C from it.
+    Unstable (rho >= 1) or serverless stations get WAIT_MAX_HOURS.
+    """
+    lam = np.asarray(arrivals_h, dtype=np.float64)
+    mu = 1.0 / np.asarray(service_h, dtype=np.float64)
+    c = np.asarray(servers, dtype=np.int64)
+    a = lam / mu                      # offered load, Erlangs
+    rho = a / np.maximum(c, 1)
+
+    b = np.ones_like(a)
+    for k in range(1, int(c.max(initial=0)) + 1):
+        b = np.where(k <= c, a * b / (k + a * b), b)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wait = b / (1.0 - rho * (1.0 - b)) / (c * mu - lam)
+    stable = (c > 0) & (rho < 1.0)
+    return np.where(stable, np.minimum(wait, WAIT_MAX_HOURS), WAIT_MAX_HOURS)
+
+
+class WaitTimeModel:
+    """
+    Expected wait at a station from an M/M/c queue per station: c is the
+    number of chargers not offline, the service rate comes from recorded
+    session lengths (or a typical session's energy over the chargers' mean
+    power_kw), and the arrival rate per hour of week is a per-charger
+    prior. With WAIT_HISTORY_TABLE set, arrivals and session lengths are
+    learned from that bookings table, shrunk toward the prior so stations
+    with little history still get a sensible rate.
+
+    The live Charger.status adds the backlog: with every working charger
+    busy, the mean time until the first one frees up (1 / (c * mu)). Queue
+    waits are cached per station and hour-of-week bucket and computed in
+    one vectorised call for all stations of a request that miss.
+    """
+
+    def __init__(self, charger_ttl_s: float = WAIT_CHARGER_TTL_S, history_ttl_s: float = WAIT_HISTORY_TTL_S,
+                 max_entries: int = WAIT_CACHE_MAX_ENTRIES, history_table: str = WAIT_HISTORY_TABLE):
+        self.charger_ttl_s = charger_ttl_s
+        self.history_ttl_s = history_ttl_s
+        # None: no history source (not configured, or the table is missing)
+        self.history_table: Optional[str] = history_table or None
+        self._history_checked = False
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # station rows; the last row stands for stations the database does not know
+        self._ids: List[str] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._total = np.array([WAIT_DEFAULT_CHARGERS])
+        self._offline = np.zeros(1, dtype=np.int64)
+        self._busy = np.zeros(1, dtype=np.int64)
+        self._power = np.array([WAIT_DEFAULT_POWER_KW])
+        self._arrivals: Dict[str, np.ndarray] = {}     # station_id -> (168,) counts over the window
+        self._service: Dict[str, Tuple[int, float]] = {}  # station_id -> (sessions, total hours)
+        self._chargers_at = 0.0
+        self._history_at = 0.0
+        # True once a history window was read (possibly empty for some stations)
+        self._history_loaded = False
+        self.history_version = 0
+
+        # (station key, hour of week) -> (history_version, servers, wait hours)
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[int, int, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+        self.last_batch = 0
+        self.last_compute_ms = 0.0
+
+    # ---------- loading ----------
+    def _load_chargers(self):
+        with db_pool.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(_CHARGERS_SQL, (OFFLINE_STATUSES, BUSY_STATUSES))
+                rows = cur.fetchall()
+        n = len(rows)
+        by_id = {r["station_id"]: i for i, r in enumerate(rows)}
+        by_name: Dict[str, int] = {}
+        for i, r in enumerate(rows):
+            by_name.setdefault((r["name"] or "").strip().lower(), i)
+
+        total = np.array([int(r["total"]) for r in rows] + [WAIT_DEFAULT_CHARGERS], dtype=np.int64)
+        offline = np.array([int(r["offline"]) for r in rows] + [0], dtype=np.int64)
+        busy = np.array([int(r["busy"]) for r in rows] + [0], dtype=np.int64)
+        power = np.array([float(r["power_kw"] or WAIT_DEFAULT_POWER_KW) for r in rows] + [WAIT_DEFAULT_POWER_KW])
+        # stations listed without any charger rows: assume the default setup
+        unknown = np.append(total[:n] == 0, False)
+        total[unknown] = WAIT_DEFAULT_CHARGERS
+        return [r["station_id"] for r in rows], by_id, by_name, total, offline, busy, power
+
+    def _load_history(self):
+        """(arrivals, service) over the history window; None when there is no history table."""
+        table = self.history_table
+        with db_pool.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if not self._history_checked:
+                    # checked once: a missing table means no history, not an error every hour
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL AS found", (table,))
+                    self._history_checked = True
+                    if not cur.fetchone()["found"]:
+                        self.history_table = None
+                        print(f" Wait model: history table {table!r} not found, using priors")
+                        return None
+                query = _HISTORY_SQL.format(table=sql.Identifier(*table.split(".")))
+                cur.execute(query, (WAIT_HISTORY_DAYS,))
+                rows = cur.fetchall()
+        arrivals: Dict[str, np.ndarray] = {}
+        service: Dict[str, Tuple[int, float]] = {}
+        for r in rows:
+            counts = arrivals.setdefault(r["station_id"], np.zeros(_HOURS_PER_WEEK))
+            counts[int(r["dow"]) * 24 + int(r["hour"])] += int(r["arrivals"])
+            n, hours = service.get(r["station_id"], (0, 0.0))
+            service[r["station_id"]] = (n + int(r["arrivals"]), hours + float(r["service_h"] or 0.0))
+        return arrivals, service
+
+    def refresh(self):
+        """
+        Reloads charger status / history when stale, outside the lock so
+        estimate() never waits on the database; keeps the old data when a
+        load fails.
+        """
+        now = time.monotonic()
+        with self._lock:
+            chargers_due = now - self._chargers_at > self.charger_ttl_s
+            history_due = self.history_table is not None and now - self._history_at > self.history_ttl_s
+            # claim the refresh so concurrent callers do not repeat it
+            if chargers_due:
+                self._chargers_at = now
+            if history_due:
+                self._history_at = now
+
+        if chargers_due:
+            try:
+                loaded = self._load_chargers()
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f" Wait model: charger load failed: {e}")
+            else:
+                with self._lock:
+                    (self._ids, self._by_id, self._by_name, self._total, self._offline,
+                     self._busy, self._power) = loaded
+        if history_due:
+            try:
+                loaded = self._load_history()
+            except Exception as e:
+                # no access / DB down: arrival priors only
+                self.refresh_errors += 1
+                loaded = None
+                print(f" Wait model: history load failed, using priors: {e}")
+            with self._lock:
+                self._arrivals, self._service = loaded or ({}, {})
+                self._history_loaded = loaded is not None
+                self.history_version += 1
+                self._cache.clear()
+
+    async def refresh_async(self):
+        await asyncio.to_thread(self.refresh)
+
+    # ---------- estimation ----------
+    def _row(self, station: Dict[str, Any]) -> Tuple[int, str]:
+        """(row, cache key): by station_id, else by name, else the default row."""
+        sid = station.get("station_id")
+        row = self._by_id.get(str(sid)) if sid is not None else None
+        if row is None:
+            row = self._by_name.get((station.get("name") or "").strip().lower())
+        if row is None:
+            return len(self._total) - 1, "default"
+        return row, self._ids[row]
+
+    def _arrival_rate(self, key: str, how: int, servers: int) -> float:
+        """
+        Arrivals per hour in hour-of-week how: history counts shrunk toward
+        the prior, or the prior itself when no history was loaded.
+        """
+        prior = WAIT_PRIOR_ARRIVALS_PER_CHARGER_H * servers
+        if not self._history_loaded:
+            return prior
+        counts = self._arrivals.get(key)
+        seen = float(counts[how]) if counts is not None else 0.0
+        return (seen + WAIT_PRIOR_WEEKS * prior) / (WAIT_HISTORY_DAYS / 7.0 + WAIT_PRIOR_WEEKS)
+
+    def _service_hours(self, key: str, row: int) -> float:
+        n, hours = self._service.get(key, (0, 0.0))
+        if n >= WAIT_MIN_SESSIONS and hours > 0:
+            service_h = hours / n
+        else:
+            service_h = WAIT_SESSION_KWH / max(float(self._power[row]), 1.0)
+        return max(service_h, WAIT_MIN_SESSION_H)
+
+    def estimate(
+        self,
+        stations: Sequence[Dict[str, Any]],
+        trip_hours: Sequence[float],
+        now: Optional[datetime] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Per station (arrays in input order): queue_now_h (expected wait if
+        it joined now), wait_at_arrival_h (after driving trip_hours),
+        chargers_total and chargers_available.
+        """
+        now = now or datetime.now(WAIT_TZ)
+        n = len(stations)
+        trip = np.asarray(trip_hours, dtype=np.float64).reshape(n)
+        how_now = now.weekday() * 24 + now.hour
+        # hour-of-week bucket the driver arrives in (wall clock, no DST in the default zone)
+        into_hour = now.minute / 60.0 + now.second / 3600.0
+        how_arrive = (how_now + np.floor(into_hour + np.maximum(trip, 0.0)).astype(np.int64)) % _HOURS_PER_WEEK
+        with self._lock:
+            rows_keys = [self._row(s) for s in stations]
+            rows = np.fromiter((r for r, _ in rows_keys), dtype=np.int64, count=n)
+            total, offline, busy = self._total[rows], self._offline[rows], self._busy[rows]
+            servers = np.maximum(total - offline, 0)
+            service_h = np.array([self._service_hours(k, r) for r, k in rows_keys])
+
+            # queue waits now (slot 0) and at arrival (slot 1): cached per
+            # station and hour-of-week, the misses in one Erlang C call
+            waits = np.empty((2, n))
+            pending: "OrderedDict[Tuple[str, int], List[Tuple[int, int]]]" = OrderedDict()
+            for i, (_, key) in enumerate(rows_keys):
+                for slot, how in ((0, how_now), (1, int(how_arrive[i]))):
+                    ck = (key, how)
+                    hit = self._cache.get(ck)
+                    if hit is not None and hit[0] == self.history_version and hit[1] == servers[i]:
+                        self._cache.move_to_end(ck)
+                        self.hits += 1
+                        waits[slot, i] = hit[2]
+                    else:
+                        pending.setdefault(ck, []).append((slot, i))
+
+            t0 = time.perf_counter()
+            if pending:
+                self.misses += len(pending)
+                first = np.array([targets[0][1] for targets in pending.values()], dtype=np.int64)
+                lam = np.array([self._arrival_rate(key, how, int(servers[i]))
+                                for (key, how), i in zip(pending, first.tolist())])
+                computed = erlang_c_wait_hours(lam, service_h[first], servers[first])
+                for (ck, targets), i, w in zip(pending.items(), first.tolist(), computed.tolist()):
+                    for slot, j in targets:
+                        waits[slot, j] = w
+                    self._cache[ck] = (self.history_version, int(servers[i]), w)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+            self.last_batch = len(pending)
+            self.last_compute_ms = (time.perf_counter() - t0) * 1000.0
+
+        # live status: every working charger busy -> the first frees up after ~1/(c mu)
+        backlog = np.where((servers > 0) & (busy >= servers), service_h / np.maximum(servers, 1), 0.0)
+        return {
+            "queue_now_h": np.minimum(backlog + waits[0], WAIT_MAX_HOURS),
+            "wait_at_arrival_h": np.minimum(np.maximum(backlog - trip, 0.0) + waits[1], WAIT_MAX_HOURS),
+            "chargers_total": total,
+            "chargers_available": np.maximum(servers - busy, 0),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "stations": len(self._by_id),
+            "history_table": self.history_table,
+            "history_loaded": self._history_loaded,
+            "stations_with_history": len(self._arrivals),
+            "history_version": self.history_version,
+            "cache_entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "refresh_errors": self.refresh_errors,
+            "last_batch": self.last_batch,
+            "last_compute_ms": round(self.last_compute_ms, 3),
+        }
+
+
+wait_model = WaitTimeModel()
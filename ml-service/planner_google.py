@@ -2,9 +2,11 @@
 import time
 from typing import List, Tuple, Any
 import httpx
-from geopy.distance import geodesic
 from pydantic import BaseModel
 
+from services import alternatives, polyline
+from services.spatial_index import GridIndex
+
 GOOGLE_DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
 
 # ---------------- DTOs ----------------
@@ -22,49 +24,13 @@ class StationDTO(BaseModel):
     max_power_kw: float = 0
     charger_count: int = 0
     distance_to_route_km: float | None = None
-
-# ---------------- Polyline decode ----------------
-def decode_polyline5(polyline_str: str) -> List[Tuple[float, float]]:
-    index, lat, lng, coordinates = 0, 0, 0, []
-    while index < len(polyline_str):
-        result, shift = 0, 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        dlat = ~(result >> 1) if result & 1 else result >> 1
-        lat += dlat
-
-        result, shift = 0, 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1F) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        dlng = ~(result >> 1) if result & 1 else result >> 1
-        lng += dlng
-
-        coordinates.append((lat / 1e5, lng / 1e5))
-
-    return coordinates
-
-
-def haversine_km(a, b):
-    return geodesic(a, b).km
-
-
-def point_segment_distance_km(p, a, b):
-    # simple & fast midpoint heuristic
-    return min(
-        haversine_km(p, a),
-        haversine_km(p, b),
-        haversine_km(p, ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)),
-    )
+    # per route, indexed like the routes list (None: outside that corridor)
+    route_distances_km: List[float | None] | None = None
+    serves_routes: List[int] | None = None
+    # km from the start of the first route served, and off-route-and-back km
+    along_route_km: float | None = None
+    detour_km: float | None = None
+    route_along_km: List[float | None] | None = None
 
 # ---------------- Directions + stations ----------------
 class TTLCache:
@@ -91,6 +57,8 @@ class GoogleEVPlanner:
         self.key = google_api_key
         self.max_station_distance_km = max_station_distance_km
         self.cache = TTLCache(ttl=25)
+        self._index = None
+        self._index_src = None
 
     async def get_routes_from_google(self, start, end, waypoints=None):
         waypoints = waypoints or []
@@ -122,7 +90,7 @@ class GoogleEVPlanner:
             dist_m = sum(l.get("distance", {}).get("value", 0) for l in legs)
             dur_s = sum(l.get("duration", {}).get("value", 0) for l in legs)
             poly = rt.get("overview_polyline", {}).get("points", "")
-            path = decode_polyline5(poly)
+            path = polyline.decode(poly).tolist()
 
             routes.append(
                 RouteDTO(
@@ -137,30 +105,22 @@ class GoogleEVPlanner:
         return routes
 
     def stations_near_any_route(self, routes: List[RouteDTO], stations: List[StationDTO]):
-        if not routes:
-            return []
-
-        path = routes[0].path
-        if len(path) < 2:
+        """
+        Stations within the corridor of any of routes, in along-route order,
+        each with its distance to and offset along every route and the routes
+        it serves.
+        """
+        if not routes or not stations:
             return []
 
-        near = []
-        for s in stations:
-            p = (s.lat, s.lon)
-            best = 9999
-            for i in range(len(path) - 1):
-                a = path[i]
-                b = path[i + 1]
-                d = point_segment_distance_km(p, a, b)
-                if d < best:
-                    best = d
-                    if best <= self.max_station_distance_km:
-                        break
-
-            if best <= self.max_station_distance_km:
-                s2 = s.model_copy()
-                s2.distance_to_route_km = round(best, 2)
-                near.append(s2)
-
-        near.sort(key=lambda s: s.distance_to_route_km or 9999)
-        return near
+        if self._index is None or self._index_src is not stations:
+            self._index = GridIndex([s.lat for s in stations], [s.lon for s in stations])
+            self._index_src = stations
+        index = self._index
+        matches = alternatives.match_routes(
+            [r.path for r in routes], index.lats, index.lons, self.max_station_distance_km, index=index
+        )
+
+        # dump only the matched stations, keyed by their index in stations
+        records = {i: stations[i].model_dump() for i in matches.idx.tolist()}
+        return [StationDTO(**s) for s in alternatives.annotate(records, matches)]
@@ -0,0 +1,173 @@
+# ml-service/services/alternatives.py
+"""
+Corridor matching against all alternative routes of a response at once.
+
+Alternatives usually share long stretches: the way out of the origin, the
+motorway in the middle, the approach to the destination. The routes are cut
+into pieces, maximal runs of consecutive segments used by the same set of
+routes, every distinct piece is matched once, and a station's distance to a
+route is the minimum over the pieces that route is made of. Shared stretches
+are therefore measured once, not once per alternative. Each piece remembers
+where it starts along every route it occurs in, so along-route offsets come
+out per route as well.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services import corridor
+from services.simplify import simplify_indices
+from services.spatial_index import GridIndex
+
+# route membership is a bit mask per segment
+_MAX_ROUTES = 63
+
+
+class Piece(NamedTuple):
+    path: np.ndarray            # (n, 2) lat, lon, n >= 2
+    routes: List[int]           # routes this stretch occurs in
+    starts_km: List[float]      # where it starts along each of them
+    coarse_indices: np.ndarray  # simplify_indices(path, simplify_m)
+    cumulative_km: np.ndarray   # along the piece, from its first vertex
+
+
+class RouteMatches(NamedTuple):
+    idx: np.ndarray    # (k,) station indices, ordered by distance to the nearest route
+    dist: np.ndarray   # (k, n_routes) km, inf where outside that route's corridor
+    along: np.ndarray  # (k, n_routes) km from that route's start, nan where outside
+
+    @property
+    def serves(self) -> np.ndarray:
+        """(k, n_routes) bool: station is within the corridor of route r."""
+        return np.isfinite(self.dist)
+
+    def for_route(self, r: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(indices, distances, offsets) for route r alone, same as match_corridor_along."""
+        d = self.dist[:, r]
+        keep = np.flatnonzero(np.isfinite(d))
+        keep = keep[np.lexsort((d[keep], self.along[keep, r]))]
+        return self.idx[keep], d[keep], self.along[keep, r]
+
+
+def split_routes(
+    paths: Sequence[Sequence[Tuple[float, float]]],
+    simplify_m: float = 0.0,
+    cumulative: Optional[Sequence[np.ndarray]] = None,
+) -> List[Piece]:
+    """
+    Distinct pieces of paths. Segments are compared exactly (same vertices,
+    same direction), which is what OSRM/Google return for a shared stretch.
+    cumulative: corridor.cumulative_km of each path, computed when not given.
+    """
+    if len(paths) > _MAX_ROUTES:
+        raise ValueError(f"at most {_MAX_ROUTES} routes")
+    arrs = [corridor.as_path_array(p) for p in paths]
+    cums = list(cumulative) if cumulative is not None else [corridor.cumulative_km(a) for a in arrs]
+    segs = [np.hstack([a[:-1], a[1:]]) for a in arrs]
+    if not any(len(s) for s in segs):
+        return []
+
+    _, inverse = np.unique(np.concatenate(segs), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    owner = np.repeat(np.arange(len(segs), dtype=np.int64), [len(s) for s in segs])
+    masks = np.zeros(int(inverse.max()) + 1, dtype=np.int64)
+    np.bitwise_or.at(masks, inverse, np.left_shift(1, owner))
+
+    pieces: Dict[bytes, Piece] = {}
+    offset = 0
+    for r, s in enumerate(segs):
+        ids = inverse[offset:offset + len(s)]
+        offset += len(s)
+        m = masks[ids]
+        cuts = (np.flatnonzero(m[1:] != m[:-1]) + 1).tolist()
+        for lo, hi in zip([0, *cuts], [*cuts, len(ids)]):
+            key = ids[lo:hi].tobytes()
+            piece = pieces.get(key)
+            if piece is None:
+                path = arrs[r][lo:hi + 1]
+                piece = pieces[key] = Piece(
+                    path=path, routes=[], starts_km=[],
+                    coarse_indices=simplify_indices(path, simplify_m),
+                    cumulative_km=cums[r][lo:hi + 1] - cums[r][lo],
+                )
+            if r not in piece.routes:
+                piece.routes.append(r)
+                piece.starts_km.append(float(cums[r][lo]))
+    return list(pieces.values())
+
+
+def combine(
+    pieces: List[Piece],
+    matches: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    n_routes: int,
+) -> RouteMatches:
+    """Per-piece match_corridor_along results -> per-route distances and offsets."""
+    found = [m[0] for m in matches if len(m[0])]
+    if not found:
+        return RouteMatches(np.empty(0, dtype=np.int64), np.empty((0, n_routes)), np.empty((0, n_routes)))
+
+    idx = np.unique(np.concatenate(found))
+    dist = np.full((len(idx), n_routes), np.inf)
+    along = np.full((len(idx), n_routes), np.nan)
+    for piece, (p_idx, p_dist, p_along) in zip(pieces, matches):
+        rows = np.searchsorted(idx, p_idx)
+        for r, start in zip(piece.routes, piece.starts_km):
+            better = p_dist < dist[rows, r]
+            dist[rows[better], r] = p_dist[better]
+            along[rows[better], r] = start + p_along[better]
+
+    order = np.argsort(dist.min(axis=1), kind="stable")
+    return RouteMatches(idx[order], dist[order], along[order])
+
+
+def match_routes(
+    paths: Sequence[Sequence[Tuple[float, float]]],
+    lats,
+    lons,
+    max_distance_km: float,
+    index: Optional[GridIndex] = None,
+    simplify_m: float = 0.0,
+    cumulative: Optional[Sequence[np.ndarray]] = None,
+) -> RouteMatches:
+    """
+    Stations within max_distance_km of any of paths, with their distance to
+    and offset along each one. simplify_m > 0 prunes each piece against its
+    Douglas-Peucker simplification first (see corridor.match_corridor);
+    distances are exact.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    pieces = split_routes(paths, simplify_m, cumulative)
+    matches = [
+        corridor.match_corridor_along(
+            p.path, lats, lons, max_distance_km, index=index,
+            coarse_indices=p.coarse_indices if simplify_m > 0 else None,
+            coarse_tolerance_km=simplify_m / 1000.0, cumulative=p.cumulative_km,
+        )
+        for p in pieces
+    ]
+    return combine(pieces, matches, len(paths))
+
+
+def annotate(stations: List[Dict[str, Any]], matches: RouteMatches) -> List[Dict[str, Any]]:
+    """
+    Copies of the matched stations in along-route order, with
+    distance_to_route_km (to the nearest route), route_distances_km and
+    route_along_km (one entry per route, None outside its corridor),
+    serves_routes, and along_route_km / detour_km as in corridor.annotate,
+    taken on the first (fastest) route the station serves. stations is
+    indexed by matches.idx: the full list, or a dict holding only those.
+    """
+    near = []
+    for i, row, offsets in zip(matches.idx.tolist(), matches.dist.tolist(), matches.along.tolist()):
+        serves = [r for r, d in enumerate(row) if d != float("inf")]
+        s2 = dict(stations[i])
+        s2["distance_to_route_km"] = round(min(row), 2)
+        s2["along_route_km"] = round(offsets[serves[0]], 2)
+        s2["detour_km"] = round(2.0 * row[serves[0]], 2)
+        s2["route_distances_km"] = [round(row[r], 2) if r in serves else None for r in range(len(row))]
+        s2["route_along_km"] = [round(offsets[r], 2) if r in serves else None for r in range(len(row))]
+        s2["serves_routes"] = serves
+        near.append(s2)
+    near.sort(key=lambda s: s["along_route_km"])
+    return near
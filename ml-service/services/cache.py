@@ -0,0 +1,166 @@
+# ml-service/services/cache.py
+"""
+Thread-safe TTL + LRU cache with single-flight loading.
+
+Concurrent misses on the same key share one upstream call: the first caller
+runs the loader, the others wait for its result (or its exception). The
+Async* variants do the same for coroutines on one event loop.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Sequence, Tuple
+
+ROUTE_CACHE_TTL_S = float(os.getenv("ROUTE_CACHE_TTL_S", "600"))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "512"))
+# 4 decimals ~ 11 m; requests closer than that share a route
+ROUTE_CACHE_COORD_DECIMALS = int(os.getenv("ROUTE_CACHE_COORD_DECIMALS", "4"))
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._store: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _begin(self, key: Hashable, new_flight: Callable[[], Any]) -> Tuple[bool, Any, bool]:
+        """(hit, value or flight, leader) under the lock."""
+        with self._lock:
+            item = self._store.get(key)
+            if item is not None and time.monotonic() - item[0] <= self.ttl_s:
+                self._store.move_to_end(key)
+                self.hits += 1
+                return True, item[1], False
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = new_flight()
+                self.misses += 1
+                return False, flight, True
+            self.coalesced += 1
+            return False, flight, False
+
+    def _finish(self, key: Hashable, ok: bool, value: Any = None):
+        with self._lock:
+            if ok:
+                self._store[key] = (time.monotonic(), value)
+                self._store.move_to_end(key)
+                while len(self._store) > self.max_entries:
+                    self._store.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.errors += 1
+            self._flights.pop(key, None)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        hit, flight, leader = self._begin(key, _Flight)
+        if hit:
+            return flight
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            self._finish(key, False)
+            raise
+        else:
+            self._finish(key, True, flight.value)
+        finally:
+            flight.done.set()
+        return flight.value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._store),
+                "in_flight": len(self._flights),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "ttl_s": self.ttl_s,
+            }
+
+
+class AsyncSingleFlightCache(SingleFlightCache):
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        hit, flight, leader = self._begin(key, asyncio.get_running_loop().create_future)
+        if hit:
+            return flight
+        if not leader:
+            # shield: a waiter giving up must not cancel the shared call
+            return await asyncio.shield(flight)
+
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            self._finish(key, False)
+            flight.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key, False)
+            flight.set_exception(e)
+            flight.exception()  # retrieved; waiters (if any) still see it
+            raise
+        self._finish(key, True, value)
+        flight.set_result(value)
+        return value
+
+
+def route_key(
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    waypoints: Sequence[Tuple[float, float]],
+    alternatives: Any,
+    decimals: int = ROUTE_CACHE_COORD_DECIMALS,
+) -> Tuple:
+    def r(p):
+        return (round(float(p[0]), decimals), round(float(p[1]), decimals))
+
+    return (r(start), r(end), tuple(r(w) for w in waypoints or []), bool(alternatives))
+
+
+class RouteCache(SingleFlightCache):
+    """Decoded routes (path as a NumPy array) keyed by rounded coordinates."""
+
+    def __init__(self, ttl_s: float = ROUTE_CACHE_TTL_S, max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        super().__init__(ttl_s, max_entries)
+
+    def get_routes(self, start, end, waypoints, alternatives, fetch: Callable[[], List[Dict[str, Any]]]):
+        return self.get_or_load(route_key(start, end, waypoints, alternatives), fetch)
+
+
+class AsyncRouteCache(AsyncSingleFlightCache):
+    """RouteCache for the async app; fetch is a coroutine function."""
+
+    def __init__(self, ttl_s: float = ROUTE_CACHE_TTL_S, max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        super().__init__(ttl_s, max_entries)
+
+    async def get_routes(self, start, end, waypoints, alternatives, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        return await self.get_or_load(route_key(start, end, waypoints, alternatives), fetch)
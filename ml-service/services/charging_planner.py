@@ -0,0 +1,249 @@
+# ml-service/services/charging_planner.py
+"""
+Charging stops along a route for a vehicle leaving with a given state of
+charge, using model/create_api/calculate_batry.BatteryRange for the range.
+
+Corridor stations are ordered by where they sit along the route, so a plan
+only ever moves forward and the candidate stops form a DAG: origin ->
+stations -> destination. One forward sweep in route order relaxes every
+reachable (stop, next stop) pair, vectorised per stop, and the cheapest plan
+falls out; with a few hundred corridor stations that is milliseconds.
+
+Cost is the time a plan adds to the drive: charging (range added over the
+station's max_power_kw), the detour off the route and back, and a fixed
+overhead per stop. Intermediate stops charge to charge_to_soc, the last one
+only as far as needed to arrive with reserve_soc left.
+"""
+import importlib.util
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+CHARGE_TO_SOC = float(os.getenv("CHARGE_TO_SOC", "80"))
+RESERVE_SOC = float(os.getenv("RESERVE_SOC", "10"))
+VEHICLE_KWH_PER_KM = float(os.getenv("VEHICLE_KWH_PER_KM", "0.16"))
+CHARGING_EFFICIENCY = float(os.getenv("CHARGING_EFFICIENCY", "0.9"))
+CHARGING_STOP_OVERHEAD_MIN = float(os.getenv("CHARGING_STOP_OVERHEAD_MIN", "5"))
+CHARGING_DETOUR_KMH = float(os.getenv("CHARGING_DETOUR_KMH", "40"))
+
+
+def _load_battery_range():
+    # model.py at the service root shadows the model/ directory as a
+    # package, so load the module from its file
+    path = Path(__file__).resolve().parents[1] / "model" / "create_api" / "calculate_batry.py"
+    spec = importlib.util.spec_from_file_location("calculate_batry", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BatteryRange
+
+
+BatteryRange = _load_battery_range()
+
+
+class Vehicle(NamedTuple):
+    soc: float                    # % at departure
+    full_range_km: float
+    reserve_soc: float = RESERVE_SOC
+    charge_to_soc: float = CHARGE_TO_SOC
+    kwh_per_km: float = VEHICLE_KWH_PER_KM
+    max_charge_kw: float = 0.0    # 0: limited by the station only
+
+
+def parse_vehicle(data: Optional[Dict[str, Any]]) -> Optional[Vehicle]:
+    """Request's "vehicle" object -> Vehicle; raises ValueError when invalid."""
+    if not data:
+        return None
+    try:
+        v = Vehicle(
+            soc=float(data["soc"]),
+            full_range_km=float(data["full_range_km"]),
+            reserve_soc=float(data.get("reserve_soc", RESERVE_SOC)),
+            charge_to_soc=float(data.get("charge_to_soc", CHARGE_TO_SOC)),
+            kwh_per_km=float(data.get("kwh_per_km", VEHICLE_KWH_PER_KM)),
+            max_charge_kw=float(data.get("max_charge_kw") or 0.0),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("vehicle needs numeric soc (%) and full_range_km")
+    if v.full_range_km <= 0 or v.kwh_per_km <= 0:
+        raise ValueError("vehicle full_range_km and kwh_per_km must be positive")
+    if not 0 <= v.reserve_soc < v.charge_to_soc <= 100 or not 0 <= v.soc <= 100:
+        raise ValueError("vehicle needs 0 <= reserve_soc < charge_to_soc <= 100 and 0 <= soc <= 100")
+    return v
+
+
+def _range_per_hour(power_kw: np.ndarray, vehicle: Vehicle) -> np.ndarray:
+    """km of range added per hour of charging at each station's max_power_kw."""
+    power = np.asarray(power_kw, dtype=np.float64)
+    if vehicle.max_charge_kw > 0:
+        power = np.minimum(power, vehicle.max_charge_kw)
+    return np.maximum(power, 0.0) * CHARGING_EFFICIENCY / vehicle.kwh_per_km
+
+
+def plan_stops(
+    offsets_km: np.ndarray,
+    detour_km: np.ndarray,
+    power_kw: np.ndarray,
+    route_km: float,
+    vehicle: Vehicle,
+) -> Optional[List[Tuple[int, float, float]]]:
+    """
+    Cheapest stop sequence. offsets_km: along-route position of each
+    station, sorted ascending; detour_km: one way from the route to the
+    station. Returns [(station, arrival_km, departure_km), ...] in range
+    terms ([] when no stop is needed), or None when no plan reaches the
+    destination.
+    """
+    battery = BatteryRange(vehicle.full_range_km)
+    start = battery.get_range(vehicle.soc)
+    target = battery.get_range(vehicle.charge_to_soc)
+    reserve = battery.get_range(vehicle.reserve_soc)
+    if start - route_km >= reserve:
+        return []
+
+    # stations without a known charger are skipped
+    rate = _range_per_hour(power_kw, vehicle)
+    stop_h = CHARGING_STOP_OVERHEAD_MIN / 60.0 + 2.0 * detour_km / CHARGING_DETOUR_KMH
+    # range needed after leaving station j to reach the destination with the reserve
+    need = (route_km - offsets_km) + detour_km + reserve
+
+    n = len(offsets_km)
+    best = np.full(n, np.inf)       # hours added, arriving at j and charging to target
+    prev = np.full(n, -1)           # -1: origin
+    finish = (np.inf, -2, -1)       # (hours, predecessor of last stop, last stop)
+
+    for i in range(-1, n):
+        if i < 0:
+            cost_i, s_i, d_i, leave = 0.0, 0.0, 0.0, start
+        else:
+            cost_i, s_i, d_i, leave = best[i], offsets_km[i], detour_km[i], target
+            if not np.isfinite(cost_i):
+                continue
+        hi = int(np.searchsorted(offsets_km, s_i + leave - reserve, side="right"))
+        js = np.arange(i + 1, hi)
+        if len(js) == 0:
+            continue
+        arrive = leave - (offsets_km[js] - s_i + d_i + detour_km[js])
+        ok = (arrive >= reserve) & (rate[js] > 0.0)
+        js, arrive = js[ok], arrive[ok]
+        if len(js) == 0:
+            continue
+        hours = cost_i + stop_h[js] + np.maximum(target - arrive, 0.0) / rate[js]
+        better = hours < best[js]
+        best[js[better]] = hours[better]
+        prev[js[better]] = i
+
+        # j as the last stop: charge only up to what the final leg needs
+        last = need[js] <= target
+        if last.any():
+            fin = cost_i + stop_h[js] + np.maximum(need[js] - arrive, 0.0) / rate[js]
+            fin[~last] = np.inf
+            k = int(fin.argmin())
+            if fin[k] < finish[0]:
+                finish = (float(fin[k]), i, int(js[k]))
+
+    if finish[2] < 0:
+        return None
+    chain = [finish[2]]
+    i = finish[1]
+    while i >= 0:
+        chain.append(i)
+        i = int(prev[i])
+    chain.reverse()
+
+    stops = []
+    leave, s_prev, d_prev = start, 0.0, 0.0
+    for n_stop, j in enumerate(chain):
+        arrive = leave - (offsets_km[j] - s_prev + d_prev + detour_km[j])
+        depart = target if n_stop < len(chain) - 1 else max(arrive, need[j])
+        stops.append((j, arrive, depart))
+        leave, s_prev, d_prev = depart, offsets_km[j], detour_km[j]
+    return stops
+
+
+def plan_route(
+    route: Dict[str, Any],
+    stations: Sequence[Dict[str, Any]],
+    distances_km: Sequence[float],
+    offsets_km: Sequence[float],
+    vehicle: Vehicle,
+) -> Dict[str, Any]:
+    """
+    Charging plan for one route (as returned by services.routing.parse_routes)
+    from its corridor stations, their distance to it and their along-route
+    offsets (services.corridor.match_corridor_along).
+    """
+    battery = BatteryRange(vehicle.full_range_km)
+    n = len(stations)
+    offsets = np.asarray(offsets_km, dtype=np.float64).reshape(n)
+    path_km = float(route["cumulative_km"][-1]) if len(route["cumulative_km"]) else 0.0
+    if path_km > 0:
+        # polyline km -> road km
+        offsets = offsets * (route["distance_km"] / path_km)
+    order = np.argsort(offsets, kind="stable")
+    offsets = offsets[order]
+    detour = np.asarray(distances_km, dtype=np.float64).reshape(n)[order]
+    power = np.fromiter((s.get("max_power_kw") or 0.0 for s in stations), dtype=np.float64, count=n)[order]
+
+    stops = plan_stops(offsets, detour, power, route["distance_km"], vehicle)
+    if stops is None:
+        return {"feasible": False, "reason": "no reachable sequence of corridor stations", "stops": []}
+
+    rate = _range_per_hour(power, vehicle)
+    out = []
+    charge_min = detour_km = 0.0
+    for j, arrive, depart in stops:
+        st = stations[int(order[j])]
+        minutes = (depart - arrive) / rate[j] * 60.0
+        charge_min += minutes
+        detour_km += 2.0 * detour[j]
+        out.append({
+            "station_id": st.get("station_id"),
+            "name": st.get("name"),
+            "lat": st["lat"],
+            "lon": st["lon"],
+            "max_power_kw": st.get("max_power_kw"),
+            "along_route_km": round(float(offsets[j]), 1),
+            "detour_km": round(2.0 * float(detour[j]), 2),
+            "arrival_soc": round(arrive / battery.full_range * 100.0, 1),
+            "departure_soc": round(depart / battery.full_range * 100.0, 1),
+            "charge_min": round(float(minutes), 1),
+        })
+
+    if stops:
+        j, _, depart = stops[-1]
+        final = depart - (route["distance_km"] - offsets[j]) - detour[j]
+    else:
+        final = battery.get_range(vehicle.soc) - route["distance_km"]
+    return {
+        "feasible": True,
+        "stops": out,
+        "charge_min": round(charge_min, 1),
+        "detour_km": round(float(detour_km), 2),
+        "added_min": round(
+            charge_min + len(out) * CHARGING_STOP_OVERHEAD_MIN + detour_km / CHARGING_DETOUR_KMH * 60.0, 1),
+        "arrival_soc": round(float(final) / battery.full_range * 100.0, 1),
+    }
+
+
+def plan_alternatives(
+    routes: List[Dict[str, Any]],
+    near: List[Dict[str, Any]],
+    vehicle: Vehicle,
+) -> List[Dict[str, Any]]:
+    """
+    plan_route for every route, from the stations of
+    services.alternatives.annotate (route_distances_km and route_along_km).
+    """
+    plans = []
+    for r, route in enumerate(routes):
+        on_route = [s for s in near if s["route_distances_km"][r] is not None]
+        plans.append(plan_route(
+            route, on_route,
+            [s["route_distances_km"][r] for s in on_route],
+            [s["route_along_km"][r] for s in on_route],
+            vehicle,
+        ))
+    return plans
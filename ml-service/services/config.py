@@ -0,0 +1,12 @@
+# ml-service/services/config.py
+"""Settings shared by the Flask app (app.py) and the async app (api.py)."""
+import os
+
+
+def pg_uri() -> str:
+    host = os.getenv("POSTGRES_HOST", "localhost")
+    port = os.getenv("POSTGRES_PORT", "5432")
+    dbn  = os.getenv("POSTGRES_DB", "ampora")
+    usr  = os.getenv("POSTGRES_USER", "ampora_user")
+    pwd  = os.getenv("POSTGRES_PASSWORD", "a")
+    return f"postgresql+psycopg2://{usr}:{pwd}@{host}:{port}/{dbn}"
@@ -0,0 +1,257 @@
+# ml-service/services/corridor_pool.py
+"""
+Process pool for corridor matching.
+
+Each station snapshot version is published once into a SharedMemory block
+(lat row, lon row); workers attach to it by name and build their GridIndex
+once per version, so a task only ships the route path and gets back the
+matched (indices, distances, along-route offsets), in along-route order. Routes of one response are matched in
+parallel; match_routes_async splits alternatives into their shared pieces
+(services/alternatives.py) first so common stretches are matched once.
+CORRIDOR_POOL_WORKERS=0 runs everything inline in the caller.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services import alternatives, corridor
+from services.spatial_index import GridIndex
+
+CORRIDOR_POOL_WORKERS = int(os.getenv("CORRIDOR_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# spawn: the parent is threaded (uvicorn, snapshot refresher), fork is unsafe there
+CORRIDOR_POOL_START = os.getenv("CORRIDOR_POOL_START", "spawn")
+CORRIDOR_POOL_LATENCY_WINDOW = int(os.getenv("CORRIDOR_POOL_LATENCY_WINDOW", "512"))
+
+# versions kept published: the current one plus the one in-flight tasks may still use
+_KEEP_VERSIONS = 2
+
+Match = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class SharedStations(NamedTuple):
+    shm_name: str
+    count: int
+    version: int
+
+
+# ---------- worker side ----------
+_worker: Dict[str, Any] = {"name": None, "shm": None, "index": None}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # < 3.13 always registers; workers share the parent's resource
+        # tracker, so the duplicate registration is a no-op and the parent's
+        # unlink() still clears it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_index(stations: SharedStations) -> GridIndex:
+    if _worker["name"] != stations.shm_name:
+        old = _worker["shm"]
+        _worker.update(name=None, shm=None, index=None)  # drop views before close()
+        if old is not None:
+            old.close()
+        shm = _attach(stations.shm_name)
+        cols = np.ndarray((2, stations.count), dtype=np.float64, buffer=shm.buf)
+        _worker.update(name=stations.shm_name, shm=shm, index=GridIndex(cols[0], cols[1]))
+    return _worker["index"]
+
+
+def _match_task(stations, path, max_distance_km, coarse_indices, coarse_tolerance_km, cumulative) -> Tuple[Match, float]:
+    t0 = time.perf_counter()
+    index = _worker_index(stations)
+    match = corridor.match_corridor_along(
+        path, index.lats, index.lons, max_distance_km, index=index,
+        coarse_indices=coarse_indices, coarse_tolerance_km=coarse_tolerance_km, cumulative=cumulative,
+    )
+    return match, (time.perf_counter() - t0) * 1000.0
+
+
+# ---------- parent side ----------
+class CorridorPool:
+    def __init__(self, workers: int = CORRIDOR_POOL_WORKERS, start_method: str = CORRIDOR_POOL_START):
+        self.workers = max(0, workers)
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._published: "OrderedDict[int, Tuple[shared_memory.SharedMemory, SharedStations]]" = OrderedDict()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._latency_ms: deque = deque(maxlen=CORRIDOR_POOL_LATENCY_WINDOW)
+        self._work_ms: deque = deque(maxlen=CORRIDOR_POOL_LATENCY_WINDOW)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context(self.start_method))
+        return self._executor
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        # a worker died (OOM, segfault): start a fresh pool on the next submit
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+                self.restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _publish(self, snap) -> SharedStations:
+        """Shared copy of snap's coordinates; one block per snapshot version."""
+        hit = self._published.get(snap.version)
+        if hit is not None:
+            return hit[1]
+        n = len(snap)
+        shm = shared_memory.SharedMemory(create=True, size=max(16, 16 * n))
+        cols = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+        cols[0] = snap.lat
+        cols[1] = snap.lon
+        del cols
+        desc = SharedStations(shm.name, n, snap.version)
+        self._published[snap.version] = (shm, desc)
+        while len(self._published) > _KEEP_VERSIONS:
+            _, (old, _) = self._published.popitem(last=False)
+            old.close()
+            old.unlink()
+        return desc
+
+    def _record(self, started: float, work_ms: Optional[float], ok: bool):
+        with self._lock:
+            if ok:
+                self.completed += 1
+                self._latency_ms.append((time.perf_counter() - started) * 1000.0)
+                self._work_ms.append(work_ms)
+            else:
+                self.failed += 1
+
+    def submit(
+        self,
+        snap,
+        path: Sequence[Tuple[float, float]],
+        max_distance_km: float,
+        coarse_indices: Optional[Sequence[int]] = None,
+        coarse_tolerance_km: float = 0.0,
+        cumulative: Optional[np.ndarray] = None,
+    ) -> "Future[Match]":
+        """
+        Match one path against snap (a services.stations.StationColumns);
+        cumulative is corridor.cumulative_km(path), if already known.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            desc = self._publish(snap) if self.workers and len(snap) else None
+            pool = self._pool() if desc is not None else None
+
+        out: Future = Future()
+        if desc is None:
+            # inline: no workers configured, or nothing to share
+            try:
+                match = corridor.match_corridor_along(
+                    path, snap.lat, snap.lon, max_distance_km, index=snap.index,
+                    coarse_indices=coarse_indices, coarse_tolerance_km=coarse_tolerance_km, cumulative=cumulative,
+                )
+            except BaseException as e:
+                self._record(started, None, False)
+                out.set_exception(e)
+            else:
+                self._record(started, (time.perf_counter() - started) * 1000.0, True)
+                out.set_result(match)
+            return out
+
+        task = pool.submit(
+            _match_task, desc, corridor.as_path_array(path), max_distance_km,
+            None if coarse_indices is None else np.asarray(coarse_indices), coarse_tolerance_km,
+            None if cumulative is None else np.asarray(cumulative),
+        )
+
+        def done(f: Future):
+            try:
+                match, work_ms = f.result()
+            except BaseException as e:
+                self._record(started, None, False)
+                if isinstance(e, BrokenProcessPool):
+                    self._discard(pool)
+                out.set_exception(e)
+            else:
+                self._record(started, work_ms, True)
+                out.set_result(match)
+
+        task.add_done_callback(done)
+        return out
+
+    def _submit_all(self, snap, paths, max_distance_km, coarse, coarse_tolerance_km, cumulative) -> List[Future]:
+        coarse = coarse or [None] * len(paths)
+        cumulative = cumulative or [None] * len(paths)
+        return [
+            self.submit(snap, p, max_distance_km, c, coarse_tolerance_km, cum)
+            for p, c, cum in zip(paths, coarse, cumulative)
+        ]
+
+    def match(self, snap, paths, max_distance_km, coarse=None, coarse_tolerance_km=0.0, cumulative=None) -> List[Match]:
+        """Blocking: one (indices, distances, offsets) per path, all paths in parallel."""
+        futures = self._submit_all(snap, paths, max_distance_km, coarse, coarse_tolerance_km, cumulative)
+        return [f.result() for f in futures]
+
+    async def match_async(
+        self, snap, paths, max_distance_km, coarse=None, coarse_tolerance_km=0.0, cumulative=None
+    ) -> List[Match]:
+        if not self.workers:
+            # inline mode still must not run on the event loop
+            return await asyncio.to_thread(
+                self.match, snap, paths, max_distance_km, coarse, coarse_tolerance_km, cumulative
+            )
+        futures = self._submit_all(snap, paths, max_distance_km, coarse, coarse_tolerance_km, cumulative)
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    async def match_routes_async(
+        self, snap, paths, max_distance_km, simplify_m: float = 0.0, cumulative=None
+    ) -> "alternatives.RouteMatches":
+        """All alternatives at once: per-station distance to, and offset along, each of paths."""
+        pieces = await asyncio.to_thread(alternatives.split_routes, paths, simplify_m, cumulative)
+        matches = await self.match_async(
+            snap, [p.path for p in pieces], max_distance_km,
+            coarse=[p.coarse_indices for p in pieces] if simplify_m > 0 else None,
+            coarse_tolerance_km=simplify_m / 1000.0,
+            cumulative=[p.cumulative_km for p in pieces],
+        )
+        return alternatives.combine(pieces, matches, len(paths))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = np.asarray(self._latency_ms, dtype=np.float64)
+            work = np.asarray(self._work_ms, dtype=np.float64)
+            return {
+                "workers": self.workers,
+                "mode": f"process/{self.start_method}" if self.workers else "inline",
+                "queue_depth": self.submitted - self.completed - self.failed,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "latency_ms_p50": round(float(np.percentile(lat, 50)), 2) if lat.size else None,
+                "latency_ms_p95": round(float(np.percentile(lat, 95)), 2) if lat.size else None,
+                "work_ms_p50": round(float(np.percentile(work, 50)), 2) if work.size else None,
+                "published_versions": list(self._published),
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            while self._published:
+                _, (shm, _) = self._published.popitem(last=False)
+                shm.close()
+                shm.unlink()
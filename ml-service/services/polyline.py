@@ -0,0 +1,94 @@
+# ml-service/services/polyline.py
+"""
+Encoded polyline codec (Google / OSRM, precision 5 or 6).
+
+decode() works on the whole string at once in NumPy and returns an (n, 2)
+float64 array of (lat, lon), which feeds straight into services.corridor.
+iter_decode() yields (lat, lon) tuples one at a time, from a string or from
+an iterable of string chunks, for consumers that stream.
+"""
+from typing import Iterable, Iterator, Sequence, Tuple, Union
+
+import numpy as np
+
+# 64-bit accumulators: anything needing more than 12 chunks is garbage
+_MAX_SHIFT = 60
+
+
+def _factor(precision: int) -> float:
+    if precision not in (5, 6):
+        raise ValueError(f"unsupported polyline precision: {precision}")
+    return float(10 ** precision)
+
+
+def decode(encoded: str, precision: int = 5) -> np.ndarray:
+    """Encoded polyline -> float64 array of shape (n, 2) holding (lat, lon)."""
+    factor = _factor(precision)
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+
+    b = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if b.min() < 0 or b.max() > 0x3F:
+        raise ValueError("invalid character in polyline")
+
+    # each varint ends at the first chunk without the continuation bit
+    ends = np.flatnonzero(b < 0x20)
+    if len(ends) == 0 or ends[-1] != len(b) - 1 or len(ends) % 2:
+        raise ValueError("truncated polyline")
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    shift = 5 * (np.arange(len(b)) - np.repeat(starts, ends - starts + 1))
+    if shift.max() > _MAX_SHIFT:
+        raise ValueError("malformed polyline")
+    values = np.add.reduceat((b & 0x1F) << shift, starts)
+
+    # zig-zag: low bit carries the sign
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / factor
+
+
+def iter_decode(encoded: Union[str, Iterable[str]], precision: int = 5) -> Iterator[Tuple[float, float]]:
+    """Lazily yield (lat, lon); accepts a whole string or an iterable of chunks."""
+    factor = _factor(precision)
+    chunks = (encoded,) if isinstance(encoded, str) else encoded
+
+    coord = [0, 0]
+    axis = result = shift = 0
+    for chunk in chunks:
+        for ch in chunk:
+            b = ord(ch) - 63
+            if b < 0 or b > 0x3F:
+                raise ValueError("invalid character in polyline")
+            result |= (b & 0x1F) << shift
+            shift += 5
+            if b >= 0x20:
+                continue
+            coord[axis] += ~(result >> 1) if result & 1 else (result >> 1)
+            result = shift = 0
+            if axis:
+                yield coord[0] / factor, coord[1] / factor
+            axis ^= 1
+    if shift or axis:
+        raise ValueError("truncated polyline")
+
+
+def encode(points: Union[np.ndarray, Sequence[Tuple[float, float]]], precision: int = 5) -> str:
+    """(lat, lon) points -> encoded polyline."""
+    factor = _factor(precision)
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(pts) == 0:
+        return ""
+
+    ints = np.round(pts * factor).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    out = []
+    for v in values.tolist():
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
@@ -0,0 +1,92 @@
+# ml-service/services/responses.py
+"""
+JSON response helpers for the route API: orjson when installed (NumPy arrays
+serialised natively), stdlib json otherwise, column-oriented station lists and
+br/gzip compression negotiated from Accept-Encoding.
+"""
+import gzip
+import json
+import os
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the package is present
+    brotli = None
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+
+def _default(o: Any) -> Any:
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def columns(records: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """[{k: v}, ...] -> {k: [v, ...]}; keys in first-seen order, gaps as None."""
+    keys: Dict[str, None] = {}
+    for r in records:
+        keys.update(dict.fromkeys(r))
+    return {k: [r.get(k) for r in records] for k in keys}
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding header -> "br", "gzip" or None (q=0 and * honoured)."""
+    weights: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, param = part.partition(";")
+        param = param.strip()
+        try:
+            weights[name.strip().lower()] = float(param[2:]) if param.startswith("q=") else 1.0
+        except ValueError:
+            weights[name.strip().lower()] = 0.0
+    default = weights.get("*", 0.0)
+    if brotli is not None and weights.get("br", default) > 0:
+        return "br"
+    if weights.get("gzip", default) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+    return body
+
+
+def json_response(payload: Any, status: int = 200):
+    """Flask response; see api.py for the ASGI equivalent."""
+    from flask import Response, request
+
+    body = dumps(payload)
+    resp = Response(status=status, mimetype="application/json")
+    resp.headers["Vary"] = "Accept-Encoding"
+
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding")) if len(body) >= RESPONSE_COMPRESS_MIN_BYTES else None
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.set_data(compress(body, encoding))
+    return resp
@@ -0,0 +1,79 @@
+# ml-service/services/route_payload.py
+"""
+/api/route request parsing and response building, shared by the Flask app
+(app.py) and the async app (api.py) so both speak exactly the same format.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from services import polyline
+from services.charging_planner import Vehicle, parse_vehicle
+from services.responses import columns
+from services.simplify import simplify
+
+# stations returned per response: the closest ones, listed in along-route order
+MAX_NEARBY_STATIONS = 60
+
+
+class RouteRequest(NamedTuple):
+    start: Tuple[float, float]
+    end: Tuple[float, float]
+    waypoints: List[Tuple[float, float]]
+    simplify_m: float
+    compact: bool
+    vehicle: Optional[Vehicle]
+
+
+def parse_route_request(data: Dict[str, Any], format_arg: Optional[str] = None) -> RouteRequest:
+    """Raises ValueError when start/end are missing or vehicle is invalid; format_arg is ?format=."""
+    start = data.get("start")
+    end = data.get("end")
+    if not start or not end:
+        raise ValueError("start {lat,lng} and end {lat,lng} required")
+    stops = data.get("stops") or []
+    return RouteRequest(
+        start=(float(start["lat"]), float(start["lng"])),
+        end=(float(end["lat"]), float(end["lng"])),
+        waypoints=[(float(p["lat"]), float(p["lng"])) for p in stops if p and "lat" in p and "lng" in p],
+        simplify_m=float(data.get("simplify_m") or 0),
+        compact=(data.get("format") or format_arg) == "compact",
+        vehicle=parse_vehicle(data.get("vehicle")),
+    )
+
+
+def build_route_payload(
+    routes: List[Dict[str, Any]],
+    near: List[Dict[str, Any]],
+    simplify_m: float = 0.0,
+    compact: bool = False,
+    charging_plans: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """charging_plans, one per route (services.charging_planner), become each route's charging_plan."""
+    paths = [simplify(r["path"], simplify_m) for r in routes]
+    if len(near) > MAX_NEARBY_STATIONS:
+        # near is in along-route order; keep that order for the closest ones
+        closest = sorted(range(len(near)), key=lambda i: near[i]["distance_to_route_km"])[:MAX_NEARBY_STATIONS]
+        near = [near[i] for i in sorted(closest)]
+    out_routes = [{
+        "distance_km": round(r["distance_km"], 1),
+        "duration_min": round(r["duration_min"], 0),
+    } for r in routes]
+    for out, p in zip(out_routes, paths):
+        if compact:
+            out["polyline"] = polyline.encode(p)  # precision 5, same as OSRM
+        else:
+            out["path"] = p  # [ [lat,lon], ... ]
+    for out, plan in zip(out_routes, charging_plans or []):
+        out["charging_plan"] = plan
+
+    if compact:
+        return {
+            "success": True,
+            "format": "compact",
+            "routes": out_routes,
+            "nearby_stations": columns(near),  # {field: [value, ...]}
+        }
+    return {
+        "success": True,
+        "routes": out_routes,
+        "nearby_stations": near,
+    }
@@ -0,0 +1,307 @@
+# ml-service/services/routing.py
+"""
+OSRM HTTP clients: pooled keep-alive connections, connect/read deadlines,
+bounded retries with jittered backoff and a circuit breaker that fails fast
+while OSRM is down. OSRMClient (requests) serves the Flask app,
+AsyncOSRMClient (httpx) the async one; both share the request/response
+helpers below. OSRM_URL points them at the public server, a self-hosted
+instance or a local stub.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from services import polyline
+from services.corridor import cumulative_km
+from services.simplify import simplify_indices
+
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org").rstrip("/")
+OSRM_PROFILE = os.getenv("OSRM_PROFILE", "driving")
+OSRM_CONNECT_TIMEOUT_S = float(os.getenv("OSRM_CONNECT_TIMEOUT_S", "2"))
+OSRM_READ_TIMEOUT_S = float(os.getenv("OSRM_READ_TIMEOUT_S", "6"))
+# hard cap on one route() call including retries
+OSRM_DEADLINE_S = float(os.getenv("OSRM_DEADLINE_S", "10"))
+OSRM_RETRIES = int(os.getenv("OSRM_RETRIES", "2"))
+OSRM_BACKOFF_S = float(os.getenv("OSRM_BACKOFF_S", "0.2"))
+OSRM_POOL_SIZE = int(os.getenv("OSRM_POOL_SIZE", "20"))
+OSRM_BREAKER_FAILURES = int(os.getenv("OSRM_BREAKER_FAILURES", "5"))
+OSRM_BREAKER_RESET_S = float(os.getenv("OSRM_BREAKER_RESET_S", "30"))
+
+# Douglas-Peucker tolerance for the path used to prune corridor candidates;
+# 0 disables the coarse pass
+ROUTE_MATCH_SIMPLIFY_M = float(os.getenv("ROUTE_MATCH_SIMPLIFY_M", "25"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class OSRMUnavailable(RuntimeError):
+    """OSRM could not be reached (breaker open, deadline spent or repeated 5xx)."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open rejects calls
+    for reset_s, then half-open lets one trial call through to decide.
+    """
+
+    def __init__(self, failures: int = OSRM_BREAKER_FAILURES, reset_s: float = OSRM_BREAKER_RESET_S):
+        self.failures = failures
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._state = "closed"
+        self._trial_running = False
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_s:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._state = "closed"
+            self._trial_running = False
+
+    def release(self):
+        """A call ended without an outcome (cancelled): free the half-open trial slot."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial_running = False
+            if self._state == "half_open" or self._consecutive >= self.failures:
+                if self._state != "open":
+                    self.opened += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+
+class _OSRMClientBase:
+    def __init__(
+        self,
+        base_url: str = OSRM_URL,
+        profile: str = OSRM_PROFILE,
+        connect_timeout_s: float = OSRM_CONNECT_TIMEOUT_S,
+        read_timeout_s: float = OSRM_READ_TIMEOUT_S,
+        deadline_s: float = OSRM_DEADLINE_S,
+        retries: int = OSRM_RETRIES,
+        backoff_s: float = OSRM_BACKOFF_S,
+        pool_size: int = OSRM_POOL_SIZE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.profile = profile
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.deadline_s = deadline_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _route_url(self, coords: List[Tuple[float, float]]) -> str:
+        # coords are (lat, lon); OSRM wants lon,lat;lon,lat
+        chain = ";".join(f"{lon},{lat}" for lat, lon in coords)
+        return f"{self.base_url}/route/v1/{self.profile}/{chain}"
+
+    def _backoff(self, attempt: int, deadline: float) -> float:
+        # full jitter, never sleeping past the deadline
+        self.retried += 1
+        sleep = random.uniform(0, self.backoff_s * (2 ** attempt))
+        return max(0.0, min(sleep, deadline - time.monotonic()))
+
+    def _give_up(self, last_error: Optional[Exception]) -> OSRMUnavailable:
+        self.failed += 1
+        self.breaker.record_failure()
+        return OSRMUnavailable(f"OSRM unavailable: {last_error or 'deadline exceeded'}")
+
+    def _abandon(self, exc: BaseException):
+        """
+        The attempt loop exited by an exception that neither recorded success
+        nor gave up. The breaker must still hear about it, or a half-open
+        trial stays claimed forever and every later call fails fast.
+        """
+        if isinstance(exc, Exception):
+            # ChunkedEncodingError, DecodingError...: the upstream misbehaved
+            self.failed += 1
+            self.breaker.record_failure()
+        else:
+            # cancelled (client went away) or interrupted: no verdict on OSRM
+            self.breaker.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+            "calls": self.calls,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+class OSRMClient(_OSRMClientBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Accept": "application/json"})
+
+    def route(self, coords: List[Tuple[float, float]], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET /route/v1/{profile}/{lon,lat;...}. coords are (lat, lon).
+        Raises OSRMUnavailable for outages and requests.HTTPError for 4xx.
+        """
+        if not self.breaker.allow():
+            raise OSRMUnavailable("OSRM circuit open; failing fast")
+
+        url = self._route_url(coords)
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_s
+        last_error: Optional[Exception] = None
+        recorded = False
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    r = self._session.get(
+                        url,
+                        params=params,
+                        timeout=(min(self.connect_timeout_s, remaining), min(self.read_timeout_s, remaining)),
+                    )
+                    if r.status_code not in _RETRY_STATUS:
+                        # a 4xx is the caller's problem, not an outage
+                        recorded = True
+                        self.breaker.record_success()
+                        r.raise_for_status()
+                        return r.json()
+                    last_error = requests.HTTPError(f"OSRM HTTP {r.status_code}", response=r)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    last_error = e
+
+                if attempt < self.retries:
+                    time.sleep(self._backoff(attempt, deadline))
+
+            recorded = True
+            raise self._give_up(last_error)
+        except BaseException as e:
+            if not recorded:
+                self._abandon(e)
+            raise
+
+
+class AsyncOSRMClient(_OSRMClientBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout_s, connect=self.connect_timeout_s),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            headers={"Accept": "application/json"},
+        )
+
+    async def route(self, coords: List[Tuple[float, float]], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Same contract as OSRMClient.route; 4xx raise httpx.HTTPStatusError."""
+        if not self.breaker.allow():
+            raise OSRMUnavailable("OSRM circuit open; failing fast")
+
+        url = self._route_url(coords)
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_s
+        last_error: Optional[Exception] = None
+        recorded = False
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    r = await asyncio.wait_for(self._client.get(url, params=params), remaining)
+                    if r.status_code not in _RETRY_STATUS:
+                        recorded = True
+                        self.breaker.record_success()
+                        r.raise_for_status()
+                        return r.json()
+                    last_error = httpx.HTTPStatusError(f"OSRM HTTP {r.status_code}", request=r.request, response=r)
+                except (httpx.TransportError, asyncio.TimeoutError) as e:
+                    last_error = e
+
+                if attempt < self.retries:
+                    await asyncio.sleep(self._backoff(attempt, deadline))
+
+            recorded = True
+            raise self._give_up(last_error)
+        except BaseException as e:
+            if not recorded:
+                self._abandon(e)
+            raise
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def route_params(alternatives: Any) -> Dict[str, str]:
+    # OSRM's 'alternatives' is true/false; with true it returns up to 3 routes
+    return {
+        "overview": "full",
+        "alternatives": "true" if alternatives and alternatives > 0 else "false",
+        "geometries": "polyline",
+        "steps": "false",
+        "annotations": "false",
+    }
+
+
+def parse_routes(data: Dict[str, Any], match_simplify_m: float = ROUTE_MATCH_SIMPLIFY_M) -> List[Dict[str, Any]]:
+    """
+    OSRM /route response -> routes sorted by duration (ascending).
+    Each route: { distance_km, duration_min, path: float64 array (n, 2) of (lat, lon),
+                  match_indices: vertices of path simplified to match_simplify_m,
+                  cumulative_km: along-path km at each vertex of path }
+    """
+    if data.get("code") != "Ok" or not data.get("routes"):
+        return []
+
+    routes = []
+    for rt in data["routes"]:
+        path = polyline.decode(rt["geometry"])
+        routes.append({
+            "distance_km": (rt["distance"] or 0) / 1000.0,
+            "duration_min": (rt["duration"] or 0) / 60.0,
+            "path": path,
+            "match_indices": simplify_indices(path, match_simplify_m),
+            "cumulative_km": cumulative_km(path),
+        })
+    routes.sort(key=lambda x: x["duration_min"])
+    return routes
@@ -0,0 +1,57 @@
+# ml-service/services/simplify.py
+"""
+Douglas-Peucker path simplification with a tolerance in metres.
+
+Every vertex of the input ends up within tolerance_m of the simplified path,
+so a corridor of buffer + tolerance around the simplified path contains the
+corridor of buffer around the original one.
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from services.corridor import EARTH_RADIUS_KM, as_path_array
+
+_EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000.0
+
+
+def simplify_indices(path: Sequence[Tuple[float, float]], tolerance_m: float) -> np.ndarray:
+    """Indices of the vertices Douglas-Peucker keeps (always first and last)."""
+    p = as_path_array(path)
+    n = len(p)
+    if n < 3 or tolerance_m <= 0:
+        return np.arange(n)
+
+    lat = np.radians(p[:, 0])
+    lon = np.radians(p[:, 1])
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        # local equirectangular metres, scaled at this span's mid latitude
+        kx = np.cos(0.5 * (lat[i] + lat[j])) * _EARTH_RADIUS_M
+        x = (lon[i:j + 1] - lon[i]) * kx
+        y = (lat[i:j + 1] - lat[i]) * _EARTH_RADIUS_M
+        dx, dy = x[-1], y[-1]
+        seg2 = dx * dx + dy * dy
+        if seg2 > 0.0:
+            t = np.clip((x * dx + y * dy) / seg2, 0.0, 1.0)
+            d2 = (x - t * dx) ** 2 + (y - t * dy) ** 2
+        else:
+            d2 = x * x + y * y
+        k = int(np.argmax(d2[1:-1])) + 1
+        if d2[k] > tolerance_m * tolerance_m:
+            keep[i + k] = True
+            stack.append((i, i + k))
+            stack.append((i + k, j))
+    return np.flatnonzero(keep)
+
+
+def simplify(path: Sequence[Tuple[float, float]], tolerance_m: float) -> np.ndarray:
+    """Simplified (n, 2) array of (lat, lon)."""
+    p = as_path_array(path)
+    return p[simplify_indices(p, tolerance_m)]
@@ -0,0 +1,113 @@
+# ml-service/services/spatial_index.py
+"""
+In-process uniform grid over station coordinates.
+
+Stations are bucketed into lat/lon cells once; corridor and radius queries only
+touch the cells the route (plus its buffer) actually crosses, so their cost
+grows with route length and local density rather than with the station count.
+"""
+import math
+from typing import Sequence, Tuple
+
+import numpy as np
+
+KM_PER_DEG_LAT = 111.32
+EARTH_RADIUS_KM = 6371.0088
+
+_KEY_OFFSET = 1 << 30
+
+
+def _cell_keys(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+    return ((ix + _KEY_OFFSET) << 32) | (iy + _KEY_OFFSET)
+
+
+def densify_path(path: Sequence[Tuple[float, float]], max_step_deg: float) -> np.ndarray:
+    """Insert vertices so that no two consecutive points are more than max_step_deg apart."""
+    p = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+    if len(p) < 2:
+        return p
+    seg = p[1:] - p[:-1]
+    counts = np.maximum(1, np.ceil(np.abs(seg).max(axis=1) / max_step_deg)).astype(np.int64)
+    seg_idx = np.repeat(np.arange(len(seg)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    t = (np.arange(counts.sum()) - first) / np.repeat(counts, counts)
+    out = p[seg_idx] + seg[seg_idx] * t[:, None]
+    return np.vstack([out, p[-1:]])
+
+
+class GridIndex:
+    def __init__(self, lats, lons, cell_deg: float = 0.05):
+        self.cell_deg = float(cell_deg)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+
+        keys = _cell_keys(self._cell(self.lats), self._cell(self.lons))
+        self._order = np.argsort(keys, kind="stable")
+        self._keys, self._starts = np.unique(keys[self._order], return_index=True)
+        self._ends = np.append(self._starts[1:], len(self._order))
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cell(self, deg: np.ndarray) -> np.ndarray:
+        return np.floor(deg / self.cell_deg).astype(np.int64)
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Station indices (ascending) stored under any of the given cell keys."""
+        if len(self._keys) == 0 or len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self._keys, keys)
+        inside = pos < len(self._keys)
+        pos, keys = pos[inside], keys[inside]
+        pos = pos[self._keys[pos] == keys]
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int64)
+        hits = [self._order[s:e] for s, e in zip(self._starts[pos].tolist(), self._ends[pos].tolist())]
+        return np.sort(np.concatenate(hits))
+
+    def _dilated_keys(self, ix: np.ndarray, iy: np.ndarray, kx: int, ky: int) -> np.ndarray:
+        dx, dy = np.meshgrid(np.arange(-kx, kx + 1), np.arange(-ky, ky + 1), indexing="ij")
+        all_ix = (ix[:, None] + dx.ravel()[None, :]).ravel()
+        all_iy = (iy[:, None] + dy.ravel()[None, :]).ravel()
+        return np.unique(_cell_keys(all_ix, all_iy))
+
+    def _reach(self, buffer_km: float, max_abs_lat: float) -> Tuple[int, int]:
+        lat_deg = buffer_km / KM_PER_DEG_LAT
+        lon_deg = buffer_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(min(max_abs_lat, 89.0))), 1e-6))
+        return int(math.ceil(lat_deg / self.cell_deg)), int(math.ceil(lon_deg / self.cell_deg))
+
+    # ---------- queries ----------
+    def query_corridor(self, path: Sequence[Tuple[float, float]], buffer_km: float) -> np.ndarray:
+        """
+        Candidate station indices whose cell lies within buffer_km of the path.
+        A superset of the true corridor; callers run exact distances on it.
+        """
+        step = self.cell_deg / 2.0
+        pts = densify_path(path, step)
+        if len(pts) == 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        cells = np.unique(np.stack([self._cell(pts[:, 0]), self._cell(pts[:, 1])], axis=1), axis=0)
+        # +step covers the path between two densified samples
+        kx, ky = self._reach(buffer_km + step * KM_PER_DEG_LAT, float(np.abs(pts[:, 0]).max()))
+        return self._lookup(self._dilated_keys(cells[:, 0], cells[:, 1], kx, ky))
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and haversine distances of stations within radius_km, nearest first."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        kx, ky = self._reach(radius_km, abs(lat))
+        cand = self._lookup(self._dilated_keys(self._cell(np.array([lat])), self._cell(np.array([lon])), kx, ky))
+        dist = haversine_km(lat, lon, self.lats[cand], self.lons[cand])
+        keep = dist <= radius_km
+        cand, dist = cand[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return cand[order], dist[order]
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons) - math.radians(lon)
+    h = np.sin(dphi / 2.0) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
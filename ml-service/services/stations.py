@@ -0,0 +1,187 @@
+# ml-service/services/stations.py
+"""
+Station snapshot shared by the planners.
+
+Stations and their charger aggregates are loaded once into columnar arrays and
+refreshed on a single policy instead of per request:
+  - every probe_s seconds a tiny fingerprint query runs; the snapshot is only
+    reloaded when stations/chargers actually changed,
+  - after max_age_s the snapshot is reloaded regardless.
+While one thread refreshes, other requests keep using the previous snapshot.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, List
+
+import numpy as np
+from sqlalchemy import text
+
+from services.spatial_index import GridIndex
+
+STATION_SNAPSHOT_MAX_AGE_S = float(os.getenv("STATION_SNAPSHOT_MAX_AGE_S", "900"))
+STATION_SNAPSHOT_PROBE_S = float(os.getenv("STATION_SNAPSHOT_PROBE_S", "30"))
+
+_STATIONS_SQL = text(
+    """
+    SELECT s.station_id, s.name, s.address, s.latitude, s.longitude,
+           COALESCE(c.max_power_kw, 0) AS max_power_kw,
+           COALESCE(c.charger_count, 0) AS charger_count
+    FROM station s
+    LEFT JOIN (
+        SELECT station_id, MAX(power_kw) AS max_power_kw, COUNT(charger_id) AS charger_count
+        FROM charger
+        GROUP BY station_id
+    ) c ON c.station_id = s.station_id
+    WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL
+    ORDER BY s.station_id
+    """
+)
+
+# hashes every row server-side, so a probe ships 64 bytes instead of the table
+_FINGERPRINT_SQL = text(
+    """
+    SELECT
+      (SELECT md5(COALESCE(string_agg(concat_ws('|', station_id, name, address, latitude, longitude),
+                                      ',' ORDER BY station_id), '')) FROM station),
+      (SELECT md5(COALESCE(string_agg(concat_ws('|', charger_id, station_id, power_kw),
+                                      ',' ORDER BY charger_id), '')) FROM charger)
+    """
+)
+
+
+class StationColumns:
+    """One immutable version of the station table in columnar form."""
+
+    def __init__(self, version: int, rows: List[Any], loaded_at: float):
+        self.version = version
+        self.loaded_at = loaded_at
+        self.station_id = [r.station_id for r in rows]
+        self.name = [r.name for r in rows]
+        self.address = [r.address for r in rows]
+        n = len(rows)
+        self.lat = np.fromiter((r.latitude for r in rows), dtype=np.float64, count=n)
+        self.lon = np.fromiter((r.longitude for r in rows), dtype=np.float64, count=n)
+        self.max_power_kw = np.fromiter((r.max_power_kw or 0.0 for r in rows), dtype=np.float64, count=n)
+        self.charger_count = np.fromiter((r.charger_count or 0 for r in rows), dtype=np.int32, count=n)
+        self.index = GridIndex(self.lat, self.lon)
+        self._records: List[Dict[str, Any]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.station_id)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Row dicts in the planners' station shape; built once per version."""
+        if self._records is None:
+            self._records = [
+                {
+                    "station_id": sid,
+                    "name": name,
+                    "address": addr,
+                    "lat": lat,
+                    "lon": lon,
+                    "max_power_kw": kw,
+                    "charger_count": cnt,
+                }
+                for sid, name, addr, lat, lon, kw, cnt in zip(
+                    self.station_id, self.name, self.address, self.lat.tolist(),
+                    self.lon.tolist(), self.max_power_kw.tolist(), self.charger_count.tolist(),
+                )
+            ]
+        return self._records
+
+
+class StationSnapshot:
+    def __init__(
+        self,
+        connect: Callable[[], ContextManager[Any]],
+        max_age_s: float = STATION_SNAPSHOT_MAX_AGE_S,
+        probe_s: float = STATION_SNAPSHOT_PROBE_S,
+    ):
+        """connect() must return a context manager yielding something with .execute(text)."""
+        self._connect = connect
+        self.max_age_s = max_age_s
+        self.probe_s = probe_s
+
+        self._lock = threading.Lock()
+        self._current: StationColumns | None = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+
+        self._refreshes = 0
+        self._probes = 0
+        self._refresh_errors = 0
+        self._last_refresh_ms = 0.0
+        self._last_probe_ms = 0.0
+
+    # ---------- public ----------
+    def get(self) -> StationColumns:
+        cur = self._current
+        if cur is not None and not self._due(cur):
+            return cur
+        # only one thread refreshes; the rest serve the previous snapshot
+        if not self._lock.acquire(blocking=cur is None):
+            return cur
+        try:
+            cur = self._current
+            if cur is None or self._due(cur):
+                try:
+                    self._refresh(force=cur is None or time.monotonic() - cur.loaded_at >= self.max_age_s)
+                except Exception as e:
+                    if cur is None:
+                        raise
+                    # DB hiccup: keep serving the snapshot we have and back
+                    # off a full probe interval before trying again
+                    self._refresh_errors += 1
+                    self._checked_at = time.monotonic()
+                    print(f" Station snapshot refresh failed, serving v{cur.version}: {e}")
+            return self._current
+        finally:
+            self._lock.release()
+
+    def refresh(self) -> StationColumns:
+        """Reload now, e.g. after an admin edit."""
+        with self._lock:
+            self._refresh(force=True)
+            return self._current
+
+    def stats(self) -> Dict[str, Any]:
+        cur = self._current
+        now = time.monotonic()
+        return {
+            "version": cur.version if cur else 0,
+            "stations": len(cur) if cur else 0,
+            "age_s": round(now - cur.loaded_at, 1) if cur else None,
+            "since_check_s": round(now - self._checked_at, 1) if cur else None,
+            "refreshes": self._refreshes,
+            "probes": self._probes,
+            "refresh_errors": self._refresh_errors,
+            "last_refresh_ms": round(self._last_refresh_ms, 1),
+            "last_probe_ms": round(self._last_probe_ms, 1),
+            "max_age_s": self.max_age_s,
+            "probe_s": self.probe_s,
+        }
+
+    # ---------- internals ----------
+    def _due(self, cur: StationColumns) -> bool:
+        now = time.monotonic()
+        return now - self._checked_at >= self.probe_s or now - cur.loaded_at >= self.max_age_s
+
+    def _refresh(self, force: bool) -> None:
+        with self._connect() as conn:
+            t0 = time.perf_counter()
+            fp = tuple(conn.execute(_FINGERPRINT_SQL).one())
+            self._last_probe_ms = (time.perf_counter() - t0) * 1000.0
+            self._probes += 1
+            self._checked_at = time.monotonic()
+
+            if not force and fp == self._fingerprint:
+                return
+
+            t0 = time.perf_counter()
+            rows = conn.execute(_STATIONS_SQL).all()
+            version = (self._current.version if self._current else 0) + 1
+            self._current = StationColumns(version, rows, time.monotonic())
+            self._fingerprint = fp
+            self._last_refresh_ms = (time.perf_counter() - t0) * 1000.0
+            self._refreshes += 1
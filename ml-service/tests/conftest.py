@@ -0,0 +1,5 @@
+import os
+import sys
+
+# services is imported as a namespace package from the service root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from services import corridor, polyline
+from services.routing import parse_routes
+from services.simplify import simplify_indices
+from services.spatial_index import GridIndex
+
+# due north along a meridian, so offsets and foot points are easy to reason about
+PATH = np.column_stack([np.linspace(7.0, 7.5, 51), np.full(51, 80.0)])
+
+
+def test_offsets_are_measured_to_the_foot_of_the_nearest_segment():
+    cum = corridor.cumulative_km(PATH)
+    # one station on a vertex, one beside the middle of a segment, 1 km east
+    lats = np.array([PATH[10, 0], 0.5 * (PATH[30, 0] + PATH[31, 0])])
+    lons = np.array([80.0, 80.0 + 1.0 / 110.4])
+    idx, dist, along = corridor.match_corridor_along(PATH, lats, lons, 2.0)
+
+    assert idx.tolist() == [0, 1]
+    assert along[0] == pytest.approx(cum[10], abs=1e-3)
+    assert along[1] == pytest.approx(0.5 * (cum[30] + cum[31]), abs=1e-3)
+    assert dist == pytest.approx([0.0, 1.0], abs=0.01)
+
+
+def test_results_come_in_driving_order_and_agree_with_match_corridor():
+    rng = np.random.default_rng(2)
+    lats, lons = rng.uniform(6.95, 7.55, 2000), rng.uniform(79.95, 80.05, 2000)
+    idx, dist, along = corridor.match_corridor_along(PATH, lats, lons, 3.0, index=GridIndex(lats, lons))
+    assert np.all(np.diff(along) >= 0)
+
+    plain_idx, plain_dist = corridor.match_corridor(PATH, lats, lons, 3.0)
+    assert sorted(idx.tolist()) == sorted(plain_idx.tolist())
+
+    coarse = corridor.match_corridor_along(
+        PATH, lats, lons, 3.0, coarse_indices=simplify_indices(PATH, 25.0), coarse_tolerance_km=0.025,
+        cumulative=corridor.cumulative_km(PATH),
+    )
+    assert coarse[0].tolist() == idx.tolist()
+    assert coarse[2] == pytest.approx(along)
+
+
+def test_parse_routes_keeps_cumulative_km_with_each_route():
+    data = {"code": "Ok", "routes": [
+        {"geometry": polyline.encode(PATH), "distance": 55600.0, "duration": 3600.0},
+        {"geometry": polyline.encode(PATH[::5]), "distance": 55600.0, "duration": 3000.0},
+    ]}
+    routes = parse_routes(data)
+    assert [r["duration_min"] for r in routes] == [50.0, 60.0]
+    for r in routes:
+        assert r["cumulative_km"] == pytest.approx(corridor.cumulative_km(r["path"]))
+        assert r["cumulative_km"][-1] == pytest.approx(55.3, abs=0.1)
+    assert parse_routes({"code": "NoRoute"}) == []
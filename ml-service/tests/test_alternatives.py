@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from services import alternatives, corridor
+from services.spatial_index import GridIndex
+
+# two alternatives sharing the way out of Colombo and the approach to Kandy
+SHARED_OUT = [(6.927, 79.861), (6.97, 79.90), (7.02, 79.95)]
+SHARED_IN = [(7.27, 80.50), (7.29, 80.63)]
+PATHS = [
+    SHARED_OUT + [(7.09, 80.03), (7.25, 80.35)] + SHARED_IN,
+    SHARED_OUT + [(7.15, 80.10), (7.22, 80.30)] + SHARED_IN,
+]
+
+
+def _stations(n=3000, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(6.8, 7.4, n), rng.uniform(79.8, 80.7, n)
+
+
+def test_split_routes_matches_shared_stretches_once():
+    pieces = alternatives.split_routes(PATHS)
+    shared = [p for p in pieces if p.routes == [0, 1]]
+    assert len(shared) == 2
+    n_segments = sum(len(p.path) - 1 for p in pieces)
+    assert n_segments < sum(len(p) - 1 for p in PATHS)
+
+
+@pytest.mark.parametrize("simplify_m", [0.0, 25.0])
+def test_match_routes_equals_matching_each_route(simplify_m):
+    lats, lons = _stations()
+    matches = alternatives.match_routes(PATHS, lats, lons, 3.0, index=GridIndex(lats, lons), simplify_m=simplify_m)
+
+    for r, path in enumerate(PATHS):
+        idx, dist, along = matches.for_route(r)
+        want_idx, want_dist, want_along = corridor.match_corridor_along(path, lats, lons, 3.0)
+        assert sorted(idx.tolist()) == sorted(want_idx.tolist())
+        order, want_order = np.argsort(idx), np.argsort(want_idx)
+        assert dist[order] == pytest.approx(want_dist[want_order])
+        assert along[order] == pytest.approx(want_along[want_order])
+    assert np.all(np.diff(matches.dist.min(axis=1)) >= 0)
+
+
+def test_annotate_accepts_only_the_matched_stations():
+    lats, lons = _stations(300)
+    stations = [{"station_id": i, "lat": a, "lon": o} for i, (a, o) in enumerate(zip(lats, lons))]
+    matches = alternatives.match_routes(PATHS, lats, lons, 3.0)
+
+    full = alternatives.annotate(stations, matches)
+    sparse = alternatives.annotate({i: stations[i] for i in matches.idx.tolist()}, matches)
+    assert full == sparse
+    assert [s["along_route_km"] for s in full] == sorted(s["along_route_km"] for s in full)
+    for s in full:
+        assert s["serves_routes"] == [r for r, d in enumerate(s["route_distances_km"]) if d is not None]
+        assert s["distance_to_route_km"] == min(d for d in s["route_distances_km"] if d is not None)
+    assert "serves_routes" not in stations[0]
+
+
+def test_empty_inputs():
+    assert alternatives.split_routes([]) == []
+    matches = alternatives.match_routes(PATHS, [], [], 3.0)
+    assert matches.dist.shape == (0, 2)
+    assert alternatives.annotate([], matches) == []
+    with pytest.raises(ValueError):
+        alternatives.split_routes([PATHS[0]] * 64)
@@ -0,0 +1,94 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from services import polyline
+from services.cache import AsyncRouteCache
+from services.corridor_pool import CorridorPool
+from services.routing import OSRMUnavailable
+from services.stations import StationColumns
+
+PATH = np.column_stack([np.linspace(6.93, 7.29, 40), np.linspace(79.86, 80.63, 40)])
+BODY = {"start": {"lat": 6.93, "lng": 79.86}, "end": {"lat": 7.29, "lng": 80.63}}
+
+
+class FakeOSRM:
+    def __init__(self, data=None, error=None):
+        self.data, self.error, self.calls = data, error, 0
+
+    async def route(self, coords, params):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.data
+
+    def stats(self):
+        return {"calls": self.calls}
+
+
+def _snapshot():
+    rows = [
+        SimpleNamespace(station_id=i, name=f"s{i}", address=None, latitude=lat, longitude=lon,
+                        max_power_kw=50.0, charger_count=2)
+        for i, (lat, lon) in enumerate([(7.0, 80.01), (7.2, 80.45), (8.5, 81.0)])
+    ]
+    return SimpleNamespace(get=lambda: StationColumns(1, rows, time.time()), stats=lambda: {})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def use(osrm):
+        monkeypatch.setattr(api, "osrm", osrm)
+        monkeypatch.setattr(api, "snapshot", _snapshot())
+        monkeypatch.setattr(api, "route_cache", AsyncRouteCache())
+        monkeypatch.setattr(api, "corridor_pool", CorridorPool(workers=0))
+        # no lifespan: the shutdown hook would close the real clients
+        return TestClient(api.app)
+    return use
+
+
+def _osrm_ok():
+    return FakeOSRM({"code": "Ok", "routes": [
+        {"geometry": polyline.encode(PATH), "distance": 98000.0, "duration": 7200.0},
+    ]})
+
+
+def test_route_returns_routes_and_stations_in_route_order(client):
+    osrm = _osrm_ok()
+    http = client(osrm)
+    out = http.post("/api/route", json=BODY).json()
+    assert out["success"] and len(out["routes"]) == 1
+    assert [s["station_id"] for s in out["nearby_stations"]] == [0, 1]
+
+    http.post("/api/route", json=BODY)
+    assert osrm.calls == 1  # second request served from the route cache
+
+
+def test_compact_format_is_gzipped_when_asked(client, monkeypatch):
+    monkeypatch.setattr(api, "RESPONSE_COMPRESS_MIN_BYTES", 0)
+    res = client(_osrm_ok()).post("/api/route?format=compact", json=BODY, headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    out = res.json()  # httpx decodes the gzip body
+    assert out["format"] == "compact"
+    assert out["nearby_stations"]["station_id"] == [0, 1]
+    assert len(polyline.decode(out["routes"][0]["polyline"])) == len(PATH)
+
+
+@pytest.mark.parametrize("osrm, body, status", [
+    (FakeOSRM({"code": "NoRoute"}), BODY, 404),
+    (FakeOSRM(error=OSRMUnavailable("OSRM circuit open; failing fast")), BODY, 503),
+    (FakeOSRM({}), {"start": BODY["start"]}, 400),
+])
+def test_errors(client, osrm, body, status):
+    res = client(osrm).post("/api/route", json=body)
+    assert res.status_code == status and res.json()["success"] is False
+
+
+def test_health_reports_every_component(client):
+    out = client(_osrm_ok()).get("/api/health").json()
+    assert out["ok"] and {"station_snapshot", "route_cache", "osrm", "corridor_pool"} <= set(out)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.cache import AsyncRouteCache, RouteCache, SingleFlightCache, route_key
+
+START, END = (6.92712, 79.86121), (7.29061, 80.63369)
+
+
+def test_route_key_rounds_coordinates():
+    assert route_key(START, END, [], 2) == route_key((6.927121, 79.861209), END, [], True)
+    assert route_key(START, END, [], 2) != route_key(START, END, [(7.0, 80.0)], 2)
+
+
+def test_hit_within_ttl_and_reload_after():
+    cache = SingleFlightCache(ttl_s=0.05, max_entries=10)
+    calls = []
+    load = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_load("k", load) == 1
+    assert cache.get_or_load("k", load) == 1
+    time.sleep(0.06)
+    assert cache.get_or_load("k", load) == 2
+
+
+def test_lru_eviction():
+    cache = SingleFlightCache(ttl_s=60, max_entries=2)
+    for k in "abc":
+        cache.get_or_load(k, lambda: k)
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+
+def test_concurrent_misses_share_one_call():
+    cache = RouteCache()
+    calls = []
+    gate = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        gate.wait(2)
+        return ["route"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_routes(START, END, [], 2, fetch)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and results == [["route"]] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = AsyncRouteCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ConnectionError("OSRM down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_routes(START, END, [], 2, fetch) for _ in range(3)),
+                                    return_exceptions=True)
+
+    assert all(isinstance(r, ConnectionError) for r in asyncio.run(run()))
+    assert len(calls) == 1
+    with pytest.raises(ConnectionError):
+        asyncio.run(cache.get_routes(START, END, [], 2, fetch))
+    assert len(calls) == 2 and cache.stats()["errors"] == 2
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from services.charging_planner import Vehicle, plan_stops
+
+# 200 km full range: 50% leaves with 100 km, charging to 80% gives 160 km, 10% reserve is 20 km
+VEHICLE = Vehicle(soc=50, full_range_km=200, reserve_soc=10, charge_to_soc=80)
+
+
+def _plan(offsets, route_km, vehicle=VEHICLE, detour=None, power=None):
+    offsets = np.array(offsets, dtype=np.float64)
+    detour = np.zeros(len(offsets)) if detour is None else np.array(detour, dtype=np.float64)
+    power = np.full(len(offsets), 50.0) if power is None else np.array(power, dtype=np.float64)
+    return plan_stops(offsets, detour, power, route_km, vehicle)
+
+
+def test_no_stop_when_the_charge_reaches_the_destination():
+    assert _plan([30.0, 60.0], 70.0) == []
+
+
+def test_one_stop_charges_only_what_the_last_leg_needs():
+    # from 50 km, 170 km remain with the reserve (> 160): only the station at 70 km can be last
+    stops = _plan([50.0, 70.0], 200.0)
+    assert [j for j, _, _ in stops] == [1]
+    _, arrive, depart = stops[0]
+    assert arrive == pytest.approx(30.0)
+    assert depart == pytest.approx(150.0)
+
+
+def test_several_stops_in_route_order():
+    stops = _plan([60.0, 200.0, 340.0], 400.0)
+    assert [j for j, _, _ in stops] == [0, 1, 2]
+    assert [(a, d) for _, a, d in stops] == pytest.approx([(40.0, 160.0), (20.0, 160.0), (20.0, 80.0)])
+
+
+def test_detour_counts_against_the_range():
+    # 15 km off the route: arriving there takes the charge below the reserve
+    assert _plan([75.0], 150.0, detour=[15.0]) is None
+
+
+def test_stations_without_power_are_skipped():
+    # the station at 70 km would be the one stop, but has no known charger
+    stops = _plan([50.0, 70.0, 75.0], 200.0, power=[0.0, 0.0, 22.0])
+    assert [j for j, _, _ in stops] == [2]
+
+
+def test_no_plan_when_a_gap_exceeds_the_range():
+    assert _plan([60.0, 300.0], 400.0) is None
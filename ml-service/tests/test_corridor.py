@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from services import corridor
+from services.spatial_index import GridIndex
+
+# Colombo -> Kandy, roughly
+PATH = [(6.927, 79.861), (7.02, 79.95), (7.09, 80.03), (7.25, 80.35), (7.29, 80.63)]
+
+
+def _stations(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(6.8, 7.4, n), rng.uniform(79.8, 80.7, n)
+
+
+def test_match_corridor_keeps_the_points_within_the_buffer_nearest_first():
+    lats, lons = _stations()
+    idx, dist = corridor.match_corridor(PATH, lats, lons, 5.0)
+
+    every = corridor.distance_to_path_km(PATH, lats, lons)
+    assert set(idx.tolist()) == set(np.flatnonzero(every <= 5.0).tolist())
+    assert np.all(np.diff(dist) >= 0)
+    assert dist == pytest.approx(every[idx])
+
+
+def test_match_corridor_with_an_index_gives_the_same_result():
+    lats, lons = _stations()
+    plain = corridor.match_corridor(PATH, lats, lons, 5.0)
+    indexed = corridor.match_corridor(PATH, lats, lons, 5.0, index=GridIndex(lats, lons))
+    assert indexed[0].tolist() == plain[0].tolist()
+    assert indexed[1] == pytest.approx(plain[1])
+
+
+def test_stations_near_route_annotates_copies_in_driving_order():
+    stations = [
+        {"station_id": 1, "lat": 7.28, "lon": 80.60},   # near Kandy
+        {"station_id": 2, "lat": 6.93, "lon": 79.87},   # near Colombo
+        {"station_id": 3, "lat": 8.50, "lon": 80.40},   # far off the route
+    ]
+    near = corridor.stations_near_route(PATH, stations, 5.0)
+
+    assert [s["station_id"] for s in near] == [2, 1]
+    assert near[0]["along_route_km"] < near[1]["along_route_km"]
+    assert near[0]["detour_km"] == pytest.approx(2.0 * near[0]["distance_to_route_km"], abs=0.011)
+    assert "distance_to_route_km" not in stations[0]
+
+
+def test_empty_inputs():
+    idx, dist = corridor.match_corridor(PATH, [], [], 5.0)
+    assert len(idx) == 0 and len(dist) == 0
+    assert corridor.stations_near_route(PATH, [], 5.0) == []
+    assert np.isinf(corridor.distance_to_path_km([], [7.0], [80.0])).all()
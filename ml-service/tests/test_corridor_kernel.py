@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+
+from services import corridor
+
+
+def _segment_distance_m(point, a, b, samples=100, rounds=3):
+    """Geodesic distance to a segment drawn straight in lat/lon, by repeatedly narrowed sampling."""
+    lo, hi = 0.0, 1.0
+    for _ in range(rounds):
+        t = np.linspace(lo, hi, samples)
+        d = [geodesic(point, (a[0] + x * (b[0] - a[0]), a[1] + x * (b[1] - a[1]))).m for x in t]
+        best = int(np.argmin(d))
+        lo, hi = t[max(best - 1, 0)], t[min(best + 1, samples - 1)]
+    return min(d)
+
+
+@pytest.mark.parametrize("lat0", [7.0, 45.0, 60.0])
+def test_distance_matches_geodesic_within_centimetres(lat0):
+    rng = np.random.default_rng(int(lat0))
+    a = (lat0, 80.0)
+    b = (lat0 + 0.03, 80.04)
+    pts = np.column_stack([
+        rng.uniform(lat0 - 0.03, lat0 + 0.06, 12),
+        rng.uniform(79.96, 80.08, 12),
+    ])
+    got_m = corridor.distance_to_path_km([a, b], pts[:, 0], pts[:, 1], max_distance_km=10.0) * 1000.0
+    want_m = [_segment_distance_m(tuple(p), a, b) for p in pts]
+    assert got_m == pytest.approx(want_m, abs=0.02)
+
+
+def test_cumulative_km_matches_geodesic_steps():
+    path = np.column_stack([np.linspace(6.9, 7.3, 200), 79.86 + 0.2 * np.sin(np.linspace(0, 3, 200))])
+    cum = corridor.cumulative_km(path)
+    steps = [geodesic(tuple(p), tuple(q)).km for p, q in zip(path[:-1], path[1:])]
+    assert cum[0] == 0.0
+    assert cum[-1] == pytest.approx(sum(steps), rel=1e-5)
+    assert np.all(np.diff(cum) > 0)
+
+
+def test_points_beyond_the_buffer_keep_the_planar_distance():
+    # far points are not refined, but stay within the stated planar bound
+    a, b = (7.0, 80.0), (7.03, 80.04)
+    far = corridor.distance_to_path_km([a, b], [7.15], [80.0], max_distance_km=1.0)[0]
+    want = _segment_distance_m((7.15, 80.0), a, b) / 1000.0
+    bound = want * ((np.tan(np.radians(7.15)) + 0.01) * want / 6335.4 + (want / 6335.4) ** 2)
+    assert abs(far - want) <= bound + 1e-5
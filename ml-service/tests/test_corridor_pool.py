@@ -0,0 +1,77 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services import alternatives, corridor
+from services.corridor_pool import CorridorPool
+from services.stations import StationColumns
+
+PATHS = [
+    [(6.927, 79.861), (7.02, 79.95), (7.09, 80.03), (7.25, 80.35), (7.29, 80.63)],
+    [(6.927, 79.861), (7.02, 79.95), (7.15, 80.10), (7.29, 80.63)],
+]
+
+
+def _snapshot(version=1, n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [
+        SimpleNamespace(station_id=i, name=f"s{i}", address=None, latitude=lat, longitude=lon,
+                        max_power_kw=50.0, charger_count=2)
+        for i, (lat, lon) in enumerate(zip(rng.uniform(6.8, 7.4, n), rng.uniform(79.8, 80.7, n)))
+    ]
+    return StationColumns(version, rows, time.time())
+
+
+def _assert_same(got, want):
+    assert len(got) == len(want)
+    for (g_idx, g_dist, g_along), (w_idx, w_dist, w_along) in zip(got, want):
+        assert g_idx.tolist() == w_idx.tolist()
+        assert g_dist == pytest.approx(w_dist)
+        assert g_along == pytest.approx(w_along)
+
+
+def _in_process(snap, paths, max_distance_km):
+    return [corridor.match_corridor_along(p, snap.lat, snap.lon, max_distance_km) for p in paths]
+
+
+def test_inline_mode_matches_in_process():
+    snap = _snapshot()
+    pool = CorridorPool(workers=0)
+    _assert_same(pool.match(snap, PATHS, 3.0), _in_process(snap, PATHS, 3.0))
+    assert pool.stats()["mode"] == "inline"
+    assert pool.stats()["completed"] == len(PATHS)
+
+
+def test_worker_processes_match_in_process_across_versions():
+    pool = CorridorPool(workers=1)
+    try:
+        for version in (1, 2, 3):
+            snap = _snapshot(version, seed=version)
+            _assert_same(pool.match(snap, PATHS, 3.0), _in_process(snap, PATHS, 3.0))
+        stats = pool.stats()
+        # only the current version and the one before stay published
+        assert stats["published_versions"] == [2, 3]
+        assert (stats["completed"], stats["failed"], stats["queue_depth"]) == (6, 0, 0)
+    finally:
+        pool.close()
+    assert pool.stats()["published_versions"] == []
+
+
+def test_match_routes_async_matches_match_routes():
+    snap = _snapshot()
+    pool = CorridorPool(workers=0)
+    got = asyncio.run(pool.match_routes_async(snap, PATHS, 3.0, simplify_m=25.0))
+    want = alternatives.match_routes(PATHS, snap.lat, snap.lon, 3.0)
+    assert got.idx.tolist() == want.idx.tolist()
+    assert got.dist == pytest.approx(want.dist)
+    np.testing.assert_allclose(got.along, want.along, equal_nan=True)
+
+
+def test_failures_are_counted_and_raised():
+    pool = CorridorPool(workers=0)
+    with pytest.raises(IndexError):
+        pool.match(_snapshot(), [[(7.0, 80.0), (7.1, 80.1)]], 3.0, coarse=[[0, 99]], coarse_tolerance_km=0.01)
+    assert pool.stats()["failed"] == 1
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from services import polyline
+
+# the worked example from Google's polyline format documentation
+GOOGLE_EXAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def test_decode_reference_example():
+    assert polyline.decode(GOOGLE_EXAMPLE) == pytest.approx(np.array(GOOGLE_POINTS))
+
+
+def test_encode_reference_example():
+    assert polyline.encode(GOOGLE_POINTS) == GOOGLE_EXAMPLE
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_round_trip(precision):
+    rng = np.random.default_rng(3)
+    pts = np.round(rng.uniform([-89, -179], [89, 179], size=(500, 2)), precision)
+    decoded = polyline.decode(polyline.encode(pts, precision), precision)
+    assert decoded == pytest.approx(pts, abs=0.5 / 10 ** precision)
+
+
+def test_iter_decode_matches_decode_across_chunk_boundaries():
+    encoded = polyline.encode(np.random.default_rng(4).uniform(-80, 80, size=(50, 2)))
+    chunks = [encoded[i:i + 7] for i in range(0, len(encoded), 7)]
+    assert np.array(list(polyline.iter_decode(chunks))) == pytest.approx(polyline.decode(encoded))
+
+
+def test_empty_and_malformed_input():
+    assert polyline.decode("").shape == (0, 2)
+    assert polyline.encode([]) == ""
+    with pytest.raises(ValueError):
+        polyline.decode(GOOGLE_EXAMPLE[:-1])
+    with pytest.raises(ValueError):
+        list(polyline.iter_decode(GOOGLE_EXAMPLE[:-1]))
+    with pytest.raises(ValueError):
+        polyline.decode("_p~iF ~ps|U")
+    with pytest.raises(ValueError):
+        polyline.decode(GOOGLE_EXAMPLE, precision=7)
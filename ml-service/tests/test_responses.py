@@ -0,0 +1,90 @@
+import gzip
+import json
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from services import polyline, responses
+from services.route_payload import MAX_NEARBY_STATIONS, build_route_payload, parse_route_request
+
+
+def test_dumps_handles_numpy_and_decimal():
+    payload = {"path": np.array([[1.5, 2.0]]), "n": np.int64(3), "power": Decimal("22.5")}
+    assert json.loads(responses.dumps(payload)) == {"path": [[1.5, 2.0]], "n": 3, "power": 22.5}
+
+
+def test_columns_keeps_first_seen_key_order_and_fills_gaps():
+    assert responses.columns([{"a": 1, "b": 2}, {"c": 3, "a": 4}]) == {
+        "a": [1, 4], "b": [2, None], "c": [None, 3],
+    }
+    assert responses.columns([]) == {}
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("gzip;q=abc", None),
+])
+def test_negotiate_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert responses.negotiate_encoding(header) == expected
+
+
+def test_negotiate_encoding_prefers_br_when_available(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", object())
+    assert responses.negotiate_encoding("gzip, br") == "br"
+    assert responses.negotiate_encoding("gzip, br;q=0") == "gzip"
+
+
+def test_compress_round_trip():
+    body = responses.dumps({"x": list(range(1000))})
+    assert gzip.decompress(responses.compress(body, "gzip")) == body
+    assert responses.compress(body, None) is body
+
+
+def test_parse_route_request():
+    req = parse_route_request({
+        "start": {"lat": "6.9", "lng": 79.8},
+        "end": {"lat": 7.3, "lng": 80.6},
+        "stops": [{"lat": 7.0, "lng": 80.0}, {"lat": 7.1}, None],
+    }, format_arg="compact")
+    assert req.start == (6.9, 79.8)
+    assert req.waypoints == [(7.0, 80.0)]
+    assert req.compact and req.simplify_m == 0 and req.vehicle is None
+
+    with pytest.raises(ValueError):
+        parse_route_request({"start": {"lat": 6.9, "lng": 79.8}})
+
+
+def _route(n=20):
+    path = np.column_stack([np.linspace(6.9, 7.3, n), np.linspace(79.8, 80.6, n)])
+    return {"distance_km": 98.76, "duration_min": 121.4, "path": path}
+
+
+def test_build_route_payload_compact_matches_full():
+    near = [{"station_id": i, "distance_to_route_km": 0.1 * i} for i in range(3)]
+    full = build_route_payload([_route()], near)
+    compact = build_route_payload([_route()], near, compact=True, charging_plans=[{"stops": []}])
+
+    assert full["routes"][0]["distance_km"] == 98.8
+    assert full["nearby_stations"] == near
+    assert compact["format"] == "compact"
+    assert compact["routes"][0]["charging_plan"] == {"stops": []}
+    assert polyline.decode(compact["routes"][0]["polyline"]) == pytest.approx(
+        np.asarray(full["routes"][0]["path"]), abs=1e-5,
+    )
+    assert compact["nearby_stations"] == responses.columns(near)
+
+
+def test_build_route_payload_keeps_closest_stations_in_route_order():
+    n = MAX_NEARBY_STATIONS + 10
+    # along-route order with the farthest stations at the front
+    near = [{"station_id": i, "distance_to_route_km": float(n - i)} for i in range(n)]
+    out = build_route_payload([_route()], near)["nearby_stations"]
+    assert [s["station_id"] for s in out] == list(range(10, n))
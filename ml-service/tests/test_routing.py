@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from services import polyline
+from services.routing import AsyncOSRMClient, CircuitBreaker, OSRMClient, OSRMUnavailable, parse_routes
+
+COORDS = [(6.927, 79.861), (7.29, 80.63)]
+
+
+def _async_client(handler, **kwargs):
+    client = AsyncOSRMClient(backoff_s=0.0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=2, reset_s=0.0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    assert breaker.allow()          # reset_s passed: the half-open trial
+    assert not breaker.allow()      # only one at a time
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_retries_a_5xx_then_succeeds():
+    answers = iter([httpx.Response(503), httpx.Response(200, json={"code": "Ok", "routes": []})])
+    client = _async_client(lambda request: next(answers), retries=2)
+    assert asyncio.run(client.route(COORDS, {})) == {"code": "Ok", "routes": []}
+    assert client.stats()["retried"] == 1
+
+
+def test_4xx_raises_without_counting_as_an_outage():
+    client = _async_client(lambda request: httpx.Response(400, json={"code": "InvalidQuery"}))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.route(COORDS, {}))
+    assert client.breaker.state == "closed" and client.failed == 0
+
+
+def test_repeated_outages_open_the_breaker_and_fail_fast():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        raise httpx.ConnectError("refused")
+
+    client = _async_client(handler, retries=0, breaker=CircuitBreaker(failures=2, reset_s=60))
+    for _ in range(2):
+        with pytest.raises(OSRMUnavailable):
+            asyncio.run(client.route(COORDS, {}))
+    with pytest.raises(OSRMUnavailable, match="circuit open"):
+        asyncio.run(client.route(COORDS, {}))
+    assert len(calls) == 2 and client.stats()["rejected"] == 1
+
+
+def test_cancelled_trial_frees_the_half_open_slot():
+    async def run():
+        client = AsyncOSRMClient(breaker=CircuitBreaker(failures=1, reset_s=0.0))
+        client.breaker.record_failure()
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        client._client.get = hang
+        task = asyncio.ensure_future(client.route(COORDS, {}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await client.aclose()
+        return client.breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.allow()
+
+
+def test_unexpected_error_in_a_trial_counts_as_a_failure():
+    client = OSRMClient(breaker=CircuitBreaker(failures=1, reset_s=0.0))
+    client.breaker.record_failure()
+
+    def broken(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+    client._session.get = broken
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.route(COORDS, {})
+    assert client.breaker.state == "open" and client.failed == 1
+    assert client.breaker.allow()   # trial slot released, next trial allowed after reset_s
+
+
+def test_parse_routes_fastest_first():
+    geometry = polyline.encode(COORDS)
+    data = {"code": "Ok", "routes": [
+        {"geometry": geometry, "distance": 120000, "duration": 9000},
+        {"geometry": geometry, "distance": 115000, "duration": 7200},
+    ]}
+    routes = parse_routes(data)
+    assert [r["duration_min"] for r in routes] == [120.0, 150.0]
+    assert routes[0]["path"].shape == (2, 2)
+    assert routes[0]["cumulative_km"][0] == 0.0
+    assert parse_routes({"code": "NoRoute"}) == []
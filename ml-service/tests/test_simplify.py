@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from services import corridor
+from services.simplify import simplify, simplify_indices
+
+
+def _wiggly_path(n=2000, seed=5):
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.0008, size=(n, 2)) + [0.0002, 0.0004]
+    return np.cumsum(steps, axis=0) + [6.9, 79.86]
+
+
+@pytest.mark.parametrize("tolerance_m", [5.0, 25.0, 100.0])
+def test_every_vertex_stays_within_the_tolerance(tolerance_m):
+    path = _wiggly_path()
+    coarse = simplify(path, tolerance_m)
+    assert len(coarse) < len(path)
+    off = corridor.distance_to_path_km(coarse, path[:, 0], path[:, 1]) * 1000.0
+    # the simplifier measures on a sphere, the kernel on the ellipsoid
+    assert off.max() <= tolerance_m * 1.01
+
+
+def test_keeps_the_ends_and_drops_collinear_points():
+    line = np.column_stack([np.linspace(7.0, 7.1, 50), np.full(50, 80.0)])
+    assert simplify_indices(line, 1.0).tolist() == [0, 49]
+    assert simplify_indices(line[:2], 1.0).tolist() == [0, 1]
+    assert len(simplify_indices(line, 0.0)) == 50
+
+
+def test_coarse_pass_leaves_corridor_matches_unchanged():
+    path = _wiggly_path()
+    rng = np.random.default_rng(6)
+    lats = rng.uniform(path[:, 0].min() - 0.05, path[:, 0].max() + 0.05, 3000)
+    lons = rng.uniform(path[:, 1].min() - 0.05, path[:, 1].max() + 0.05, 3000)
+
+    full = corridor.match_corridor(path, lats, lons, 2.0)
+    coarse = corridor.match_corridor(path, lats, lons, 2.0, coarse_indices=simplify_indices(path, 25.0),
+                                     coarse_tolerance_km=0.025)
+    assert coarse[0].tolist() == full[0].tolist()
+    assert coarse[1] == pytest.approx(full[1])
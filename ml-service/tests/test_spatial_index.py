@@ -0,0 +1,44 @@
+import numpy as np
+
+from services.spatial_index import GridIndex, densify_path, haversine_km
+
+PATH = [(6.927, 79.861), (7.09, 80.03), (7.29, 80.63)]
+
+
+def _stations(n=5000, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(6.5, 7.7, n), rng.uniform(79.6, 81.0, n)
+
+
+def test_densify_path_bounds_the_step_and_keeps_the_ends():
+    dense = densify_path(PATH, 0.01)
+    assert tuple(dense[0]) == PATH[0] and tuple(dense[-1]) == PATH[-1]
+    assert np.abs(np.diff(dense, axis=0)).max() <= 0.01 + 1e-12
+
+
+def test_query_corridor_is_a_superset_of_the_corridor():
+    lats, lons = _stations()
+    index = GridIndex(lats, lons)
+    cand = set(index.query_corridor(PATH, 5.0).tolist())
+
+    samples = densify_path(PATH, 0.001)
+    inside = [i for i in range(len(lats)) if haversine_km(lats[i], lons[i], samples[:, 0], samples[:, 1]).min() <= 5.0]
+    assert inside and set(inside) <= cand
+    # and it prunes: far fewer candidates than stations
+    assert len(cand) < len(lats) / 2
+
+
+def test_query_radius_matches_brute_force_nearest_first():
+    lats, lons = _stations()
+    index = GridIndex(lats, lons)
+    idx, dist = index.query_radius(7.0, 80.0, 3.0)
+
+    every = haversine_km(7.0, 80.0, lats, lons)
+    assert set(idx.tolist()) == set(np.flatnonzero(every <= 3.0).tolist())
+    assert np.all(np.diff(dist) >= 0)
+
+
+def test_empty_index():
+    index = GridIndex([], [])
+    assert len(index.query_corridor(PATH, 5.0)) == 0
+    assert len(index.query_radius(7.0, 80.0, 3.0)[0]) == 0
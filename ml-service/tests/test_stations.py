@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from services.stations import StationSnapshot
+
+
+class FakeDB:
+    """Answers the fingerprint probe and the station query; counts both."""
+
+    def __init__(self):
+        self.fingerprint = ("a", "b")
+        self.rows = [self._row(1, 6.9, 79.9), self._row(2, 7.3, 80.6)]
+        self.down = False
+        self.probes = 0
+        self.loads = 0
+
+    @staticmethod
+    def _row(sid, lat, lon):
+        return SimpleNamespace(station_id=sid, name=f"s{sid}", address=None, latitude=lat, longitude=lon,
+                               max_power_kw=50.0, charger_count=2)
+
+    def execute(self, query):
+        if self.down:
+            raise ConnectionError("db down")
+        if "md5" in str(query):
+            self.probes += 1
+            return SimpleNamespace(one=lambda: self.fingerprint)
+        self.loads += 1
+        return SimpleNamespace(all=lambda: list(self.rows))
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+
+def test_first_get_loads_the_table():
+    db = FakeDB()
+    snap = StationSnapshot(db.connect, max_age_s=3600, probe_s=3600).get()
+    assert snap.version == 1 and len(snap) == 2
+    assert snap.records()[0] == {"station_id": 1, "name": "s1", "address": None, "lat": 6.9, "lon": 79.9,
+                                 "max_power_kw": 50.0, "charger_count": 2}
+
+
+def test_unchanged_fingerprint_only_probes():
+    db = FakeDB()
+    snapshot = StationSnapshot(db.connect, max_age_s=3600, probe_s=0)
+    first = snapshot.get()
+    second = snapshot.get()
+    assert second is first
+    assert (db.probes, db.loads) == (2, 1)
+
+
+def test_changed_fingerprint_reloads():
+    db = FakeDB()
+    snapshot = StationSnapshot(db.connect, max_age_s=3600, probe_s=0)
+    snapshot.get()
+    db.fingerprint = ("a", "c")
+    db.rows.append(db._row(3, 7.0, 80.0))
+    snap = snapshot.get()
+    assert snap.version == 2 and len(snap) == 3
+
+
+def test_failed_refresh_serves_the_previous_snapshot():
+    db = FakeDB()
+    snapshot = StationSnapshot(db.connect, max_age_s=0, probe_s=0)
+    first = snapshot.get()
+    db.down = True
+    assert snapshot.get() is first
+    assert snapshot.stats()["refresh_errors"] == 1
+
+
+def test_failure_without_any_snapshot_raises():
+    db = FakeDB()
+    db.down = True
+    with pytest.raises(ConnectionError):
+        StationSnapshot(db.connect).get()